@@ -74,5 +74,10 @@ setup(
         "coverage",
     ],
     python_requires=">=3.6",
-    entry_points={"console_scripts": ["tl-relay=relay.boot:main"]},
+    entry_points={
+        "console_scripts": [
+            "tl-relay=relay.boot:main",
+            "tl-relay-db=relay.boot:db_main",
+        ]
+    },
 )
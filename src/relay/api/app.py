@@ -28,7 +28,11 @@ from .exchange.resources import (
     UserEventsExchange,
 )
 from .messaging.resources import PostMessage
-from .pushservice.resources import AddClientToken, DeleteClientToken
+from .pushservice.resources import (
+    AddClientToken,
+    DeleteClientToken,
+    PushDispatchStatistics,
+)
 from .resources import (
     AppliedDelegationFees,
     Balance,
@@ -40,6 +44,7 @@ from .resources import (
     Factories,
     GraphDump,
     GraphImage,
+    GraphSyncStatistics,
     IdentityInfos,
     MaxCapacityPath,
     MetaTransactionFees,
@@ -51,9 +56,11 @@ from .resources import (
     RelayMetaTransaction,
     RequestEther,
     Status,
+    StreamSendQueueStatistics,
     TransactionInfos,
     TransactionStatus,
     TransferInformation,
+    TransferInformationBatch,
     Trustline,
     TrustlineAccruedInterestList,
     TrustlineList,
@@ -111,6 +118,8 @@ def ApiApp(trustlines, *, enabled_apis):
 
     if ApiType.STATUS in enabled_apis:
         add_resource(NetworkList, "/networks")
+        add_resource(GraphSyncStatistics, "/graph-sync")
+        add_resource(StreamSendQueueStatistics, "/stream-send-queues")
         add_resource(Network, "/networks/<address:network_address>")
         add_resource(UserList, "/networks/<address:network_address>/users")
         add_resource(
@@ -132,6 +141,7 @@ def ApiApp(trustlines, *, enabled_apis):
             "mediation-fees",
         )
         add_resource(TransferInformation, "/transfers")
+        add_resource(TransferInformationBatch, "/transfers/batch")
         add_resource(AppliedDelegationFees, "/delegation-fees/")
         add_resource(
             User, "/networks/<address:network_address>/users/<address:user_address>"
@@ -255,6 +265,7 @@ def ApiApp(trustlines, *, enabled_apis):
             DeleteClientToken,
             "/pushnotifications/<address:user_address>/token/<string:client_token>",
         )
+        add_resource(PushDispatchStatistics, "/pushnotifications/dispatch")
 
     app.url_map.converters["address"] = AddressConverter
     app.register_blueprint(api_bp)
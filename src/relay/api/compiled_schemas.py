@@ -0,0 +1,252 @@
+"""dump functions compiled from marshmallow schemas for hot responses
+
+`Schema.dump` looks up the accessor, the default and the data key of every
+field for every dumped object and calls the generic `Field.serialize`. For
+listings with thousands of trustlines or events, this costs more than
+computing the listing. `compile_schema` resolves all of this once per schema
+and returns a function producing the same result as `schema.dump`, with the
+same keys in the same order and the same values. Fields the compiler does
+not know are dumped by the field itself, schemas it cannot compile are
+dumped by `schema.dump`.
+"""
+
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
+
+from marshmallow import Schema, ValidationError, fields
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.utils import ensure_text_type, is_iterable_but_not_string, missing
+from marshmallow_oneofschema import OneOfSchema
+
+from . import fields as relay_fields
+from .schemas import AnyEventSchema
+
+Converter = Callable[[Any], Any]
+
+
+def _serialize_integer(value):
+    if value is None:
+        return None
+    return int(value)
+
+
+def _serialize_float(value):
+    if value is None:
+        return None
+    return float(value)
+
+
+def _serialize_string(value):
+    if value is None:
+        return None
+    return ensure_text_type(value)
+
+
+def _serialize_boolean(value):
+    if value is None:
+        return None
+    elif value in fields.Boolean.truthy:
+        return True
+    elif value in fields.Boolean.falsy:
+        return False
+    return bool(value)
+
+
+def _serialize_address(value):
+    return value
+
+
+def _serialize_big_integer(value):
+    assert isinstance(value, int)
+    return str(value)
+
+
+def _serialize_hex_bytes(value):
+    return "0x{:064X}".format(int.from_bytes(value, "big")).lower()
+
+
+def _make_list_converter(inner: Converter) -> Converter:
+    def serialize_list(value):
+        if value is None:
+            return None
+        return [inner(each) for each in value]
+
+    return serialize_list
+
+
+def _make_nested_converter(dump: Converter) -> Converter:
+    def serialize_nested(value):
+        if value is None:
+            return None
+        return dump(value)
+
+    return serialize_nested
+
+
+def _compile_field(field):
+    """the converter of the value of the field, or None if not supported"""
+    field_type = type(field)
+    if field_type is fields.Integer and not field.as_string:
+        return _serialize_integer
+    if field_type is fields.Float and not field.as_string:
+        return _serialize_float
+    if field_type is fields.String:
+        return _serialize_string
+    if (
+        field_type is fields.Boolean
+        and field.truthy is fields.Boolean.truthy
+        and field.falsy is fields.Boolean.falsy
+    ):
+        return _serialize_boolean
+    if field_type is relay_fields.Address:
+        return _serialize_address
+    if field_type is relay_fields.BigInteger:
+        return _serialize_big_integer
+    if field_type is relay_fields.HexBytes:
+        return _serialize_hex_bytes
+    if field_type is fields.List:
+        inner = _compile_field(field.inner)
+        if inner is not None:
+            return _make_list_converter(inner)
+    if field_type is fields.Nested and not field.only and not field.exclude:
+        nested_dump = _compile(field.schema)
+        if nested_dump is not None:
+            return _make_nested_converter(nested_dump)
+    return None
+
+
+def _get_item_or_attribute(obj, key, default):
+    try:
+        return obj[key]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return getattr(obj, key, default)
+
+
+def _compile_schema(schema: Schema) -> Optional[Converter]:
+    if (
+        type(schema).get_attribute is not Schema.get_attribute
+        or type(schema)._serialize is not Schema._serialize
+        or type(schema).dump is not Schema.dump
+        or schema._has_processors(PRE_DUMP)
+        or schema._has_processors(POST_DUMP)
+    ):
+        return None
+
+    # (key, attribute, default, converter), fields unknown to the compiler
+    # have no attribute and are serialized by the field itself
+    compiled_fields: List[Tuple[str, Optional[str], Any, Converter]] = []
+    for field_name, field in schema.dump_fields.items():
+        key = field.data_key if field.data_key is not None else field_name
+        attribute = field.attribute if field.attribute is not None else field_name
+        converter = _compile_field(field)
+        if (
+            converter is None
+            or not field._CHECK_ATTRIBUTE
+            or type(field).get_value is not fields.Field.get_value
+            or "." in attribute
+        ):
+            compiled_fields.append(
+                (key, None, missing, partial(_serialize_field, field, field_name))
+            )
+        else:
+            compiled_fields.append((key, attribute, field.default, converter))
+
+    def dump(obj):
+        # same lookup as marshmallow's default accessor for keys without dots
+        if hasattr(obj, "__getitem__"):
+            get_value = _get_item_or_attribute
+        else:
+            get_value = getattr
+        result = {}
+        for key, attribute, default, converter in compiled_fields:
+            if attribute is None:
+                value = converter(obj)
+                if value is missing:
+                    continue
+            else:
+                value = get_value(obj, attribute, missing)
+                if value is missing:
+                    if default is missing:
+                        continue
+                    value = default() if callable(default) else default
+                value = converter(value)
+            result[key] = value
+        return result
+
+    return _dump_many(schema, dump) if schema.many else dump
+
+
+def _serialize_field(field: fields.Field, field_name: str, obj):
+    return field.serialize(field_name, obj)
+
+
+def _dump_many(schema: Schema, dump: Converter) -> Converter:
+    def dump_many(objs):
+        if objs is None or not is_iterable_but_not_string(objs):
+            return schema.dump(objs)
+        return [dump(obj) for obj in objs]
+
+    return dump_many
+
+
+def _compile_one_of_schema(schema: OneOfSchema) -> Optional[Converter]:
+    if type(schema)._dump is OneOfSchema._dump:
+        dump_type_field = True
+    elif type(schema)._dump is AnyEventSchema._dump:
+        # AnyEventSchema removes the type field again
+        dump_type_field = False
+    else:
+        return None
+    if type(schema).dump is not OneOfSchema.dump or schema.context:
+        return None
+
+    type_dumps = {}
+    for obj_type, type_schema in schema.type_schemas.items():
+        if not isinstance(type_schema, Schema):
+            type_schema = type_schema()
+        type_dump = _compile(type_schema)
+        if type_dump is None:
+            return None
+        type_dumps[obj_type] = type_dump
+
+    def dump(obj):
+        obj_type = schema.get_obj_type(obj)
+        type_dump = type_dumps.get(obj_type) if obj_type else None
+        if type_dump is None:
+            return schema._dump(obj)
+        result = type_dump(obj)
+        if dump_type_field:
+            result[schema.type_field] = obj_type
+        return result
+
+    if not schema.many:
+        return dump
+
+    def dump_many(objs):
+        objs = list(objs)
+        try:
+            return [dump(obj) for obj in objs]
+        except ValidationError:
+            # The schema collects the errors of all objects
+            return schema.dump(objs)
+
+    return dump_many
+
+
+def _compile(schema: Schema) -> Optional[Converter]:
+    if schema.ordered:
+        return None
+    if isinstance(schema, OneOfSchema):
+        return _compile_one_of_schema(schema)
+    return _compile_schema(schema)
+
+
+def compile_schema(schema: Schema) -> Converter:
+    """a function returning the same as `schema.dump`
+
+    Returns `schema.dump` for schemas that cannot be compiled.
+    """
+    compiled_dump = _compile(schema)
+    if compiled_dump is None:
+        return schema.dump
+    return compiled_dump
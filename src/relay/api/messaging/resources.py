@@ -19,7 +19,10 @@ class PostMessage(Resource):
 
     @use_args(args)
     def post(self, args, user_address: str):
-        self.trustlines.messaging[user_address].publish(
-            MessageEvent(args["message"], type=args["type"], timestamp=int(time.time()))
+        self.trustlines.messaging.publish(
+            user_address,
+            MessageEvent(
+                args["message"], type=args["type"], timestamp=int(time.time())
+            ),
         )
         return "Ok"
@@ -1,6 +1,8 @@
 from flask import abort
 from flask_restful import Resource
 
+from relay.api.resources import dump_result_with_schema
+from relay.api.schemas import PushDispatchStatisticsSchema
 from relay.relay import (
     InvalidClientTokenException,
     TokenNotFoundException,
@@ -30,3 +32,15 @@ class DeleteClientToken(Resource):
         except TokenNotFoundException:
             abort(404, "Token not found")
         return "Ok"
+
+
+class PushDispatchStatistics(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(PushDispatchStatisticsSchema())
+    def get(self):
+        statistics = self.trustlines.get_push_dispatch_statistics()
+        if statistics is None:
+            abort(404, "Push notifications are not enabled")
+        return statistics
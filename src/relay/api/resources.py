@@ -38,6 +38,7 @@ from relay.network_graph.payment_path import FeePayer, PaymentPath
 from relay.relay import TrustlinesRelay, all_event_contract_types
 from relay.utils import get_version, sha3
 
+from .compiled_schemas import compile_schema
 from .schemas import (
     AccruedInterestListSchema,
     AggregatedAccountSummarySchema,
@@ -46,15 +47,19 @@ from .schemas import (
     CurrencyNetworkEventSchema,
     CurrencyNetworkSchema,
     DebtsListInCurrencyNetworkSchema,
+    GraphSyncStatisticsSchema,
     IdentityInfosSchema,
     MediationFeesListSchema,
     MetaTransactionFeeSchema,
     MetaTransactionSchema,
     MetaTransactionStatusSchema,
     PaymentPathSchema,
+    SendQueueStatisticsSchema,
     TransactionIdentifierSchema,
+    TransactionIdentifiersSchema,
     TransactionStatusSchema,
     TransferIdentifierSchema,
+    TransferInformationOfTransactionSchema,
     TransferInformationSchema,
     TransferredSumSchema,
     TrustlineSchema,
@@ -82,11 +87,12 @@ def abort_if_unknown_or_frozen_network(trustlines, network_address):
 
 def dump_result_with_schema(schema):
     """returns a decorator that calls schema.dump on the functions or methods
-    return value"""
+    return value, using a dump function compiled from the schema"""
+    dump = compile_schema(schema)
 
     @wrapt.decorator
     def dump_result(wrapped, instance, args, kwargs):
-        return schema.dump(wrapped(*args, **kwargs))
+        return dump(wrapped(*args, **kwargs))
 
     return dump_result
 
@@ -156,10 +162,37 @@ class Network(Resource):
     def __init__(self, trustlines: TrustlinesRelay) -> None:
         self.trustlines = trustlines
 
+    args = {"withGraphSync": fields.Bool(required=False, missing=False)}
+
+    @use_args(args)
     @dump_result_with_schema(CurrencyNetworkSchema())
-    def get(self, network_address: str):
+    def get(self, args, network_address: str):
         abort_if_unknown_network(self.trustlines, network_address)
-        return self.trustlines.get_network_info(network_address)
+        network_info = self.trustlines.get_network_info(network_address)
+        if args["withGraphSync"]:
+            return {
+                **network_info._asdict(),
+                "graph_sync": self.trustlines.get_graph_sync_status(network_address),
+            }
+        return network_info
+
+
+class GraphSyncStatistics(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(GraphSyncStatisticsSchema())
+    def get(self):
+        return self.trustlines.get_graph_sync_statistics()
+
+
+class StreamSendQueueStatistics(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(SendQueueStatisticsSchema())
+    def get(self):
+        return self.trustlines.get_stream_send_queue_statistics()
 
 
 class UserList(Resource):
@@ -606,6 +639,24 @@ class TransferInformation(Resource):
             raise RuntimeError("Unhandled input parameters.")
 
 
+class TransferInformationBatch(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @use_args(TransactionIdentifiersSchema())
+    @dump_result_with_schema(TransferInformationOfTransactionSchema(many=True))
+    def post(self, args):
+        transfers_per_transaction = (
+            self.trustlines.get_transfer_information_for_tx_hashes(
+                args["transactionHashes"]
+            )
+        )
+        return [
+            {"transactionHash": transaction_hash, "transfers": transfers}
+            for transaction_hash, transfers in transfers_per_transaction.items()
+        ]
+
+
 class AppliedDelegationFees(Resource):
     def __init__(self, trustlines: TrustlinesRelay) -> None:
         self.trustlines = trustlines
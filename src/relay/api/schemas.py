@@ -7,7 +7,7 @@ from marshmallow import (
     post_load,
     validates_schema,
 )
-from marshmallow.validate import Range
+from marshmallow.validate import Length, Range
 from marshmallow_oneofschema import OneOfSchema
 from tldeploy import identity
 from tldeploy.identity import MetaTransaction
@@ -132,6 +132,7 @@ class BlockchainEventSchema(EventSchema):
     status = fields.Str()
     blockHash = HexBytes(attribute="block_hash")
     logIndex = fields.Int(attribute="log_index")
+    transactionIndex = fields.Int(attribute="transaction_index")
 
 
 class CurrencyNetworkEventSchema(BlockchainEventSchema):
@@ -260,6 +261,19 @@ class IdentityInfosSchema(Schema):
     implementationAddress = Address()
 
 
+class GraphSyncStatusSchema(Schema):
+
+    appliedFeedId = fields.Int(attribute="applied_feed_id")
+    maxFeedId = fields.Int(attribute="max_feed_id")
+    feedIdLag = fields.Int(attribute="feed_id_lag")
+    numberOfAppliedUpdates = fields.Int(attribute="number_of_applied_updates")
+    updatesInLastBatch = fields.Int(attribute="updates_in_last_batch")
+    newestUpdateTimestamp = fields.Int(attribute="newest_update_timestamp")
+    newestUpdateAge = fields.Float(attribute="newest_update_age")
+    lastApplyDuration = fields.Float(attribute="last_apply_duration")
+    lastPublishDuration = fields.Float(attribute="last_publish_duration")
+
+
 class CurrencyNetworkSchema(Schema):
 
     abbreviation = fields.Str(attribute="symbol")
@@ -273,6 +287,52 @@ class CurrencyNetworkSchema(Schema):
     customInterests = fields.Bool(attribute="custom_interests")
     preventMediatorInterests = fields.Bool(attribute="prevent_mediator_interests")
     isFrozen = fields.Bool(attribute="is_frozen")
+    graphSync = fields.Nested(GraphSyncStatusSchema, attribute="graph_sync")
+
+
+class GraphSyncStatisticsSchema(Schema):
+
+    numberOfSyncs = fields.Int(attribute="number_of_syncs")
+    numberOfNotifiedSyncs = fields.Int(attribute="number_of_notified_syncs")
+    numberOfAppliedUpdates = fields.Int(attribute="number_of_applied_updates")
+    lastStaleness = fields.Float(attribute="last_staleness")
+    maxStaleness = fields.Float(attribute="max_staleness")
+    averageStaleness = fields.Float(attribute="average_staleness")
+    appliedFeedId = fields.Int(attribute="applied_feed_id")
+    maxFeedId = fields.Int(attribute="max_feed_id")
+    feedIdLag = fields.Int(attribute="feed_id_lag")
+    networks = fields.Method("get_networks")
+
+    def get_networks(self, statistics):
+        return {
+            network_address: GraphSyncStatusSchema().dump(
+                statistics.get_network_status(network_address)
+            )
+            for network_address in statistics.networks
+        }
+
+
+class SendQueueStatisticsSchema(Schema):
+
+    numberOfClients = fields.Int(attribute="number_of_clients")
+    queuedEvents = fields.Int(attribute="queued_events")
+    maxQueueDepth = fields.Int(attribute="max_queue_depth")
+    droppedEvents = fields.Int(attribute="dropped_events")
+    coalescedEvents = fields.Int(attribute="coalesced_events")
+    disconnectedClients = fields.Int(attribute="disconnected_clients")
+
+
+class PushDispatchStatisticsSchema(Schema):
+
+    queuedMessages = fields.Int(attribute="queued_messages")
+    sentMessages = fields.Int(attribute="sent_messages")
+    failedMessages = fields.Int(attribute="failed_messages")
+    retriedMessages = fields.Int(attribute="retried_messages")
+    droppedMessages = fields.Int(attribute="dropped_messages")
+    invalidClientTokens = fields.Int(attribute="invalid_client_tokens")
+    numberOfBatches = fields.Int(attribute="number_of_batches")
+    lastBatchLatency = fields.Float(attribute="last_batch_latency")
+    averageBatchLatency = fields.Float(attribute="average_batch_latency")
 
 
 class PaymentPathSchema(Schema):
@@ -371,6 +431,19 @@ class TransferIdentifierSchema(Schema):
     logIndex = fields.Int(required=False, missing=None, validate=Range(min=0))
 
 
+class TransactionIdentifiersSchema(Schema):
+
+    transactionHashes = fields.List(
+        Hash(), required=True, validate=Length(min=1, max=100)
+    )
+
+
+class TransferInformationOfTransactionSchema(Schema):
+
+    transactionHash = fields.String(required=True)
+    transfers = fields.Nested(TransferInformationSchema, many=True, required=True)
+
+
 class TransactionIdentifierSchema(Schema):
 
     transactionHash = Hash(required=True)
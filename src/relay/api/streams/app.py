@@ -4,20 +4,32 @@ from tinyrpc.dispatch import RPCDispatcher
 from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
 
 from relay.relay import TrustlinesRelay
+from relay.streams import OverflowPolicy
 
 from .rpc_methods import get_missed_messages, messaging_subscribe, subscribe
 from .transport import RPCWebSocketApplication
 
 
+def _send_queue_settings(trustlines: TrustlinesRelay):
+    config = trustlines.config["streams"]
+    return dict(
+        max_queue_size=config["send_queue_size"],
+        overflow_policy=OverflowPolicy(config["overflow_policy"]),
+        statistics=trustlines.stream_send_queue_statistics,
+        batch_window=config["batch_window"],
+    )
+
+
 def WebSocketRPCHandler(trustlines: TrustlinesRelay):
 
     dispatcher = RPCDispatcher()
     dispatcher.add_method(partial(subscribe, trustlines), "subscribe")
 
     protocol = JSONRPCProtocol()
+    send_queue_settings = _send_queue_settings(trustlines)
 
     def handle(ws):
-        app = RPCWebSocketApplication(protocol, dispatcher, ws)
+        app = RPCWebSocketApplication(protocol, dispatcher, ws, **send_queue_settings)
         app.handle()
 
     return handle
@@ -30,9 +42,10 @@ def MessagingWebSocketRPCHandler(trustlines: TrustlinesRelay):
     dispatcher.add_method(partial(get_missed_messages, trustlines), "getMissedMessages")
 
     protocol = JSONRPCProtocol()
+    send_queue_settings = _send_queue_settings(trustlines)
 
     def handle(ws):
-        app = RPCWebSocketApplication(protocol, dispatcher, ws)
+        app = RPCWebSocketApplication(protocol, dispatcher, ws, **send_queue_settings)
         app.handle()
 
     return handle
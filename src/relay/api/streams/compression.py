@@ -0,0 +1,204 @@
+"""permessage-deflate (RFC 7692) for the websockets of gevent-websocket
+
+gevent-websocket does not support websocket extensions. The
+DeflateWebSocketHandler accepts the permessage-deflate extension if the
+client offers it and then uses a DeflateWebSocket, which compresses text
+and binary messages of at least MIN_COMPRESSED_SIZE bytes and inflates
+compressed messages of the client.
+
+No compression context is kept between messages in both directions, so a
+connection does not hold on to zlib state. Batched stream frames are big
+enough to compress well on their own.
+"""
+
+import zlib
+from typing import Dict, Optional
+
+from geventwebsocket.exceptions import ProtocolError, WebSocketError
+from geventwebsocket.handler import WebSocketHandler
+from geventwebsocket.websocket import (
+    MSG_ALREADY_CLOSED,
+    MSG_SOCKET_DEAD,
+    Header,
+    WebSocket,
+)
+
+EXTENSION_NAME = "permessage-deflate"
+# messages smaller than this are sent uncompressed
+MIN_COMPRESSED_SIZE = 128
+# gevent-websocket counts the reserved bits from 0, this is RSV1 of RFC 6455
+COMPRESSED_FLAG = Header.RSV0_MASK
+# zlib does not support raw deflate streams with windows of 256 bytes
+MIN_WINDOW_BITS = 9
+MAX_WINDOW_BITS = 15
+# inflated messages of clients may not be bigger, they only send rpc requests
+MAX_DECOMPRESSED_SIZE = 1_000_000
+_SYNC_FLUSH_TAIL = b"\x00\x00\xff\xff"
+
+
+def parse_deflate_offer(extensions_header: str) -> Optional[Dict[str, str]]:
+    """the parameters of the first permessage-deflate offer, None if there is none"""
+    for extension in extensions_header.split(","):
+        name, *parameters = [part.strip() for part in extension.split(";")]
+        if name != EXTENSION_NAME:
+            continue
+        offer = {}
+        for parameter in parameters:
+            key, _, value = parameter.partition("=")
+            offer[key.strip()] = value.strip().strip('"')
+        return offer
+    return None
+
+
+def negotiate_deflate(offer: Dict[str, str]) -> Optional[int]:
+    """the window bits to compress with if the offer can be accepted"""
+    window_bits = MAX_WINDOW_BITS
+    if "server_max_window_bits" in offer:
+        try:
+            window_bits = int(offer["server_max_window_bits"])
+        except ValueError:
+            return None
+        if not MIN_WINDOW_BITS <= window_bits <= MAX_WINDOW_BITS:
+            return None
+    return window_bits
+
+
+def compress_message(data: bytes, window_bits: int = MAX_WINDOW_BITS) -> bytes:
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window_bits
+    )
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    assert compressed.endswith(_SYNC_FLUSH_TAIL)
+    return compressed[: -len(_SYNC_FLUSH_TAIL)]
+
+
+def decompress_message(data: bytes, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """inflates the message, raises ProtocolError if it gets bigger than max_size"""
+    decompressor = zlib.decompressobj(-MAX_WINDOW_BITS)
+    try:
+        decompressed = decompressor.decompress(data + _SYNC_FLUSH_TAIL, max_size)
+    except zlib.error as e:
+        raise ProtocolError("Invalid compressed message") from e
+    if decompressor.unconsumed_tail:
+        raise ProtocolError("Compressed message is too big")
+    return decompressed
+
+
+class DeflateWebSocket(WebSocket):
+    def __init__(self, environ, stream, handler, *, window_bits: int) -> None:
+        super().__init__(environ, stream, handler)
+        self.window_bits = window_bits
+
+    def send_frame(self, message, opcode):
+        if opcode not in (self.OPCODE_TEXT, self.OPCODE_BINARY):
+            return super().send_frame(message, opcode)
+
+        if self.closed:
+            self.current_app.on_close(MSG_ALREADY_CLOSED)
+            raise WebSocketError(MSG_ALREADY_CLOSED)
+        if opcode == self.OPCODE_TEXT:
+            message = self._encode_bytes(message)
+        else:
+            message = bytes(message)
+
+        flags = 0
+        if len(message) >= MIN_COMPRESSED_SIZE:
+            message = compress_message(message, self.window_bits)
+            flags = COMPRESSED_FLAG
+        header = Header.encode_header(True, opcode, b"", len(message), flags)
+        try:
+            self.raw_write(header + message)
+        except OSError:
+            raise WebSocketError(MSG_SOCKET_DEAD)
+
+    def read_frame(self):
+        header = Header.decode_header(self.stream)
+        if header.flags & ~COMPRESSED_FLAG:
+            raise ProtocolError
+        if header.flags and header.opcode not in (self.OPCODE_TEXT, self.OPCODE_BINARY):
+            raise ProtocolError("Only the first frame of a message may be compressed")
+
+        if not header.length:
+            return header, b""
+        try:
+            payload = self.raw_read(header.length)
+        except Exception:
+            payload = b""
+        if len(payload) != header.length:
+            raise WebSocketError("Unexpected EOF reading frame payload")
+        if header.mask:
+            payload = header.unmask_payload(payload)
+        return header, payload
+
+    def read_message(self):
+        """like `WebSocket.read_message`, inflating compressed messages"""
+        opcode = None
+        compressed = False
+        message = bytearray()
+
+        while True:
+            header, payload = self.read_frame()
+            f_opcode = header.opcode
+
+            if f_opcode in (self.OPCODE_TEXT, self.OPCODE_BINARY):
+                if opcode:
+                    raise ProtocolError(
+                        "The opcode in non-fin frame is expected to be zero, "
+                        "got {0!r}".format(f_opcode)
+                    )
+                opcode = f_opcode
+                compressed = bool(header.flags & COMPRESSED_FLAG)
+            elif f_opcode == self.OPCODE_CONTINUATION:
+                if not opcode:
+                    raise ProtocolError("Unexpected frame with opcode=0")
+            elif f_opcode == self.OPCODE_PING:
+                self.handle_ping(header, payload)
+                continue
+            elif f_opcode == self.OPCODE_PONG:
+                self.handle_pong(header, payload)
+                continue
+            elif f_opcode == self.OPCODE_CLOSE:
+                self.handle_close(header, payload)
+                return None
+            else:
+                raise ProtocolError("Unexpected opcode={0!r}".format(f_opcode))
+
+            message += payload
+            if header.fin:
+                break
+
+        if compressed:
+            message = bytearray(decompress_message(bytes(message)))
+        if opcode == self.OPCODE_TEXT:
+            self.utf8validator.reset()
+            self.validate_utf8(message)
+            return self._decode_bytes(message)
+        return message
+
+
+class DeflateWebSocketHandler(WebSocketHandler):
+    """WebSocketHandler accepting the permessage-deflate extension"""
+
+    def start_response(self, status, headers, exc_info=None):
+        websocket = self.environ.get("wsgi.websocket")
+        if str(status).startswith("101") and websocket is not None:
+            offer = parse_deflate_offer(
+                self.environ.get("HTTP_SEC_WEBSOCKET_EXTENSIONS", "")
+            )
+            window_bits = negotiate_deflate(offer) if offer is not None else None
+            if window_bits is not None:
+                self.websocket = DeflateWebSocket(
+                    self.environ, websocket.stream, self, window_bits=window_bits
+                )
+                self.environ["wsgi.websocket"] = self.websocket
+                accepted = [
+                    EXTENSION_NAME,
+                    "server_no_context_takeover",
+                    "client_no_context_takeover",
+                ]
+                if window_bits != MAX_WINDOW_BITS:
+                    accepted.append(f"server_max_window_bits={window_bits}")
+                headers = list(headers) + [
+                    ("Sec-WebSocket-Extensions", "; ".join(accepted))
+                ]
+        return super().start_response(status, headers, exc_info=exc_info)
@@ -1,54 +1,177 @@
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Optional
 
-from marshmallow import Schema, ValidationError, fields
+from marshmallow import Schema, ValidationError, fields, validate
 
-from relay.relay import TrustlinesRelay
-from relay.streams import Client
+from relay.relay import ContractTypes, TrustlinesRelay, all_event_contract_types
+from relay.streams import Client, QueuedClient, Subscription, SubscriptionFilter
 
 from ..fields import Address
 from ..schemas import MessageEventSchema
 from .rpc_protocol import check_args
 
 
+def _check_batching(client: Client, batch: bool) -> None:
+    if batch and not isinstance(client, QueuedClient):
+        raise ValidationError("Batching is not supported by this connection")
+
+
+def _enable_batching(client: Client, subscription: Subscription) -> None:
+    assert isinstance(client, QueuedClient)
+    client.enable_batching(subscription)
+
+
+class CursorSchema(Schema):
+
+    blockNumber = fields.Integer(required=True, validate=validate.Range(min=0))
+    transactionIndex = fields.Integer(required=True, validate=validate.Range(min=0))
+    logIndex = fields.Integer(required=True, validate=validate.Range(min=0))
+
+
 class SubscribeSchema(Schema):
 
     event = fields.String(required=True)
     user = Address(required=True)
+    batch = fields.Boolean(missing=False)
+    networks = fields.List(Address(), missing=None, validate=validate.Length(min=1))
+    types = fields.List(fields.String(), missing=None, validate=validate.Length(min=1))
+    contract_types = fields.List(
+        fields.String(validate=validate.OneOf(all_event_contract_types)),
+        missing=None,
+        validate=validate.Length(min=1),
+        data_key="contractTypes",
+    )
+    cursor = fields.Nested(CursorSchema, missing=None)
 
 
 @check_args(SubscribeSchema())
-def subscribe(trustlines: TrustlinesRelay, client: Client, event: str, user: str):
+def subscribe(
+    trustlines: TrustlinesRelay,
+    client: Client,
+    event: str,
+    user: str,
+    batch: bool,
+    networks: Optional[List[str]],
+    types: Optional[List[str]],
+    contract_types: Optional[List[str]],
+    cursor: Optional[Dict],
+):
+    _check_batching(client, batch)
     if event == "all":
-        subscriber = trustlines.subjects[user].subscribe(client)
+        subscription_filter = None
+        if networks is not None or types is not None or contract_types is not None:
+            subscription_filter = SubscriptionFilter(
+                network_addresses=networks,
+                event_types=types,
+                contract_types=contract_types,
+            )
+        subscriber = trustlines.subjects[user].subscribe(
+            client, subscription_filter=subscription_filter
+        )
     else:
         raise ValidationError("Invalid event")
+    if batch:
+        _enable_batching(client, subscriber)
+    if cursor is not None:
+        _replay_missed_events(trustlines, subscriber, user, cursor, contract_types)
     return subscriber.id
 
 
+def _replay_missed_events(
+    trustlines: TrustlinesRelay,
+    subscription: Subscription,
+    user: str,
+    cursor: Dict,
+    contract_types: Optional[List[str]],
+) -> None:
+    """replay the currency network events after cursor, then continue live
+
+    Only currency network events are published live, so no other events
+    are replayed. Live events arriving while the missed events are read are
+    held back by the subscription and sent afterwards.
+    """
+    event_cursor = (
+        cursor["blockNumber"],
+        cursor["transactionIndex"],
+        cursor["logIndex"],
+    )
+    max_replayed_events = trustlines.config["streams"]["max_replayed_events"]
+    subscription.hold()
+    try:
+        if (
+            contract_types is None
+            or ContractTypes.CURRENCY_NETWORK.value in contract_types
+        ):
+            missed_events = trustlines.get_user_events(
+                user,
+                contract_type=ContractTypes.CURRENCY_NETWORK,
+                after=event_cursor,
+                limit=max_replayed_events + 1,
+            )
+        else:
+            missed_events = []
+    except Exception:
+        subscription.unsubscribe()
+        raise
+    if len(missed_events) > max_replayed_events:
+        subscription.unsubscribe()
+        raise ValidationError(
+            f"More than {max_replayed_events} missed events, get them via the REST api"
+        )
+    subscription.resume(missed_events, event_cursor)
+
+
 class MessagingSchema(Schema):
 
     type = fields.String(required=True)
     user = Address(required=True)
 
 
-@check_args(MessagingSchema())
+class MessagingSubscribeSchema(MessagingSchema):
+
+    batch = fields.Boolean(missing=False)
+    types = fields.List(fields.String(), missing=None, validate=validate.Length(min=1))
+
+
+@check_args(MessagingSubscribeSchema())
 def messaging_subscribe(
-    trustlines: TrustlinesRelay, client: Client, type: str, user: str
+    trustlines: TrustlinesRelay,
+    client: Client,
+    type: str,
+    user: str,
+    batch: bool,
+    types: Optional[List[str]],
 ):
+    _check_batching(client, batch)
     if type == "all":
-        subscriber = trustlines.messaging[user].subscribe(client)
+        subscription_filter = None
+        if types is not None:
+            subscription_filter = SubscriptionFilter(event_types=types)
+        subscriber = trustlines.messaging[user].subscribe(
+            client, subscription_filter=subscription_filter
+        )
     else:
         raise ValidationError("Invalid message type")
+    if batch:
+        _enable_batching(client, subscriber)
     return subscriber.id
 
 
-@check_args(MessagingSchema())
+class MissedMessagesSchema(MessagingSchema):
+
+    limit = fields.Integer(missing=None, validate=validate.Range(min=1))
+
+
+@check_args(MissedMessagesSchema())
 def get_missed_messages(
-    trustlines: TrustlinesRelay, client: Client, type: str, user: str
+    trustlines: TrustlinesRelay,
+    client: Client,
+    type: str,
+    user: str,
+    limit: Optional[int],
 ) -> Iterable[Dict]:
     if type == "all":
         messages = MessageEventSchema().dump(
-            trustlines.messaging[user].get_missed_messages(), many=True
+            trustlines.messaging[user].get_missed_messages(limit), many=True
         )
     else:
         raise ValidationError("Invalid message type")
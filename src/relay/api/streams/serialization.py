@@ -0,0 +1,73 @@
+"""serialize stream events once, independent of the number of subscribers
+
+All subscriptions of a subject receive the same event object. The json of
+an event is therefore cached per event object and the json-rpc
+notification of a subscription is built by splicing the subscription id
+into it, instead of dumping the event with marshmallow for every
+subscription.
+"""
+
+import json
+import weakref
+from typing import List, Optional
+
+from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
+
+from relay.blockchain.events import TLNetworkEvent
+from relay.events import AccountEvent, Event, MessageEvent
+
+from ..schemas import MessageEventSchema, UserCurrencyNetworkEventSchema
+
+_user_currency_network_event_schema = UserCurrencyNetworkEventSchema()
+_message_event_schema = MessageEventSchema()
+
+# The events are only referenced while they are published, the cache
+# entries vanish together with the events.
+_serialized_events: "weakref.WeakKeyDictionary[Event, str]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def serialize_event(event: Event) -> Optional[str]:
+    """the json of the event, computed once per event object
+
+    Returns None for events that cannot be sent over the stream.
+    """
+    serialized_event = _serialized_events.get(event)
+    if serialized_event is not None:
+        return serialized_event
+
+    if isinstance(event, TLNetworkEvent) or isinstance(event, AccountEvent):
+        data = _user_currency_network_event_schema.dump(event)
+    elif isinstance(event, MessageEvent):
+        data = _message_event_schema.dump(event)
+    else:
+        return None
+    assert isinstance(data, dict)
+    serialized_event = json.dumps(data)
+    _serialized_events[event] = serialized_event
+    return serialized_event
+
+
+def create_subscription_notification(
+    subscription_id: str, serialized_event: str
+) -> str:
+    """the json-rpc notification sending the serialized event to a subscription
+
+    The result is the same as serializing the one way request
+    `subscription_<id>(event=event)` with tinyrpc's JSONRPCProtocol.
+    """
+    method = json.dumps("subscription_" + str(subscription_id))
+    return (
+        f'{{"jsonrpc": "{JSONRPCProtocol.JSON_RPC_VERSION}", "method": {method}, '
+        f'"params": {{"event": {serialized_event}}}}}'
+    )
+
+
+def create_batch_notification(notifications: List[str]) -> str:
+    """a json-rpc batch of the notifications, sent in one websocket frame
+
+    The result is the same as serializing a batch of the notifications with
+    tinyrpc's JSONRPCProtocol.
+    """
+    return "[" + ", ".join(notifications) + "]"
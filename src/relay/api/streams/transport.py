@@ -1,25 +1,51 @@
 import logging
-from typing import Union
+from typing import List, Tuple, Union
 
 from geventwebsocket import WebSocketApplication, WebSocketError
 from tinyrpc import BadRequestError
 
-from relay.blockchain.events import Event, TLNetworkEvent
-from relay.events import AccountEvent, MessageEvent
-from relay.streams import Client, DisconnectedError, Subscription
+from relay.events import Event
+from relay.streams import (
+    DisconnectedError,
+    OverflowPolicy,
+    QueuedClient,
+    SendQueueStatistics,
+    Subscription,
+)
 
-from ..schemas import MessageEventSchema, UserCurrencyNetworkEventSchema
 from .rpc_protocol import validating_rpc_caller
+from .serialization import (
+    create_batch_notification,
+    create_subscription_notification,
+    serialize_event,
+)
 
 logger = logging.getLogger("websockets")
 
 
 class RPCWebSocketApplication(WebSocketApplication):
-    def __init__(self, rpc_protocol, dispatcher, ws):
+    def __init__(
+        self,
+        rpc_protocol,
+        dispatcher,
+        ws,
+        *,
+        max_queue_size: int,
+        overflow_policy: OverflowPolicy,
+        statistics: SendQueueStatistics,
+        batch_window: float,
+    ):
         super().__init__(ws)
         self.rpc = rpc_protocol
         self.dispatcher = dispatcher
-        self.client = RPCWebSocketClient(self.ws, self.rpc)
+        self.client = RPCWebSocketClient(
+            self.ws,
+            self.rpc,
+            max_queue_size=max_queue_size,
+            overflow_policy=overflow_policy,
+            statistics=statistics,
+            batch_window=batch_window,
+        )
 
     def on_open(self):
         logger.debug("Websocket connected")
@@ -69,27 +95,58 @@ class RPCWebSocketApplication(WebSocketApplication):
         self.client.close()
 
 
-class RPCWebSocketClient(Client):
-    def __init__(self, ws, rpc_protocol):
-        super().__init__()
+class RPCWebSocketClient(QueuedClient):
+    def __init__(
+        self,
+        ws,
+        rpc_protocol,
+        *,
+        max_queue_size: int,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        statistics: SendQueueStatistics = None,
+        batch_window: float = 0.05,
+    ):
+        super().__init__(
+            max_queue_size=max_queue_size,
+            overflow_policy=overflow_policy,
+            statistics=statistics,
+            batch_window=batch_window,
+        )
         self.ws = ws
         self.rpc = rpc_protocol
 
+    def _disconnect(self) -> None:
+        super()._disconnect()
+        if not self.ws.closed:
+            try:
+                # 1008: policy violation
+                self.ws.close(code=1008, message=b"Too many queued events")
+            except WebSocketError:
+                pass
+
     def _execute_send(self, subscription: Subscription, event: Event) -> None:
-        if isinstance(event, TLNetworkEvent) or isinstance(event, AccountEvent):
-            data = UserCurrencyNetworkEventSchema().dump(event)
-        elif isinstance(event, MessageEvent):
-            data = MessageEventSchema().dump(event)
-        else:
+        notification = self._create_notification(subscription, event)
+        if notification is not None:
+            self._send_frame(notification)
+
+    def _execute_send_batch(self, batch: List[Tuple[Subscription, Event]]) -> None:
+        notifications = []
+        for subscription, event in batch:
+            notification = self._create_notification(subscription, event)
+            if notification is not None:
+                notifications.append(notification)
+        if notifications:
+            self._send_frame(create_batch_notification(notifications))
+
+    def _create_notification(self, subscription: Subscription, event: Event):
+        serialized_event = serialize_event(event)
+        if serialized_event is None:
             logger.warning("Could not sent event of type: %s", type(event))
-            return
-        assert isinstance(data, dict)
-        request = self.rpc.create_request(
-            "subscription_" + str(subscription.id), args={"event": data}, one_way=True
-        )
-        result: bytes = request.serialize()
-        assert type(result) == bytes, "Request did not return data of type bytes"
+            return None
+        return create_subscription_notification(subscription.id, serialized_event)
+
+    def _send_frame(self, data: str) -> None:
         try:
-            self.ws.send(result.decode())  # Make sure to send a string over ws
+            self.ws.send(data)
         except WebSocketError as e:
             raise DisconnectedError from e
@@ -0,0 +1,145 @@
+"""coalesce the balance events of users getting graph feed updates in bursts
+
+A user mediating many transfers gets updates of the same trustlines in
+consecutive graph syncs. Instead of publishing the balance events of every
+sync, the BalanceEventDebouncer waits until there was no update of a
+trustline or a user in a network for `window` seconds, and then publishes
+the events once. The events are generated from the graph when they are
+published, so they carry the latest state. Events are never delayed by more
+than `max_delay` seconds after the first update they cover.
+"""
+
+import logging
+import sys
+import time
+from typing import Callable, Dict, Tuple
+
+import attr
+import gevent
+import gevent.event
+
+logger = logging.getLogger("balance_event_debouncer")
+
+
+@attr.s
+class _PendingEvent:
+    timestamp: int = attr.ib()
+    first_update: float = attr.ib()
+    last_update: float = attr.ib()
+
+
+@attr.s
+class BalanceEventDebouncerStatistics:
+    coalesced_events: int = attr.ib(default=0)
+    published_events: int = attr.ib(default=0)
+
+
+class BalanceEventDebouncer:
+    def __init__(
+        self,
+        publish_trustline_events: Callable[..., None],
+        publish_network_balance_event: Callable[..., None],
+        *,
+        window: float,
+        max_delay: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            publish_trustline_events: called with the keyword arguments
+                user1, user2, network_address and timestamp
+            publish_network_balance_event: called with the keyword arguments
+                user, network_address and timestamp
+            clock: returns the current time in seconds
+        """
+        if max_delay < window:
+            raise ValueError("max_delay has to be at least the window")
+        self.publish_trustline_events = publish_trustline_events
+        self.publish_network_balance_event = publish_network_balance_event
+        self.window = window
+        self.max_delay = max_delay
+        self.clock = clock
+        self.statistics = BalanceEventDebouncerStatistics()
+        # insertion ordered, the keys are (network_address, user1, user2) of
+        # trustlines with user1 < user2 and (network_address, user) of users
+        self._pending: Dict[Tuple[str, ...], _PendingEvent] = {}
+        self._has_pending = gevent.event.Event()
+
+    def start(self) -> None:
+        greenlet = gevent.Greenlet.spawn(self._publish_loop)
+        greenlet.link_exception(
+            lambda *args: sys.exit("Balance event debouncer greenlet died")
+        )
+
+    def add_trustline_update(
+        self, *, user1: str, user2: str, network_address: str, timestamp: int
+    ) -> None:
+        user1, user2 = sorted((user1, user2))
+        self._add((network_address, user1, user2), timestamp)
+
+    def add_user_update(self, *, user: str, network_address: str, timestamp: int):
+        self._add((network_address, user), timestamp)
+
+    def _add(self, key: Tuple[str, ...], timestamp: int) -> None:
+        now = self.clock()
+        pending_event = self._pending.get(key)
+        if pending_event is None:
+            self._pending[key] = _PendingEvent(timestamp, now, now)
+            self._has_pending.set()
+        else:
+            self.statistics.coalesced_events += 1
+            pending_event.timestamp = max(pending_event.timestamp, timestamp)
+            pending_event.last_update = now
+
+    def _due_time(self, pending_event: _PendingEvent) -> float:
+        return min(
+            pending_event.last_update + self.window,
+            pending_event.first_update + self.max_delay,
+        )
+
+    def flush(self) -> None:
+        """publish all pending events now"""
+        self._publish_due(float("inf"))
+
+    def _publish_due(self, now: float) -> None:
+        due_keys = [
+            key
+            for key, pending_event in self._pending.items()
+            if self._due_time(pending_event) <= now
+        ]
+        for key in due_keys:
+            pending_event = self._pending.pop(key)
+            try:
+                self._publish(key, pending_event.timestamp)
+            except Exception:
+                logger.exception("Could not publish balance events of %s", key)
+
+    def _publish(self, key: Tuple[str, ...], timestamp: int) -> None:
+        self.statistics.published_events += 1
+        if len(key) == 3:
+            network_address, user1, user2 = key
+            self.publish_trustline_events(
+                user1=user1,
+                user2=user2,
+                network_address=network_address,
+                timestamp=timestamp,
+            )
+        else:
+            network_address, user = key
+            self.publish_network_balance_event(
+                user=user, network_address=network_address, timestamp=timestamp
+            )
+
+    def _publish_loop(self) -> None:
+        while True:
+            self._has_pending.wait()
+            self._has_pending.clear()
+            while self._pending:
+                # All pending events share the window, so events added while
+                # sleeping are never due before the earliest pending one.
+                next_due_time = min(
+                    self._due_time(pending_event)
+                    for pending_event in self._pending.values()
+                )
+                gevent.sleep(max(0.0, next_due_time - self.clock()))
+                self._publish_due(self.clock())
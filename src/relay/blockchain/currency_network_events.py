@@ -12,6 +12,9 @@ NetworkFreezeEventType = "NetworkFreeze"
 
 
 class CurrencyNetworkEvent(TLNetworkEvent):
+
+    contract_type = "CurrencyNetwork"
+
     def __init__(self, web3_event, current_blocknumber, timestamp, user=None):
         super().__init__(
             web3_event, current_blocknumber, timestamp, from_to_types, user
@@ -90,6 +93,9 @@ class TrustlineRequestCancelEvent(CurrencyNetworkEvent):
 
 
 class NetworkFreezeEvent(BlockchainEvent):
+
+    contract_type = "CurrencyNetwork"
+
     def __init__(self, web3_event, current_blocknumber: int, timestamp: int):
         super().__init__(web3_event, current_blocknumber, timestamp)
         self.network_address = web3_event.get("address")
@@ -4,6 +4,9 @@ import hexbytes
 
 from ..events import Event
 
+# number of blocks on top of the block of an event for the event to be confirmed
+CONFIRMATION_DEPTH = 5
+
 
 class BlockchainEvent(Event):
     def __init__(self, web3_event, current_blocknumber: int, timestamp: int) -> None:
@@ -27,7 +30,7 @@ class BlockchainEvent(Event):
     def status(self) -> str:
         if self.blocknumber is None:
             return "sent"
-        elif (self._current_blocknumber - self.blocknumber) < 5:
+        elif (self._current_blocknumber - self.blocknumber) < CONFIRMATION_DEPTH:
             return "pending"
         else:
             return "confirmed"
@@ -7,6 +7,9 @@ LogCancelEventType = "LogCancel"
 
 
 class ExchangeEvent(TLNetworkEvent):
+
+    contract_type = "Exchange"
+
     def __init__(self, web3_event, current_blocknumber, timestamp, user=None):
         super().__init__(
             web3_event, current_blocknumber, timestamp, from_to_types, user
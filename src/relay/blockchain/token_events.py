@@ -5,6 +5,9 @@ ApprovalEventType = "Approval"
 
 
 class TokenEvent(TLNetworkEvent):
+
+    contract_type = "Token"
+
     def __init__(self, web3_event, current_blocknumber, timestamp, user=None):
         super().__init__(
             web3_event, current_blocknumber, timestamp, from_to_types, user
@@ -7,6 +7,9 @@ ApprovalEventType = "Approval"
 
 
 class UnwEthEvent(TLNetworkEvent):
+
+    contract_type = "UnwETH"
+
     def __init__(self, web3_event, current_blocknumber, timestamp, user=None):
         super().__init__(
             web3_event, current_blocknumber, timestamp, from_to_types, user
@@ -44,5 +44,12 @@ def main():
     relay.main.main()
 
 
+def db_main():
+    setup_basic_logging()
+    import relay.db_commands
+
+    relay.db_commands.cli()
+
+
 if __name__ == "__main__":
     main()
@@ -1,7 +1,16 @@
 from eth_utils import is_address, to_checksum_address
-from marshmallow import Schema, ValidationError, fields, pre_load, validates_schema
+from marshmallow import (
+    Schema,
+    ValidationError,
+    fields,
+    pre_load,
+    validate,
+    validates_schema,
+)
 
 from relay.blockchain.delegate import GasPriceMethod
+from relay.blockchain.events import CONFIRMATION_DEPTH
+from relay.pushservice import dedup_store
 from relay.web3provider import ProviderType
 
 
@@ -57,6 +66,57 @@ class FaucetSchema(Schema):
 class TrustlineIndexSchema(Schema):
     enable = fields.Boolean(missing=True)
     sync_interval = fields.Integer(missing=1)
+    listen_for_notifications = fields.Boolean(missing=False)
+    install_notification_trigger = fields.Boolean(missing=True)
+    feed_chunk_size = fields.Integer(missing=10_000)
+    max_pending_batches_per_network = fields.Integer(missing=10)
+    sync_id_storage = fields.String(
+        missing="file", validate=validate.OneOf(["file", "database"])
+    )
+    sync_id_name = fields.String(missing="default")
+    sync_id_persist_interval = fields.Integer(missing=10)
+    balance_event_window = fields.Float(missing=0.0, validate=validate.Range(min=0))
+    balance_event_max_delay = fields.Float(missing=1.0, validate=validate.Range(min=0))
+
+    @validates_schema
+    def validate_balance_event_max_delay(self, in_data, **kwargs):
+        if in_data["balance_event_max_delay"] < in_data["balance_event_window"]:
+            raise ValidationError(
+                "balance_event_max_delay has to be at least balance_event_window"
+            )
+
+
+class UserEventsIndexSchema(Schema):
+    enable = fields.Boolean(missing=False)
+    sync_interval = fields.Integer(missing=1)
+    # has to be at least the number of confirmations ethindex waits for
+    reorg_depth = fields.Integer(missing=50)
+    max_blocks_per_sync = fields.Integer(missing=10_000)
+
+
+class EventsCacheSchema(Schema):
+    enable = fields.Boolean(missing=False)
+    max_rows = fields.Integer(missing=1_000_000)
+    confirmation_depth = fields.Integer(missing=CONFIRMATION_DEPTH)
+
+
+class MediationFeesLedgerSchema(Schema):
+    enable = fields.Boolean(missing=False)
+    confirmation_depth = fields.Integer(missing=CONFIRMATION_DEPTH)
+
+
+class AccruedInterestsLedgerSchema(Schema):
+    enable = fields.Boolean(missing=False)
+    sync_interval = fields.Integer(missing=1)
+    # has to be at least the number of confirmations ethindex waits for
+    reorg_depth = fields.Integer(missing=50)
+    max_blocks_per_sync = fields.Integer(missing=10_000)
+
+
+class TransferInformationCacheSchema(Schema):
+    enable = fields.Boolean(missing=False)
+    max_entries = fields.Integer(missing=10_000)
+    confirmation_depth = fields.Integer(missing=CONFIRMATION_DEPTH)
 
 
 class GasPriceMethodField(fields.Field):
@@ -130,11 +190,64 @@ class TxRelaySchema(Schema):
 
 class MessagingSchema(Schema):
     enable = fields.Boolean(missing=True)
+    missed_messages_storage = fields.String(
+        missing="memory", validate=validate.OneOf(["memory", "database"])
+    )
+    max_missed_messages_per_user = fields.Integer(
+        missing=100, validate=validate.Range(min=1)
+    )
+    max_users_with_missed_messages = fields.Integer(
+        missing=100_000, validate=validate.Range(min=1)
+    )
+    missed_messages_ttl = fields.Integer(missing=604_800)
+    event_bus = fields.String(
+        missing="in_process", validate=validate.OneOf(["in_process", "postgres"])
+    )
+
+    @validates_schema
+    def validate_missed_messages_storage(self, in_data, **kwargs):
+        if (
+            in_data["event_bus"] == "postgres"
+            and in_data["missed_messages_storage"] != "database"
+        ):
+            raise ValidationError(
+                'event_bus "postgres" requires missed_messages_storage "database"'
+            )
+
+
+class StreamsSchema(Schema):
+    send_queue_size = fields.Integer(missing=1000, validate=validate.Range(min=1))
+    overflow_policy = fields.String(
+        missing="drop_oldest",
+        validate=validate.OneOf(["drop_oldest", "coalesce", "disconnect"]),
+    )
+    batch_window = fields.Float(missing=0.05, validate=validate.Range(min=0))
+    permessage_deflate = fields.Boolean(missing=False)
+    max_replayed_events = fields.Integer(missing=1000, validate=validate.Range(min=0))
 
 
 class PushNotificationSchema(Schema):
     enable = fields.Boolean(missing=False)
     firebase_credentials_path = fields.String(missing="firebaseAccountKey.json")
+    number_of_workers = fields.Integer(missing=4, validate=validate.Range(min=1))
+    max_batch_size = fields.Integer(missing=100, validate=validate.Range(1, 500))
+    send_concurrency = fields.Integer(missing=10, validate=validate.Range(min=1))
+    max_queue_size = fields.Integer(missing=10_000, validate=validate.Range(min=1))
+    max_retries = fields.Integer(missing=3, validate=validate.Range(min=0))
+    retry_backoff = fields.Float(missing=1.0)
+    validate_client_tokens_at_startup = fields.Boolean(missing=True)
+    client_token_validation_concurrency = fields.Integer(
+        missing=10, validate=validate.Range(min=1)
+    )
+    dedup_storage = fields.String(
+        missing="memory", validate=validate.OneOf(["memory", "database"])
+    )
+    dedup_memory_budget = fields.Integer(
+        missing=dedup_store.DEFAULT_MEMORY_BUDGET, validate=validate.Range(min=1000)
+    )
+    dedup_ttl = fields.Integer(
+        missing=dedup_store.DEFAULT_TTL, validate=validate.Range(min=1)
+    )
 
 
 class RESTSchema(Schema):
@@ -215,10 +328,16 @@ class ConfigSchema(Schema):
     relay = fields.Nested(RelaySchema())
     faucet = fields.Nested(FaucetSchema())
     trustline_index = fields.Nested(TrustlineIndexSchema())
+    user_events_index = fields.Nested(UserEventsIndexSchema())
+    events_cache = fields.Nested(EventsCacheSchema())
+    mediation_fees_ledger = fields.Nested(MediationFeesLedgerSchema())
+    accrued_interests_ledger = fields.Nested(AccruedInterestsLedgerSchema())
+    transfer_information_cache = fields.Nested(TransferInformationCacheSchema())
     delegate = fields.Nested(DelegateSchema())
     exchange = fields.Nested(ExchangeSchema())
     tx_relay = fields.Nested(TxRelaySchema())
     messaging = fields.Nested(MessagingSchema())
+    streams = fields.Nested(StreamsSchema())
     push_notification = fields.Nested(PushNotificationSchema())
     rest = fields.Nested(RESTSchema())
     node_rpc = fields.Nested(ChainNodeRPCSchema())
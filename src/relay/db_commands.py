@@ -0,0 +1,89 @@
+"""commands to maintain the tables the relay keeps next to the ethindex tables
+
+The database is selected via the usual postgres environment variables, like
+for the relay server itself.
+"""
+import logging
+import sys
+from typing import Optional
+
+import click
+
+from relay.config.config import ValidationError, load_config, validation_error_string
+from relay.ethindex_db import ethindex_db, mediation_fees_ledger
+from relay.ethindex_db.graph_feed_notifications import install_notify_trigger
+from relay.ethindex_db.user_events_index import UserEventsIndex, get_all_user_fields
+from relay.relay import all_from_to_types
+
+logger = logging.getLogger("db_commands")
+
+
+def _load_config(config: str):
+    try:
+        return load_config(config)
+    except ValidationError as error:
+        logger.error("Validation error in config: " + validation_error_string(error))
+        sys.exit(1)
+
+
+config_option = click.option(
+    "--config",
+    default="config.toml",
+    help="path to toml configuration file",
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False),
+)
+
+
+@click.group()
+def cli() -> None:
+    """maintain the database tables of the relay server"""
+
+
+@cli.command("backfill-user-events")
+@config_option
+def backfill_user_events(config: str) -> None:
+    """index all final events per user
+
+    This can take a long time on a big database. The relay server can keep
+    running, it will use the index as far as it is filled.
+    """
+    index_config = _load_config(config)["user_events_index"]
+    user_events_index = UserEventsIndex(
+        get_all_user_fields(all_from_to_types),
+        reorg_depth=index_config["reorg_depth"],
+        max_blocks_per_sync=index_config["max_blocks_per_sync"],
+    )
+    synced_blocks = user_events_index.backfill(ethindex_db.connect(""))
+    click.echo(
+        f"Indexed {synced_blocks} blocks, "
+        f"the user events index is synced up to block {user_events_index.synced_block_number}"
+    )
+
+
+@cli.command("rebuild-mediation-fees")
+@click.option(
+    "--network",
+    default=None,
+    help="only rebuild the mediation fees in this currency network [default: all]",
+)
+def rebuild_mediation_fees(network: Optional[str]) -> None:
+    """clear the mediation fees ledger
+
+    The ledger is rebuilt from the events on the following requests for the
+    mediation fees of users.
+    """
+    conn = ethindex_db.connect("")
+    mediation_fees_ledger.create_tables(conn)
+    mediation_fees_ledger.clear_ledger(conn, network)
+    click.echo("Cleared the mediation fees ledger")
+
+
+@cli.command("install-graphfeed-trigger")
+def install_graphfeed_trigger() -> None:
+    """install the trigger notifying the relay server about graph updates
+
+    It is needed for `listen_for_notifications` in `[trustline_index]`.
+    """
+    install_notify_trigger(ethindex_db.connect(""))
+    click.echo("Installed the notify trigger on the graphfeed table")
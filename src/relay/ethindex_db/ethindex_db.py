@@ -1,8 +1,9 @@
 """provide access to the ethindex database"""
 
 import collections
+import functools
 import logging
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 
 import psycopg2
 import psycopg2.extras
@@ -35,6 +36,34 @@ def get_latest_ethindex_block_number(conn):
 EventsQuery = collections.namedtuple("EventsQuery", ["where_block", "params"])
 
 
+def _get_query_key(events_query: EventsQuery) -> Optional[Hashable]:
+    """get a key identifying the query for the events cache
+    or None if the parameters cannot be used as key"""
+    query_key = (
+        events_query.where_block,
+        tuple(
+            tuple(param) if isinstance(param, list) else param
+            for param in events_query.params
+        ),
+    )
+    try:
+        hash(query_key)
+    except TypeError:
+        return None
+    return query_key
+
+
+def _restrict_to_blocks_after(
+    events_query: EventsQuery, block_number: int
+) -> EventsQuery:
+    if block_number < 0:
+        return events_query
+    return EventsQuery(
+        f"({events_query.where_block}) AND blockNumber>%s",
+        [*events_query.params, block_number],
+    )
+
+
 class EventBuilder:
     """Event Builder builds BlockchainEvents from web3 like events We use
     pretty much the same logic like relay.blockchain.Proxy (or its
@@ -77,7 +106,7 @@ class EventBuilder:
 # we need to 'select * from events' all the time, but we're using lower-case
 # identifiers in postgres. The following select statement will give us a
 # dictionary with keys in the right case.
-select_star_from_events = """SELECT transactionHash "transactionHash",
+select_star_from_table_template = """SELECT transactionHash "transactionHash",
               blockNumber "blockNumber",
               address,
               eventName "event",
@@ -86,12 +115,27 @@ select_star_from_events = """SELECT transactionHash "transactionHash",
               transactionIndex "transactionIndex",
               logIndex "logIndex",
               timestamp
-       FROM events
+       FROM {table}
     """
+select_star_from_events = select_star_from_table_template.format(table="events")
+select_star_from_user_events = select_star_from_table_template.format(
+    table="user_events"
+)
 
 order_by_default_sort_order = """ ORDER BY blocknumber, transactionIndex, logIndex
     """
 
+# the user events index only holds final blocks, all more recent events are
+# read from the events table. The sort order has to refer to the names of the
+# selected columns, as it is applied to the union of both selects.
+select_user_events_union_template = """({select_star_from_user_events}
+        WHERE user_address=%s AND blockNumber<=%s AND ({where_block}))
+    UNION ALL
+    ({select_star_from_events}
+        WHERE blockNumber>%s AND ({where_block}))
+    ORDER BY "blockNumber", "transactionIndex", "logIndex"
+    """
+
 
 class EthindexDB:
     """EthIndexDB provides an interface for ethindex database
@@ -106,6 +150,8 @@ class EthindexDB:
         from_to_types,
         address=None,
         address_to_contract_types: Dict[str, str] = None,
+        user_events_index=None,
+        events_cache=None,
     ):
         self.conn = conn
         self.default_address = address
@@ -115,14 +161,13 @@ class EthindexDB:
         )
         self.from_to_types = from_to_types
         self.address_to_contract_types = address_to_contract_types
+        self.user_events_index = user_events_index
+        self.events_cache = events_cache
 
     @property
     def event_types(self):
         return self.event_builder.event_types
 
-    def _build_events(self, rows):
-        return self.event_builder.build_events(rows, self._get_current_blocknumber())
-
     def _get_current_blocknumber(self):
         return get_latest_ethindex_block_number(self.conn)
 
@@ -143,19 +188,101 @@ class EthindexDB:
         assert r, "no standard event passed in and no default events given"
         return r
 
-    def _run_events_query(self, events_query: EventsQuery) -> List[BlockchainEvent]:
+    def _run_events_query(
+        self, events_query: EventsQuery, limit: int = None
+    ) -> List[BlockchainEvent]:
         """run a query on the events table"""
+        return self._run_cached_query(events_query, self._fetch_events_rows, limit)
+
+    def _run_user_events_query(
+        self, events_query: EventsQuery, user_address: str, limit: int = None
+    ) -> List[BlockchainEvent]:
+        """run a query for events involving user_address
+
+        The query is run on the user events index if available, events
+        of blocks not yet in the index are read from the events table.
+        """
+        if (
+            self.user_events_index is None
+            or self.user_events_index.synced_block_number is None
+        ):
+            return self._run_events_query(events_query, limit)
+
+        return self._run_cached_query(
+            events_query,
+            functools.partial(self._fetch_user_events_rows, user_address=user_address),
+            limit,
+        )
+
+    def _run_cached_query(
+        self,
+        events_query: EventsQuery,
+        fetch_rows: Callable[..., List[Any]],
+        limit: int = None,
+    ) -> List[BlockchainEvent]:
+        """run a query with fetch_rows, reusing the cached rows of confirmed
+        events if an events cache is set
+
+        Queries with a limit only return the first `limit` events and do not
+        use the cache.
+        """
+        with self.conn:
+            current_blocknumber = self._get_current_blocknumber()
+            query_key = _get_query_key(events_query)
+            if limit is not None:
+                rows = fetch_rows(events_query, limit=limit)
+            elif self.events_cache is None or query_key is None:
+                rows = fetch_rows(events_query)
+            else:
+                rows = self.events_cache.get_rows(
+                    query_key,
+                    current_blocknumber,
+                    lambda block_number: fetch_rows(
+                        _restrict_to_blocks_after(events_query, block_number)
+                    ),
+                )
+        return self.event_builder.build_events(rows, current_blocknumber)
+
+    def _fetch_events_rows(
+        self, events_query: EventsQuery, limit: int = None
+    ) -> List[Any]:
         query_string = "{select_star_from_events} WHERE {where_block} {order_by_default_sort_order}".format(
             select_star_from_events=select_star_from_events,
             where_block=events_query.where_block,
             order_by_default_sort_order=order_by_default_sort_order,
         )
-
-        with self.conn as conn:
-            with conn.cursor() as cur:
-                cur.execute(query_string, events_query.params)
-                rows = cur.fetchall()
-                return self._build_events(rows)
+        params = list(events_query.params)
+        if limit is not None:
+            query_string += "LIMIT %s"
+            params.append(limit)
+
+        with self.conn.cursor() as cur:
+            cur.execute(query_string, params)
+            return cur.fetchall()
+
+    def _fetch_user_events_rows(
+        self, events_query: EventsQuery, user_address: str, limit: int = None
+    ) -> List[Any]:
+        synced_block_number = self.user_events_index.synced_block_number
+        query_string = select_user_events_union_template.format(
+            select_star_from_user_events=select_star_from_user_events,
+            select_star_from_events=select_star_from_events,
+            where_block=events_query.where_block,
+        )
+        params = [
+            user_address,
+            synced_block_number,
+            *events_query.params,
+            synced_block_number,
+            *events_query.params,
+        ]
+        if limit is not None:
+            query_string += "LIMIT %s"
+            params.append(limit)
+
+        with self.conn.cursor() as cur:
+            cur.execute(query_string, params)
+            return cur.fetchall()
 
     def get_user_events(
         self,
@@ -183,7 +310,7 @@ class EthindexDB:
             (from_block, event_type, contract_address, user_address, user_address),
         )
 
-        events = self._run_events_query(query)
+        events = self._run_user_events_query(query, user_address)
 
         logger.debug(
             "get_user_events(%s, %s, %s, %s) -> %s rows",
@@ -207,7 +334,12 @@ class EthindexDB:
         user_address: str = None,
         from_block: int = 0,
         contract_address: str = None,
+        after: Tuple[int, int, int] = None,
+        limit: int = None,
     ) -> List[BlockchainEvent]:
+        """`after` restricts the events to the ones after the given
+        (blockNumber, transactionIndex, logIndex), it overrides from_block.
+        `limit` restricts them to the first `limit` events"""
         # This function only works properly for many contracts if self.address_to_contract_types is properly set
         # TODO Refactor and move somewhere else
         contract_address = contract_address or self.default_address
@@ -215,6 +347,13 @@ class EthindexDB:
         event_types = self._get_standard_event_types(event_types)
         query_string = "blockNumber>=%s "
         args: List[Any] = [from_block]
+        if after is not None:
+            # blockNumber>=%s keeps the range query on the block number index
+            args = [after[0]]
+            query_string += (
+                "AND (blockNumber, transactionIndex, logIndex)>(%s, %s, %s) "
+            )
+            args.extend(after)
 
         if event_types:
             query_string += "AND eventName in %s "
@@ -232,8 +371,9 @@ class EthindexDB:
 
         if user_address:
             query = self.add_all_user_types_to_query(query, user_address)
-
-        events = self._run_events_query(query)
+            events = self._run_user_events_query(query, user_address, limit)
+        else:
+            events = self._run_events_query(query, limit)
 
         logger.debug(
             "get_all_contract_events(%s, %s, %s, %s) -> %s rows",
@@ -292,7 +432,88 @@ class EthindexDB:
         """
         if event_types is None:
             event_types = self.standard_event_types
+        contract_address = self._get_addr(contract_address)
+
+        query = self._get_events_from_to_query(
+            event_types,
+            start_time,
+            end_time,
+            contract_address,
+            from_address,
+            to_address,
+        )
 
+        events = self._run_events_query(query)
+
+        logger.debug(
+            "get_events_from_to(%s, %s, %s, %s, %s, %s) -> %s rows",
+            event_types,
+            start_time,
+            end_time,
+            contract_address,
+            from_address,
+            to_address,
+            len(events),
+        )
+
+        return events
+
+    def get_sum_of_values_from_to(
+        self,
+        event_types: Iterable[str] = None,
+        start_time: int = 0,
+        end_time: int = None,
+        contract_address: str = None,
+        from_address: str = None,
+        to_address: str = None,
+        value_field: str = "_value",
+    ) -> int:
+        """
+        Get the sum of the `value_field` argument of the events matching the given
+        parameters, see `get_events_from_to`. The sum is computed by the database.
+        """
+        if event_types is None:
+            event_types = self.standard_event_types
+        contract_address = self._get_addr(contract_address)
+
+        query = self._get_events_from_to_query(
+            event_types,
+            start_time,
+            end_time,
+            contract_address,
+            from_address,
+            to_address,
+        )
+        query_string = f"""SELECT COALESCE(SUM((args->>'{value_field}')::numeric), 0) AS total
+            FROM events WHERE {query.where_block}"""
+
+        with self.conn as conn:
+            with conn.cursor() as cur:
+                cur.execute(query_string, query.params)
+                total = int(cur.fetchone()["total"])
+
+        logger.debug(
+            "get_sum_of_values_from_to(%s, %s, %s, %s, %s, %s) -> %s",
+            event_types,
+            start_time,
+            end_time,
+            contract_address,
+            from_address,
+            to_address,
+            total,
+        )
+
+        return total
+
+    def _get_events_from_to_query(
+        self,
+        event_types: Iterable[str],
+        start_time: int,
+        end_time: Optional[int],
+        contract_address: str,
+        from_address: Optional[str],
+        to_address: Optional[str],
+    ) -> EventsQuery:
         query_strings = []
         query_params: List[Any] = []
 
@@ -300,7 +521,8 @@ class EthindexDB:
             from_to_string, from_to_args = self.get_query_for_from_to(
                 event_types, from_address, to_address
             )
-            query_strings.append(from_to_string)
+            # The from to query is a disjunction over the event types
+            query_strings.append(f"({from_to_string})")
             query_params += from_to_args
         elif event_types is not None:
             query_strings.append("eventName in %s")
@@ -313,26 +535,10 @@ class EthindexDB:
             query_strings.append("timestamp<=%s")
             query_params.append(end_time)
 
-        contract_address = self._get_addr(contract_address)
         query_strings.append("address=%s")
         query_params.append(contract_address)
 
-        query = EventsQuery(" AND ".join(query_strings), query_params)
-
-        events = self._run_events_query(query)
-
-        logger.debug(
-            "get_events_from_to(%s, %s, %s, %s, %s, %s) -> %s rows",
-            event_types,
-            start_time,
-            end_time,
-            contract_address,
-            from_address,
-            to_address,
-            len(events),
-        )
-
-        return events
+        return EventsQuery(" AND ".join(query_strings), query_params)
 
     def get_query_for_from_to(self, event_types, from_address, to_address):
         """
@@ -433,6 +639,33 @@ class EthindexDB:
 
         return events
 
+    def get_events_of_transactions(
+        self, tx_hashes: Iterable[str], event_types: Iterable = None
+    ):
+        """Gets all events of the given transactions with a single query"""
+        event_types = self._get_standard_event_types(event_types)
+        tx_hashes = tuple(tx_hashes)
+        if not tx_hashes:
+            return []
+
+        query = EventsQuery(
+            """transactionHash IN %s
+               AND eventName in %s
+            """,
+            (tx_hashes, tuple(event_types)),
+        )
+
+        events = self._run_events_query(query)
+
+        logger.debug(
+            "get_events_of_transactions(%s, %s) -> %s rows",
+            tx_hashes,
+            event_types,
+            len(events),
+        )
+
+        return events
+
     def get_transaction_events_by_event_id(
         self, block_hash, log_index, event_types: Iterable = None
     ):
@@ -492,6 +725,8 @@ class CurrencyNetworkEthindexDB(EthindexDB):
         user_address: str = None,
         from_block: int = 0,
         event_types: Iterable[str] = None,
+        after: Tuple[int, int, int] = None,
+        limit: int = None,
     ) -> List[BlockchainEvent]:
         if self.default_address is None:
             # if the default address is not set we will get events from non currency network contracts
@@ -502,6 +737,8 @@ class CurrencyNetworkEthindexDB(EthindexDB):
             event_types=event_types,
             user_address=user_address,
             from_block=from_block,
+            after=after,
+            limit=limit,
         )
 
     def get_trustline_events(
@@ -511,9 +748,78 @@ class CurrencyNetworkEthindexDB(EthindexDB):
         counterparty_address: str,
         event_types: Iterable[str] = None,
         from_block: int = 0,
+        start_time: int = 0,
+        end_time: Optional[int] = None,
     ):
         event_types = self._get_standard_event_types(event_types)
+        query = self._get_trustline_events_query(
+            contract_address,
+            user_address,
+            counterparty_address,
+            event_types,
+            from_block,
+            start_time,
+            end_time,
+        )
+
+        events = self._run_user_events_query(query, user_address)
+
+        logger.debug(
+            "get_trustline_events(%s, %s, %s, %s, %s, %s, %s) -> %s rows",
+            contract_address,
+            user_address,
+            counterparty_address,
+            event_types,
+            from_block,
+            start_time,
+            end_time,
+            len(events),
+        )
 
+        for event in events:
+            if isinstance(event, TLNetworkEvent):
+                event.user = user_address
+            else:
+                raise ValueError("Expected a TLNetworkEvent")
+        return events
+
+    def get_latest_trustline_event_timestamp_before(
+        self,
+        contract_address: str,
+        user_address: str,
+        counterparty_address: str,
+        event_types: Iterable[str],
+        timestamp: int,
+    ) -> Optional[int]:
+        """get the timestamp of the latest trustline event strictly before timestamp
+        or None if there is no such event"""
+        query = self._get_trustline_events_query(
+            contract_address,
+            user_address,
+            counterparty_address,
+            event_types,
+            from_block=0,
+            start_time=0,
+            end_time=timestamp - 1,
+        )
+        with self.conn as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT MAX(timestamp) AS timestamp FROM events WHERE {query.where_block}",
+                    query.params,
+                )
+                return cur.fetchone()["timestamp"]
+
+    def _get_trustline_events_query(
+        self,
+        contract_address: str,
+        user_address: str,
+        counterparty_address: str,
+        event_types: Iterable[str],
+        from_block: int,
+        start_time: int,
+        end_time: Optional[int],
+    ) -> EventsQuery:
         all_event_fieldname_combination = set()
         for from_, to in self.from_to_types.values():
             all_event_fieldname_combination.add((from_, to))
@@ -528,33 +834,19 @@ class CurrencyNetworkEthindexDB(EthindexDB):
         for _ in all_event_fieldname_combination:
             args.extend((user_address, counterparty_address))
 
-        query = EventsQuery(
-            f"""blockNumber>=%s
+        query_string = f"""blockNumber>=%s
                AND eventName in %s
                AND address=%s
                AND ({member_filter_block})
-            """,
-            args,
-        )
-
-        events = self._run_events_query(query)
-
-        logger.debug(
-            "get_trustline_events(%s, %s, %s, %s, %s) -> %s rows",
-            contract_address,
-            user_address,
-            counterparty_address,
-            event_types,
-            from_block,
-            len(events),
-        )
+            """
+        if start_time != 0:
+            query_string += "AND timestamp>=%s "
+            args.append(start_time)
+        if end_time is not None:
+            query_string += "AND timestamp<=%s "
+            args.append(end_time)
 
-        for event in events:
-            if isinstance(event, TLNetworkEvent):
-                event.user = user_address
-            else:
-                raise ValueError("Expected a TLNetworkEvent")
-        return events
+        return EventsQuery(query_string, args)
 
 
 class ExchangeEthindexDB(EthindexDB):
@@ -575,7 +867,7 @@ class ExchangeEthindexDB(EthindexDB):
         events_query = EventsQuery(query_string, args)
         events_query = self.add_all_user_types_to_query(events_query, user_address)
 
-        events = self._run_events_query(events_query)
+        events = self._run_user_events_query(events_query, user_address)
 
         logger.debug(
             "get_all_exchange_events_of_user(%s, %s, %s, %s) -> %s rows",
@@ -0,0 +1,82 @@
+"""cache the rows of confirmed events read from the ethindex database
+
+Events of blocks that have enough confirmations do not change anymore. The
+EventsCache stores the rows of such events per query. When the same query is
+run again, only events above the highest cached block number (the high water
+mark) are read from the database.
+"""
+
+import logging
+from typing import Any, Callable, Hashable, List, Tuple
+
+import attr
+import cachetools
+
+logger = logging.getLogger("events_cache")
+
+
+@attr.s(frozen=True)
+class CachedRows:
+    rows: Tuple[Any, ...] = attr.ib()
+    high_water_mark: int = attr.ib()
+
+
+def _get_size_of_cached_rows(cached_rows: CachedRows) -> int:
+    # count the entry itself, so that queries without result are bounded too
+    return len(cached_rows.rows) + 1
+
+
+class EventsCache:
+    """EventsCache holds the rows of events that are at least
+    `confirmation_depth` blocks deep. Its size is bounded by `max_rows`, the
+    least recently used queries are evicted first.
+    """
+
+    def __init__(self, *, max_rows: int, confirmation_depth: int):
+        self.confirmation_depth = confirmation_depth
+        self._cache: cachetools.LRUCache = cachetools.LRUCache(
+            maxsize=max_rows, getsizeof=_get_size_of_cached_rows
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get_rows(
+        self,
+        query_key: Hashable,
+        current_blocknumber: int,
+        fetch_rows: Callable[[int], List[Any]],
+    ) -> List[Any]:
+        """get the rows for the query identified by query_key
+
+        fetch_rows is called with a block number and has to return the rows
+        of the query above that block number, sorted by their position in the
+        chain. It is called with -1 to fetch all rows.
+        """
+        confirmed_block_number = current_blocknumber - self.confirmation_depth
+        cached_rows = self._cache.get(query_key)
+
+        if cached_rows is None:
+            self.misses += 1
+            rows = fetch_rows(-1)
+            self._store(query_key, (), rows, confirmed_block_number)
+            return rows
+
+        self.hits += 1
+        tail_rows = fetch_rows(cached_rows.high_water_mark)
+        if confirmed_block_number > cached_rows.high_water_mark:
+            self._store(query_key, cached_rows.rows, tail_rows, confirmed_block_number)
+        return list(cached_rows.rows) + tail_rows
+
+    def _store(self, query_key, cached_rows, new_rows, confirmed_block_number):
+        confirmed_rows = tuple(
+            row for row in new_rows if row["blockNumber"] <= confirmed_block_number
+        )
+        try:
+            self._cache[query_key] = CachedRows(
+                rows=cached_rows + confirmed_rows,
+                high_water_mark=confirmed_block_number,
+            )
+        except ValueError:
+            # the result is bigger than the whole cache
+            logger.debug("Result too big to be cached for query %s", query_key)
+            self._cache.pop(query_key, None)
@@ -6,6 +6,7 @@ from typing import Dict, Iterable, List, Optional, Union, cast
 
 import attr
 import toolz
+from hexbytes import HexBytes
 
 from relay.blockchain.currency_network_events import (
     BalanceUpdateEvent,
@@ -18,7 +19,15 @@ from relay.blockchain.currency_network_events import (
     TrustlineUpdateEventType,
 )
 from relay.blockchain.events import BlockchainEvent
-from relay.ethindex_db.ethindex_db import CurrencyNetworkEthindexDB
+from relay.ethindex_db.ethindex_db import (
+    CurrencyNetworkEthindexDB,
+    get_latest_ethindex_block_number,
+)
+from relay.ethindex_db.transfer_information_cache import (
+    TransferInformationCache,
+    event_id_key,
+    transaction_key,
+)
 from relay.network_graph.graph import CurrencyNetworkGraph
 from relay.network_graph.interests import calculate_interests
 from relay.network_graph.payment_path import FeePayer
@@ -28,6 +37,13 @@ logger = logging.getLogger("event_info")
 DIRECTION_SENT = "sent"
 DIRECTION_RECEIVED = "received"
 
+# the events needed to find out the mediation fees earned by a user
+mediation_fees_event_types = [
+    BalanceUpdateEventType,
+    TransferEventType,
+    TrustlineUpdateEventType,
+]
+
 
 @attr.s
 class InterestAccrued:
@@ -70,9 +86,96 @@ class DebtsListInCurrencyNetwork:
     debts_list = attr.ib(type=List[Debt])
 
 
+class MediationFeesCollector:
+    """Find the mediation fees earned by a user by applying the sorted
+    BalanceUpdate, Transfer and TrustlineUpdate events of the user in one
+    currency network on a graph holding the trustlines of the user.
+    """
+
+    def __init__(self, user_address: str, graph: CurrencyNetworkGraph):
+        self.user_address = user_address
+        self.graph = graph
+        # This event is a standalone balance update that could be:
+        # - the first event of a couple of balance updates for a mediated transfer
+        # - the first event of a transfer initiated by the user
+        # - the last event of a transfer directed to the user
+        # - due to an application of interests from a trustline update
+        # It is not yet applied on the graph
+        self.last_standalone_balance_update: Optional[BalanceUpdateEvent] = None
+
+    def apply_events(self, events: Iterable[BlockchainEvent]) -> List[MediationFee]:
+        fees_earned: List[MediationFee] = []
+        for event in events:
+            fee = self.apply_event(event)
+            if fee is not None:
+                fees_earned.append(fee)
+        return fees_earned
+
+    def apply_event(self, event: BlockchainEvent) -> Optional[MediationFee]:
+        graph = self.graph
+        last_standalone_balance_update = self.last_standalone_balance_update
+
+        if event.type == TrustlineUpdateEventType:
+            event = cast(TrustlineUpdateEvent, event)
+            if does_trustline_update_trigger_balance_update(graph, event):
+                # The last standalone balance update is not due to mediation, but to interests on trustline update
+                assert (
+                    last_standalone_balance_update is not None
+                ), "Found trustline update that should trigger balance update but did not find balance update"
+                apply_event_on_graph(graph, last_standalone_balance_update)
+                self.last_standalone_balance_update = None
+
+            apply_event_on_graph(graph, event)
+
+        elif event.type == TransferEventType:
+            # The last standalone balance update is not due to mediation, but to a transfer from/to user
+            assert (
+                last_standalone_balance_update is not None
+            ), "Found transfer event but did not previously find balance update"
+            apply_event_on_graph(graph, last_standalone_balance_update)
+            self.last_standalone_balance_update = None
+
+        elif event.type == BalanceUpdateEventType:
+            event = cast(BalanceUpdateEvent, event)
+
+            if last_standalone_balance_update is None:
+                self.last_standalone_balance_update = event
+            elif (
+                event.blocknumber != last_standalone_balance_update.blocknumber
+                or event.transaction_index
+                != last_standalone_balance_update.transaction_index
+            ):
+                apply_event_on_graph(graph, last_standalone_balance_update)
+                self.last_standalone_balance_update = event
+            else:
+                # We found a mediation from the user
+                safety_checks_on_mediated_transfer_balance_updates(
+                    self.user_address, event, last_standalone_balance_update
+                )
+
+                fee = get_mediation_fee_from_balance_updates(
+                    graph, self.user_address, last_standalone_balance_update, event
+                )
+
+                apply_event_on_graph(graph, event)
+                apply_event_on_graph(graph, last_standalone_balance_update)
+                self.last_standalone_balance_update = None
+                return fee
+
+        else:
+            raise RuntimeError(f"Invalid event type received: {event.type}")
+
+        return None
+
+
 class EventsInformationFetcher:
-    def __init__(self, currency_network_db: CurrencyNetworkEthindexDB):
+    def __init__(
+        self,
+        currency_network_db: CurrencyNetworkEthindexDB,
+        transfer_information_cache: Optional[TransferInformationCache] = None,
+    ):
         self._currency_network_db = currency_network_db
+        self._transfer_information_cache = transfer_information_cache
 
     def get_list_of_paid_interests_for_trustline(
         self, currency_network_address, user, counterparty
@@ -99,14 +202,52 @@ class EventsInformationFetcher:
     def get_list_of_paid_interests_for_trustline_in_between_timestamps(
         self, currency_network_address, user, counterparty, start_time, end_time
     ):
-        all_accrued_interests = self.get_list_of_paid_interests_for_trustline(
-            currency_network_address, user, counterparty
+        if not end_time:
+            end_time = int(time.time())
+        # The interests accrued at a balance update depend on the balance before it,
+        # so start with the latest balance update before the time window.
+        balance_updates_start_time = start_time
+        if start_time != 0:
+            balance_updates_start_time = (
+                self._currency_network_db.get_latest_trustline_event_timestamp_before(
+                    currency_network_address,
+                    user,
+                    counterparty,
+                    [BalanceUpdateEventType],
+                    start_time,
+                )
+                or start_time
+            )
+
+        balance_update_events = self._currency_network_db.get_trustline_events(
+            currency_network_address,
+            user,
+            counterparty,
+            event_types=[BalanceUpdateEventType],
+            start_time=balance_updates_start_time,
+            end_time=end_time,
+        )
+        trustline_update_events = self._currency_network_db.get_trustline_events(
+            currency_network_address,
+            user,
+            counterparty,
+            event_types=[TrustlineUpdateEventType],
+            end_time=end_time,
+        )
+
+        accrued_interests = get_accrued_interests_from_events(
+            balance_update_events, trustline_update_events
         )
         return filter_list_of_information_for_time_window(
-            all_accrued_interests, start_time, end_time
+            accrued_interests, start_time, end_time
         )
 
     def get_transfer_details_for_id(self, block_hash: str, log_index: int):
+        key = event_id_key(block_hash, log_index)
+        cached_transfer_details = self._get_cached_transfer_details(key)
+        if cached_transfer_details is not None:
+            return cached_transfer_details
+
         all_events_of_tx = self._currency_network_db.get_transaction_events_by_event_id(
             block_hash,
             log_index,
@@ -129,24 +270,87 @@ class EventsInformationFetcher:
 
         assert transfer_event.type == TransferEventType
 
-        return [self.get_transfer_details(all_events_of_tx, transfer_event)]
+        transfer_details = [self.get_transfer_details(all_events_of_tx, transfer_event)]
+        self._cache_transfer_details(key, transfer_details, all_events_of_tx)
+        return transfer_details
 
     def get_transfer_details_for_tx(self, tx_hash: str):
+        key = transaction_key(tx_hash)
+        cached_transfer_details = self._get_cached_transfer_details(key)
+        if cached_transfer_details is not None:
+            return cached_transfer_details
 
         all_events_of_tx = self._currency_network_db.get_transaction_events(
             tx_hash, event_types=(TransferEventType, BalanceUpdateEventType)
         )
+        transfer_details = self._get_transfer_details_of_tx_events(all_events_of_tx)
+        if len(transfer_details) == 0:
+            raise TransferNotFoundException(tx_hash=tx_hash)
+
+        self._cache_transfer_details(key, transfer_details, all_events_of_tx)
+        return transfer_details
+
+    def get_transfer_details_for_txs(
+        self, tx_hashes: Iterable[str]
+    ) -> Dict[str, List[TransferInformation]]:
+        """Get the transfer details of many transactions in the order of tx_hashes.
+        The events of all transactions not found in the cache are read with a single query,
+        transactions without transfer are mapped to an empty list."""
+        tx_hashes = list(tx_hashes)
+        found_transfer_details: Dict[str, List[TransferInformation]] = {}
+        uncached_tx_hashes = []
+        for tx_hash in tx_hashes:
+            cached_transfer_details = self._get_cached_transfer_details(
+                transaction_key(tx_hash)
+            )
+            if cached_transfer_details is not None:
+                found_transfer_details[tx_hash] = cached_transfer_details
+            else:
+                uncached_tx_hashes.append(tx_hash)
+
+        events_per_tx = toolz.groupby(
+            attrgetter("transaction_hash"),
+            self._currency_network_db.get_events_of_transactions(
+                uncached_tx_hashes,
+                event_types=(TransferEventType, BalanceUpdateEventType),
+            ),
+        )
+        for tx_hash in uncached_tx_hashes:
+            all_events_of_tx = events_per_tx.get(HexBytes(tx_hash), [])
+            transfer_details = self._get_transfer_details_of_tx_events(all_events_of_tx)
+            if transfer_details:
+                self._cache_transfer_details(
+                    transaction_key(tx_hash), transfer_details, all_events_of_tx
+                )
+            found_transfer_details[tx_hash] = transfer_details
+
+        # The response keeps the order of the request, independent of the cache
+        return {tx_hash: found_transfer_details[tx_hash] for tx_hash in tx_hashes}
+
+    def _get_transfer_details_of_tx_events(self, all_events_of_tx):
         transfer_events_in_tx = filter_events_with_type(
             all_events_of_tx, TransferEventType
         )
-        if len(transfer_events_in_tx) == 0:
-            raise TransferNotFoundException(tx_hash=tx_hash)
-
         return [
             self.get_transfer_details(all_events_of_tx, transfer_event)
             for transfer_event in transfer_events_in_tx
         ]
 
+    def _get_cached_transfer_details(self, key):
+        if self._transfer_information_cache is None:
+            return None
+        return self._transfer_information_cache.get(key)
+
+    def _cache_transfer_details(self, key, transfer_details, all_events_of_tx):
+        if self._transfer_information_cache is None:
+            return
+        self._transfer_information_cache.store(
+            key,
+            transfer_details,
+            max(event.blocknumber for event in all_events_of_tx),
+            get_latest_ethindex_block_number(self._currency_network_db.conn),
+        )
+
     def get_transfer_details(self, all_events, transfer_event):
         """Use a transfer event and all events emitted in transfer transaction to get transfer details"""
 
@@ -279,78 +483,13 @@ class EventsInformationFetcher:
     def get_earned_mediation_fees(
         self, user_address: str, graph: CurrencyNetworkGraph
     ) -> List[MediationFee]:
-        useful_event_types = [
-            BalanceUpdateEventType,
-            TransferEventType,
-            TrustlineUpdateEventType,
-        ]
         all_events = self._currency_network_db.get_all_network_events(
-            user_address=user_address, event_types=useful_event_types
+            user_address=user_address, event_types=mediation_fees_event_types
         )
         all_events = sorted_events(all_events)
 
-        # This event is a standalone balance update that could be:
-        # - the first event of a couple of balance updates for a mediated transfer
-        # - the first event of a transfer initiated by the user
-        # - the last event of a transfer directed to the user
-        # - due to an application of interests from a trustline update
-        last_standalone_balance_update: Optional[BalanceUpdateEvent] = None
-        fees_earned: List[MediationFee] = []
-
-        for event in all_events:
-            if event.type == TrustlineUpdateEventType:
-                event = cast(TrustlineUpdateEvent, event)
-                if does_trustline_update_trigger_balance_update(graph, event):
-                    # The last standalone balance update is not due to mediation, but to interests on trustline update
-                    assert (
-                        last_standalone_balance_update is not None
-                    ), "Found trustline update that should trigger balance update but did not find balance update"
-                    apply_event_on_graph(graph, last_standalone_balance_update)
-                    last_standalone_balance_update = None
-
-                apply_event_on_graph(graph, event)
-
-            elif event.type == TransferEventType:
-                # The last standalone balance update is not due to mediation, but to a transfer from/to user
-                assert (
-                    last_standalone_balance_update is not None
-                ), "Found transfer event but did not previously find balance update"
-                apply_event_on_graph(graph, last_standalone_balance_update)
-                last_standalone_balance_update = None
-
-            elif event.type == BalanceUpdateEventType:
-                event = cast(BalanceUpdateEvent, event)
-
-                if last_standalone_balance_update is not None:
-                    if (
-                        event.blocknumber != last_standalone_balance_update.blocknumber
-                        or event.transaction_index
-                        != last_standalone_balance_update.transaction_index
-                    ):
-                        apply_event_on_graph(graph, last_standalone_balance_update)
-                        last_standalone_balance_update = event
-                        continue
-                    else:
-                        # We found a mediation from the user
-                        safety_checks_on_mediated_transfer_balance_updates(
-                            user_address, event, last_standalone_balance_update
-                        )
-
-                        fee = get_mediation_fee_from_balance_updates(
-                            graph, user_address, last_standalone_balance_update, event
-                        )
-                        fees_earned.append(fee)
-
-                        apply_event_on_graph(graph, event)
-                        apply_event_on_graph(graph, last_standalone_balance_update)
-                        last_standalone_balance_update = None
-                else:
-                    last_standalone_balance_update = event
-
-            else:
-                raise RuntimeError(f"Invalid event type received: {event.type}")
-
-        return fees_earned
+        mediation_fees_collector = MediationFeesCollector(user_address, graph)
+        return mediation_fees_collector.apply_events(all_events)
 
     def get_earned_mediation_fees_in_between_timestamps(
         self,
@@ -469,26 +608,13 @@ class EventsInformationFetcher:
     def get_total_sum_transferred(
         self, sender_address, receiver_address, start_time=0, end_time=None
     ):
-        all_transfer_events = self._currency_network_db.get_events_from_to(
+        return self._currency_network_db.get_sum_of_values_from_to(
             event_types=[TransferEventType],
             start_time=start_time,
             end_time=end_time,
             from_address=sender_address,
             to_address=receiver_address,
         )
-        sum = 0
-        for event in all_transfer_events:
-            assert (
-                event.type == TransferEventType
-            ), f"Expected event to be of type transfer: {event}"
-            assert (
-                event.from_ == sender_address
-            ), f"Expected transfer sender to be {sender_address}: {event}"
-            assert (
-                event.to == receiver_address
-            ), f"Expected transfer receiver to be {receiver_address}: {event}"
-            sum += event.value
-        return sum
 
 
 def clean_null_debt(debts_in_all_currency_networks, network_address, debtor):
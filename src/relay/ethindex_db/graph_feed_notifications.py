@@ -0,0 +1,66 @@
+"""wake up the graph sync as soon as ethindex writes to the graphfeed table
+
+A trigger on the graphfeed table sends a notification on the
+GRAPH_FEED_CHANNEL for every statement inserting rows. The
+GraphFeedListener waits for these notifications with LISTEN, so that the
+graph sync does not have to poll the table in short intervals.
+"""
+
+import logging
+
+from gevent import select
+
+logger = logging.getLogger("graph_feed_notifications")
+
+GRAPH_FEED_CHANNEL = "relay_graphfeed"
+
+install_trigger_statement = f"""
+    CREATE OR REPLACE FUNCTION relay_notify_graphfeed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{GRAPH_FEED_CHANNEL}', '');
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS relay_notify_graphfeed ON graphfeed;
+    CREATE TRIGGER relay_notify_graphfeed AFTER INSERT ON graphfeed
+        FOR EACH STATEMENT EXECUTE PROCEDURE relay_notify_graphfeed();
+"""
+
+
+def install_notify_trigger(conn):
+    """install the trigger notifying about new rows in the graphfeed table"""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(install_trigger_statement)
+    logger.info("Installed notify trigger on graphfeed")
+
+
+class GraphFeedListener:
+    """GraphFeedListener listens for notifications about new graphfeed rows
+
+    conn has to be a connection that is not used for anything else, it is
+    switched to autocommit mode.
+    """
+
+    def __init__(self, conn, channel: str = GRAPH_FEED_CHANNEL):
+        self.conn = conn
+        self.channel = channel
+
+    def listen(self) -> None:
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+
+    def wait(self, timeout: float) -> bool:
+        """wait for a notification for at most timeout seconds
+
+        Returns whether there were notifications. All pending notifications
+        are consumed, as one sync reads all new rows anyway.
+        """
+        if not self.conn.notifies:
+            readable, _, _ = select.select([self.conn], [], [], timeout)
+            if readable:
+                self.conn.poll()
+        notified = bool(self.conn.notifies)
+        self.conn.notifies.clear()
+        return notified
@@ -0,0 +1,126 @@
+"""statistics about how far the graphs synced from the graphfeed lag behind
+
+The sync greenlet records the applied graph feed updates in
+GraphSyncStatistics, the API exposes them.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import attr
+
+logger = logging.getLogger("graph_sync_statistics")
+
+
+@attr.s
+class NetworkGraphSyncStatistics:
+    """statistics about the updates applied on the graph of one currency network"""
+
+    number_of_applied_updates: int = attr.ib(default=0)
+    updates_in_last_batch: int = attr.ib(default=0)
+    newest_update_timestamp: Optional[int] = attr.ib(default=None)
+    last_apply_duration: Optional[float] = attr.ib(default=None)
+    last_publish_duration: Optional[float] = attr.ib(default=None)
+
+    def newest_update_age(self, now: float = None) -> Optional[float]:
+        if self.newest_update_timestamp is None:
+            return None
+        if now is None:
+            now = time.time()
+        return max(0.0, now - self.newest_update_timestamp)
+
+
+@attr.s
+class GraphSyncStatistics:
+    """statistics about the staleness of the graphs synced from the graphfeed
+
+    The staleness of a sync is the time in between the newest block timestamp
+    of the applied updates and the time they were applied.
+    """
+
+    number_of_syncs: int = attr.ib(default=0)
+    number_of_notified_syncs: int = attr.ib(default=0)
+    number_of_applied_updates: int = attr.ib(default=0)
+    last_staleness: Optional[float] = attr.ib(default=None)
+    max_staleness: Optional[float] = attr.ib(default=None)
+    total_staleness: float = attr.ib(default=0)
+    number_of_syncs_with_updates: int = attr.ib(default=0)
+    applied_feed_id: Optional[int] = attr.ib(default=None)
+    max_feed_id: Optional[int] = attr.ib(default=None)
+    networks: Dict[str, NetworkGraphSyncStatistics] = attr.ib(factory=dict)
+
+    @property
+    def average_staleness(self) -> Optional[float]:
+        if self.number_of_syncs_with_updates == 0:
+            return None
+        return self.total_staleness / self.number_of_syncs_with_updates
+
+    @property
+    def feed_id_lag(self) -> Optional[int]:
+        """the number of graph feed rows not applied yet"""
+        if self.applied_feed_id is None or self.max_feed_id is None:
+            return None
+        return max(0, self.max_feed_id - self.applied_feed_id)
+
+    def record_sync(self, feed_updates, notified: bool, now: float = None) -> None:
+        self.number_of_syncs += 1
+        if notified:
+            self.number_of_notified_syncs += 1
+        if not feed_updates:
+            return
+        if now is None:
+            now = time.time()
+        staleness = max(0.0, now - max(update.timestamp for update in feed_updates))
+        self.number_of_applied_updates += len(feed_updates)
+        self.number_of_syncs_with_updates += 1
+        self.last_staleness = staleness
+        self.total_staleness += staleness
+        if self.max_staleness is None or staleness > self.max_staleness:
+            self.max_staleness = staleness
+        logger.debug(
+            "Applied %s graph updates with a staleness of %.2fs",
+            len(feed_updates),
+            staleness,
+        )
+
+    def record_feed_ids(self, applied_feed_id: int, max_feed_id: Optional[int]):
+        self.applied_feed_id = applied_feed_id
+        # the feed may have been emptied
+        self.max_feed_id = max_feed_id if max_feed_id is not None else applied_feed_id
+
+    def record_network_applied(
+        self, network_address: str, feed_updates: Iterable[Any], duration: float
+    ) -> None:
+        feed_updates = list(feed_updates)
+        statistics = self._get_network_statistics(network_address)
+        statistics.number_of_applied_updates += len(feed_updates)
+        statistics.updates_in_last_batch = len(feed_updates)
+        statistics.newest_update_timestamp = max(
+            [update.timestamp for update in feed_updates]
+            + [statistics.newest_update_timestamp or 0]
+        )
+        statistics.last_apply_duration = duration
+
+    def record_network_published(self, network_address: str, duration: float) -> None:
+        self._get_network_statistics(network_address).last_publish_duration = duration
+
+    def _get_network_statistics(
+        self, network_address: str
+    ) -> NetworkGraphSyncStatistics:
+        return self.networks.setdefault(network_address, NetworkGraphSyncStatistics())
+
+    def get_network_status(self, network_address: str) -> Dict[str, Any]:
+        """the statistics of a network together with the lag of the whole feed"""
+        statistics = self.networks.get(network_address, NetworkGraphSyncStatistics())
+        return {
+            "applied_feed_id": self.applied_feed_id,
+            "max_feed_id": self.max_feed_id,
+            "feed_id_lag": self.feed_id_lag,
+            "number_of_applied_updates": statistics.number_of_applied_updates,
+            "updates_in_last_batch": statistics.updates_in_last_batch,
+            "newest_update_timestamp": statistics.newest_update_timestamp,
+            "newest_update_age": statistics.newest_update_age(),
+            "last_apply_duration": statistics.last_apply_duration,
+            "last_publish_duration": statistics.last_publish_duration,
+        }
@@ -0,0 +1,434 @@
+"""persist the interests accrued on trustlines next to the ethindex database
+
+Interests accrue in between two consecutive balance updates of a trustline,
+with the interest rate of the last trustline update before the second
+balance update. The AccruedInterestsLedger goes through the BalanceUpdate and
+TrustlineUpdate events of final blocks as they arrive, stores the accrued
+interests per trustline and event, and keeps the state of every trustline
+needed to compute the interests of the following events.
+
+Trustlines are stored with their users ordered (user_a < user_b), balances and
+interests are viewed from user_a.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import attr
+import psycopg2.extras
+
+from relay.blockchain.currency_network_events import (
+    BalanceUpdateEvent,
+    BalanceUpdateEventType,
+    TrustlineUpdateEvent,
+    TrustlineUpdateEventType,
+)
+from relay.blockchain.events import BlockchainEvent
+from relay.network_graph.interests import calculate_interests
+
+from .ethindex_db import CurrencyNetworkEthindexDB, get_latest_ethindex_block_number
+from .events_informations import InterestAccrued
+
+logger = logging.getLogger("interests_ledger")
+
+DEFAULT_SYNC_ID = "default"
+
+create_tables_statement = """
+    CREATE TABLE IF NOT EXISTS accrued_interests (
+        network_address TEXT NOT NULL,
+        user_a TEXT NOT NULL,
+        user_b TEXT NOT NULL,
+        blockNumber INTEGER NOT NULL,
+        logIndex INTEGER NOT NULL,
+        value NUMERIC NOT NULL,
+        interest_rate INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        PRIMARY KEY (network_address, user_a, user_b, blockNumber, logIndex)
+    );
+    CREATE INDEX IF NOT EXISTS accrued_interests_timestamp_idx
+        ON accrued_interests (network_address, user_a, user_b, timestamp);
+    CREATE TABLE IF NOT EXISTS accrued_interests_trustlines (
+        network_address TEXT NOT NULL,
+        user_a TEXT NOT NULL,
+        user_b TEXT NOT NULL,
+        state JSONB NOT NULL,
+        PRIMARY KEY (network_address, user_a, user_b)
+    );
+    CREATE TABLE IF NOT EXISTS accrued_interests_sync (
+        syncid TEXT PRIMARY KEY,
+        last_block_number INTEGER NOT NULL
+    );
+"""
+
+TrustlineKey = Tuple[str, str, str]
+
+
+def get_trustline_key(network_address: str, user: str, counterparty: str):
+    user_a, user_b = sorted((user, counterparty))
+    return network_address, user_a, user_b
+
+
+def _to_rates(rates: Iterable[int]) -> Tuple[int, int]:
+    """json has no tuples, the rates are read as list"""
+    given, received = rates
+    return given, received
+
+
+@attr.s
+class TrustlineInterestsState:
+    """The state of a trustline needed to compute the interests of its next
+    balance update. Interest rates are tuples of the rate given and received
+    by user_a.
+    """
+
+    balance: int = attr.ib(default=0)
+    balance_timestamp: Optional[int] = attr.ib(default=None)
+    interest_rates: Optional[Tuple[int, int]] = attr.ib(default=None)
+    interest_rates_timestamp: Optional[int] = attr.ib(default=None)
+    # the rates before the ones of the last trustline update,
+    # which are in use until the timestamp advances
+    previous_interest_rates: Optional[Tuple[int, int]] = attr.ib(default=None)
+
+    @classmethod
+    def from_json(cls, json: Dict[str, Any]) -> "TrustlineInterestsState":
+        state = cls(**json)
+        if state.interest_rates is not None:
+            state.interest_rates = _to_rates(state.interest_rates)
+        if state.previous_interest_rates is not None:
+            state.previous_interest_rates = _to_rates(state.previous_interest_rates)
+        return state
+
+    def apply_trustline_update(self, interest_rates: Tuple[int, int], timestamp: int):
+        if self.interest_rates_timestamp != timestamp:
+            self.previous_interest_rates = self.interest_rates
+        self.interest_rates = interest_rates
+        self.interest_rates_timestamp = timestamp
+
+    def apply_balance_update(
+        self, balance: int, timestamp: int
+    ) -> Optional[InterestAccrued]:
+        """apply the new balance of user_a and return the interests accrued
+        since the last balance update, or None if there were none"""
+        accrued_interests = None
+        if self.balance_timestamp is not None:
+            interest_rate = self._get_interest_rate_before(timestamp)
+            if interest_rate is None:
+                logger.warning(
+                    "No trustline update found before balance update at %s", timestamp
+                )
+            else:
+                value = calculate_interests(
+                    self.balance, interest_rate, timestamp - self.balance_timestamp
+                )
+                if value != 0:
+                    accrued_interests = InterestAccrued(value, interest_rate, timestamp)
+
+        self.balance = balance
+        self.balance_timestamp = timestamp
+        return accrued_interests
+
+    def _get_interest_rate_before(self, timestamp: int) -> Optional[int]:
+        """get the rate of user_a in use with the current balance
+        according to the last trustline update strictly before timestamp"""
+        if (
+            self.interest_rates_timestamp is not None
+            and self.interest_rates_timestamp < timestamp
+        ):
+            interest_rates = self.interest_rates
+        else:
+            interest_rates = self.previous_interest_rates
+        if interest_rates is None:
+            return None
+        interest_rate_given, interest_rate_received = interest_rates
+        if self.balance >= 0:
+            return interest_rate_given
+        else:
+            return interest_rate_received
+
+
+def apply_balance_update_on_state(
+    state: TrustlineInterestsState, user_a: str, from_: str, value: int, timestamp: int
+) -> Optional[InterestAccrued]:
+    balance = value if from_ == user_a else -value
+    return state.apply_balance_update(balance, timestamp)
+
+
+def apply_trustline_update_on_state(
+    state: TrustlineInterestsState,
+    user_a: str,
+    creditor: str,
+    interest_rate_given: int,
+    interest_rate_received: int,
+    timestamp: int,
+) -> None:
+    if creditor == user_a:
+        state.apply_trustline_update(
+            (interest_rate_given, interest_rate_received), timestamp
+        )
+    else:
+        state.apply_trustline_update(
+            (interest_rate_received, interest_rate_given), timestamp
+        )
+
+
+def apply_row_on_state(
+    state: TrustlineInterestsState, user_a: str, row: Dict[str, Any]
+) -> Optional[InterestAccrued]:
+    """apply an event row of the ethindex events table on the state"""
+    args = row["args"]
+    if row["eventname"] == BalanceUpdateEventType:
+        return apply_balance_update_on_state(
+            state, user_a, args["_from"], args["_value"], row["timestamp"]
+        )
+    elif row["eventname"] == TrustlineUpdateEventType:
+        apply_trustline_update_on_state(
+            state,
+            user_a,
+            args["_creditor"],
+            args.get("_interestRateGiven", 0),
+            args.get("_interestRateReceived", 0),
+            row["timestamp"],
+        )
+        return None
+    else:
+        raise RuntimeError(f"Invalid event type received: {row['eventname']}")
+
+
+def apply_event_on_state(
+    state: TrustlineInterestsState, user_a: str, event: BlockchainEvent
+) -> Optional[InterestAccrued]:
+    if isinstance(event, BalanceUpdateEvent):
+        return apply_balance_update_on_state(
+            state, user_a, event.from_, event.value, event.timestamp
+        )
+    elif isinstance(event, TrustlineUpdateEvent):
+        apply_trustline_update_on_state(
+            state,
+            user_a,
+            event.from_,
+            event.interest_rate_given,
+            event.interest_rate_received,
+            event.timestamp,
+        )
+        return None
+    else:
+        raise RuntimeError(f"Invalid event type received: {event.type}")
+
+
+def _get_event_users(event_type: str, args: Dict[str, Any]) -> Tuple[str, str]:
+    if event_type == BalanceUpdateEventType:
+        return args["_from"], args["_to"]
+    else:
+        return args["_creditor"], args["_debtor"]
+
+
+class AccruedInterestsLedger:
+    """AccruedInterestsLedger stores the interests of events of final blocks,
+    with at least `reorg_depth` confirmations. `synced_block_number` is the
+    number of the last block whose events are stored.
+    """
+
+    def __init__(
+        self,
+        *,
+        reorg_depth: int,
+        max_blocks_per_sync: int,
+        sync_id: str = DEFAULT_SYNC_ID,
+    ):
+        self.reorg_depth = reorg_depth
+        self.max_blocks_per_sync = max_blocks_per_sync
+        self.sync_id = sync_id
+        self.synced_block_number: Optional[int] = None
+
+    def create_tables(self, conn):
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(create_tables_statement)
+                cur.execute(
+                    """INSERT INTO accrued_interests_sync (syncid, last_block_number)
+                       VALUES (%s, -1) ON CONFLICT DO NOTHING""",
+                    (self.sync_id,),
+                )
+
+    def sync(self, conn) -> int:
+        """store the interests of the events of the next final blocks
+
+        At most `max_blocks_per_sync` blocks are handled in one transaction.
+        Returns the number of blocks handled, 0 if the ledger is up to date.
+        """
+        with conn:
+            with conn.cursor() as cur:
+                # lock the sync row, so that concurrent relays do not apply events twice
+                cur.execute(
+                    """SELECT last_block_number FROM accrued_interests_sync
+                       WHERE syncid=%s FOR UPDATE""",
+                    (self.sync_id,),
+                )
+                from_block = cur.fetchone()["last_block_number"] + 1
+                final_block_number = (
+                    get_latest_ethindex_block_number(conn) - self.reorg_depth
+                )
+                to_block = min(
+                    final_block_number, from_block + self.max_blocks_per_sync - 1
+                )
+                if to_block < from_block:
+                    self.synced_block_number = from_block - 1
+                    return 0
+
+                cur.execute(
+                    """SELECT address, eventName, args, timestamp,
+                              blockNumber, logIndex
+                       FROM events
+                       WHERE blockNumber>=%s AND blockNumber<=%s AND eventName IN %s
+                       ORDER BY blockNumber, transactionIndex, logIndex""",
+                    (
+                        from_block,
+                        to_block,
+                        (BalanceUpdateEventType, TrustlineUpdateEventType),
+                    ),
+                )
+                rows = cur.fetchall()
+
+                states = self._load_states(
+                    cur,
+                    {
+                        get_trustline_key(
+                            row["address"],
+                            *_get_event_users(row["eventname"], row["args"]),
+                        )
+                        for row in rows
+                    },
+                )
+                interests_rows = []
+                for row in rows:
+                    from_, to = _get_event_users(row["eventname"], row["args"])
+                    key = get_trustline_key(row["address"], from_, to)
+                    accrued_interests = apply_row_on_state(states[key], key[1], row)
+                    if accrued_interests is not None:
+                        interests_rows.append(
+                            (
+                                *key,
+                                row["blocknumber"],
+                                row["logindex"],
+                                accrued_interests.value,
+                                accrued_interests.interest_rate,
+                                accrued_interests.timestamp,
+                            )
+                        )
+
+                psycopg2.extras.execute_values(
+                    cur,
+                    """INSERT INTO accrued_interests (network_address, user_a, user_b,
+                           blockNumber, logIndex, value, interest_rate, timestamp)
+                       VALUES %s ON CONFLICT DO NOTHING""",
+                    interests_rows,
+                )
+                psycopg2.extras.execute_values(
+                    cur,
+                    """INSERT INTO accrued_interests_trustlines
+                           (network_address, user_a, user_b, state)
+                       VALUES %s
+                       ON CONFLICT (network_address, user_a, user_b)
+                       DO UPDATE SET state=EXCLUDED.state""",
+                    [
+                        (*key, psycopg2.extras.Json(attr.asdict(state)))
+                        for key, state in states.items()
+                    ],
+                )
+                cur.execute(
+                    "UPDATE accrued_interests_sync SET last_block_number=%s WHERE syncid=%s",
+                    (to_block, self.sync_id),
+                )
+
+        self.synced_block_number = to_block
+        logger.debug(
+            "Stored accrued interests of blocks %s to %s -> %s rows",
+            from_block,
+            to_block,
+            len(interests_rows),
+        )
+        return to_block - from_block + 1
+
+    def _load_states(
+        self, cur, keys: Iterable[TrustlineKey]
+    ) -> Dict[TrustlineKey, TrustlineInterestsState]:
+        states = {key: TrustlineInterestsState() for key in keys}
+        if states:
+            cur.execute(
+                """SELECT network_address, user_a, user_b, state
+                   FROM accrued_interests_trustlines
+                   WHERE (network_address, user_a, user_b) IN %s""",
+                (tuple(states.keys()),),
+            )
+            for row in cur.fetchall():
+                key = (row["network_address"], row["user_a"], row["user_b"])
+                states[key] = TrustlineInterestsState.from_json(row["state"])
+        return states
+
+    def get_accrued_interests(
+        self,
+        currency_network_db: CurrencyNetworkEthindexDB,
+        network_address: str,
+        user_address: str,
+        counterparty_address: str,
+        start_time: int = 0,
+        end_time: Optional[int] = None,
+    ) -> List[InterestAccrued]:
+        """get the interests accrued on a trustline in between start_time and
+        end_time as viewed from user_address.
+
+        The interests of events not yet in the ledger are computed on the fly.
+        """
+        if not end_time:
+            end_time = int(time.time())
+        key = get_trustline_key(network_address, user_address, counterparty_address)
+        # user_a receives the interests, user_b pays them
+        sign = 1 if user_address == key[1] else -1
+
+        conn = currency_network_db.conn
+        with conn:
+            with conn.cursor() as cur:
+                # read the stored interests and the state at the same synced block
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cur.execute(
+                    "SELECT last_block_number FROM accrued_interests_sync WHERE syncid=%s",
+                    (self.sync_id,),
+                )
+                synced_block_number = cur.fetchone()["last_block_number"]
+                state = self._load_states(cur, [key])[key]
+                cur.execute(
+                    """SELECT value, interest_rate, timestamp FROM accrued_interests
+                       WHERE network_address=%s AND user_a=%s AND user_b=%s
+                         AND timestamp>=%s AND timestamp<=%s
+                       ORDER BY blockNumber, logIndex""",
+                    (*key, start_time, end_time),
+                )
+                accrued_interests = [
+                    InterestAccrued(
+                        sign * int(row["value"]), row["interest_rate"], row["timestamp"]
+                    )
+                    for row in cur.fetchall()
+                ]
+
+        tail_events = currency_network_db.get_trustline_events(
+            network_address,
+            user_address,
+            counterparty_address,
+            event_types=[BalanceUpdateEventType, TrustlineUpdateEventType],
+            from_block=synced_block_number + 1,
+        )
+        for event in tail_events:
+            tail_interests = apply_event_on_state(state, key[1], event)
+            if (
+                tail_interests is not None
+                and start_time <= tail_interests.timestamp <= end_time
+            ):
+                accrued_interests.append(
+                    InterestAccrued(
+                        sign * tail_interests.value,
+                        tail_interests.interest_rate,
+                        tail_interests.timestamp,
+                    )
+                )
+        return accrued_interests
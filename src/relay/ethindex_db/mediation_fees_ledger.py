@@ -0,0 +1,270 @@
+"""persist the mediation fees earned by users next to the ethindex database
+
+Finding the mediation fees of a user means replaying all of the user's
+BalanceUpdate, Transfer and TrustlineUpdate events in a currency network on a
+graph. The MediationFeesLedger stores the fees found in confirmed events
+together with a checkpoint per (network, user): the position of the next event
+to replay and the state of the trustlines of the user at that position.
+Requests then only replay the events after the checkpoint.
+
+The ledger assumes that confirmed events are never removed. After a reorg
+deeper than the confirmation depth, the ledger has to be cleared with
+`tl-relay-db rebuild-mediation-fees`, it is then rebuilt on the following
+requests.
+"""
+
+import json
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from hexbytes import HexBytes
+
+from relay.network_graph.graph import CurrencyNetworkGraph
+
+from .ethindex_db import CurrencyNetworkEthindexDB, get_latest_ethindex_block_number
+from .events_informations import (
+    MediationFee,
+    MediationFeesCollector,
+    mediation_fees_event_types,
+    sorted_events,
+)
+
+logger = logging.getLogger("mediation_fees_ledger")
+
+create_tables_statement = """
+    CREATE TABLE IF NOT EXISTS mediation_fees (
+        network_address TEXT NOT NULL,
+        user_address TEXT NOT NULL,
+        blockNumber INTEGER NOT NULL,
+        logIndex INTEGER NOT NULL,
+        transactionHash TEXT NOT NULL,
+        from_address TEXT NOT NULL,
+        to_address TEXT NOT NULL,
+        value NUMERIC NOT NULL,
+        timestamp INTEGER NOT NULL,
+        PRIMARY KEY (network_address, user_address, blockNumber, logIndex)
+    );
+    CREATE INDEX IF NOT EXISTS mediation_fees_timestamp_idx
+        ON mediation_fees (network_address, user_address, timestamp);
+    CREATE TABLE IF NOT EXISTS mediation_fees_checkpoints (
+        network_address TEXT NOT NULL,
+        user_address TEXT NOT NULL,
+        resume_block_number INTEGER NOT NULL,
+        resume_log_index INTEGER NOT NULL,
+        trustlines JSONB NOT NULL,
+        PRIMARY KEY (network_address, user_address)
+    );
+"""
+
+# The position of an event in the chain (blockNumber, logIndex)
+EventPosition = Tuple[int, int]
+
+
+def create_tables(conn):
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(create_tables_statement)
+
+
+def clear_ledger(conn, network_address: Optional[str] = None):
+    """remove the fees and checkpoints of all users in network_address
+    or of all networks if no network_address is given"""
+    with conn:
+        with conn.cursor() as cur:
+            for table in ("mediation_fees", "mediation_fees_checkpoints"):
+                if network_address is None:
+                    cur.execute(f"DELETE FROM {table}")
+                else:
+                    cur.execute(
+                        f"DELETE FROM {table} WHERE network_address=%s",
+                        (network_address,),
+                    )
+
+
+def _event_position(event) -> EventPosition:
+    return event.blocknumber, event.log_index
+
+
+class MediationFeesLedger:
+    def __init__(self, *, confirmation_depth: int):
+        self.confirmation_depth = confirmation_depth
+
+    def get_earned_mediation_fees(
+        self,
+        currency_network_db: CurrencyNetworkEthindexDB,
+        network_address: str,
+        user_address: str,
+        graph: CurrencyNetworkGraph,
+        start_time: int = 0,
+        end_time: Optional[int] = None,
+    ) -> List[MediationFee]:
+        """get the mediation fees earned in between start_time and end_time
+
+        graph has to be an empty graph with the settings of the currency network.
+        The ledger is brought up to date with the confirmed events first.
+        """
+        conn = currency_network_db.conn
+        resume_position = self._load_checkpoint(
+            conn, network_address, user_address, graph
+        )
+        events = [
+            event
+            for event in sorted_events(
+                currency_network_db.get_all_network_events(
+                    user_address=user_address,
+                    from_block=resume_position[0],
+                    event_types=mediation_fees_event_types,
+                )
+            )
+            if _event_position(event) >= resume_position
+        ]
+
+        confirmed_block_number = (
+            get_latest_ethindex_block_number(conn) - self.confirmation_depth
+        )
+        confirmed_events = [
+            event for event in events if event.blocknumber <= confirmed_block_number
+        ]
+        unconfirmed_events = events[len(confirmed_events) :]
+
+        collector = MediationFeesCollector(user_address, graph)
+        confirmed_fees = []
+        for event in confirmed_events:
+            fee = collector.apply_event(event)
+            if fee is not None:
+                confirmed_fees.append((_event_position(event), fee))
+
+        if confirmed_events:
+            # A standalone balance update is not yet applied on the graph,
+            # so the next replay has to start with it.
+            if collector.last_standalone_balance_update is not None:
+                resume_position = _event_position(
+                    collector.last_standalone_balance_update
+                )
+            else:
+                last_block_number, last_log_index = _event_position(
+                    confirmed_events[-1]
+                )
+                resume_position = (last_block_number, last_log_index + 1)
+            self._store(
+                conn,
+                network_address,
+                user_address,
+                confirmed_fees,
+                resume_position,
+                graph,
+            )
+
+        unconfirmed_fees = collector.apply_events(unconfirmed_events)
+
+        if not end_time:
+            end_time = int(time.time())
+        fees = self._load_fees(
+            conn, network_address, user_address, start_time, end_time
+        )
+        fees.extend(
+            fee for fee in unconfirmed_fees if start_time <= fee.timestamp <= end_time
+        )
+        return fees
+
+    def _load_checkpoint(
+        self, conn, network_address, user_address, graph: CurrencyNetworkGraph
+    ) -> EventPosition:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT * FROM mediation_fees_checkpoints
+                       WHERE network_address=%s AND user_address=%s""",
+                    (network_address, user_address),
+                )
+                row = cur.fetchone()
+        if row is None:
+            return 0, 0
+        for a, b, data in row["trustlines"]:
+            graph.graph.add_edge(a, b, **data)
+        return row["resume_block_number"], row["resume_log_index"]
+
+    def _store(
+        self,
+        conn,
+        network_address,
+        user_address,
+        fees: List[Tuple[EventPosition, MediationFee]],
+        resume_position: EventPosition,
+        graph: CurrencyNetworkGraph,
+    ):
+        trustlines = json.dumps(list(graph.graph.edges(data=True)))
+        with conn:
+            with conn.cursor() as cur:
+                for (block_number, log_index), fee in fees:
+                    cur.execute(
+                        """INSERT INTO mediation_fees (network_address, user_address,
+                               blockNumber, logIndex, transactionHash, from_address,
+                               to_address, value, timestamp)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                           ON CONFLICT DO NOTHING""",
+                        (
+                            network_address,
+                            user_address,
+                            block_number,
+                            log_index,
+                            HexBytes(fee.transaction_hash).hex(),
+                            fee.from_,
+                            fee.to,
+                            fee.value,
+                            fee.timestamp,
+                        ),
+                    )
+                # Concurrent requests may replay the same events,
+                # only ever move the checkpoint forward.
+                cur.execute(
+                    """INSERT INTO mediation_fees_checkpoints AS checkpoints
+                           (network_address, user_address, resume_block_number,
+                            resume_log_index, trustlines)
+                       VALUES (%s, %s, %s, %s, %s)
+                       ON CONFLICT (network_address, user_address) DO UPDATE
+                       SET resume_block_number=EXCLUDED.resume_block_number,
+                           resume_log_index=EXCLUDED.resume_log_index,
+                           trustlines=EXCLUDED.trustlines
+                       WHERE (checkpoints.resume_block_number, checkpoints.resume_log_index)
+                           < (EXCLUDED.resume_block_number, EXCLUDED.resume_log_index)""",
+                    (
+                        network_address,
+                        user_address,
+                        resume_position[0],
+                        resume_position[1],
+                        trustlines,
+                    ),
+                )
+        logger.debug(
+            "Stored %s mediation fees of %s in %s, resuming at %s",
+            len(fees),
+            user_address,
+            network_address,
+            resume_position,
+        )
+
+    def _load_fees(
+        self, conn, network_address, user_address, start_time, end_time
+    ) -> List[MediationFee]:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT * FROM mediation_fees
+                       WHERE network_address=%s AND user_address=%s
+                         AND timestamp>=%s AND timestamp<=%s
+                       ORDER BY blockNumber, logIndex""",
+                    (network_address, user_address, start_time, end_time),
+                )
+                rows = cur.fetchall()
+        return [
+            MediationFee(
+                value=int(row["value"]),
+                from_=row["from_address"],
+                to=row["to_address"],
+                transaction_hash=HexBytes(row["transactionhash"]),
+                timestamp=row["timestamp"],
+            )
+            for row in rows
+        ]
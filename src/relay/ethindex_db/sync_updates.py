@@ -1,6 +1,8 @@
 import logging
 import os.path
-from typing import Dict, List
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import attr
 
@@ -75,26 +77,43 @@ class NetworkUnfreezeFeedUpdate(FeedUpdate):
     pass
 
 
-def graph_update_getter():
-    ensure_graph_sync_id_file_exists()
-    return get_graph_updates_feed
+def get_graph_updates_feed(conn, limit: Optional[int] = None) -> List[FeedUpdate]:
+    """Get a list of updates to be applied on the trustlines graphs to make them up to date with the chain
 
+    The last synced id is read from and written to the sync id file on every call,
+    see GraphFeedSync to keep it in memory.
+    With a limit, at most limit rows of the feed are read. The next call continues after them.
+    """
+
+    rows = fetch_graph_feed_rows(conn, get_latest_graph_sync_id(), limit)
+
+    if len(rows) >= 1:
+        write_graph_sync_id_file(rows[len(rows) - 1]["id"])
 
-def get_graph_updates_feed(
-    conn,
-) -> List[FeedUpdate]:
-    """Get a list of updates to be applied on the trustlines graphs to make them up to date with the chain"""
+    return feed_updates_from_rows(rows)
 
-    last_synced_graph_id = get_latest_graph_sync_id()
 
+def fetch_graph_feed_rows(conn, last_synced_graph_id, limit: Optional[int] = None):
     query_string = """
-        SELECT * FROM graphfeed WHERE id>%s ORDER BY id ASC;
+        SELECT * FROM graphfeed WHERE id>%s ORDER BY id ASC
     """
+    query_params: List[Any] = [last_synced_graph_id]
+    if limit is not None:
+        query_string += " LIMIT %s"
+        query_params.append(limit)
 
     with conn.cursor() as cur:
-        cur.execute(query_string, [last_synced_graph_id])
-        rows = cur.fetchall()
+        cur.execute(query_string, query_params)
+        return cur.fetchall()
+
+
+def get_max_graph_feed_id(conn) -> Optional[int]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) AS max_id FROM graphfeed")
+        return cur.fetchone()["max_id"]
+
 
+def feed_updates_from_rows(rows) -> List[FeedUpdate]:
     feed_update: List[FeedUpdate] = []
 
     for row in rows:
@@ -126,15 +145,181 @@ def get_graph_updates_feed(
         else:
             logger.warning(f"Got feed update with unknown type from database: {row}")
 
-    if len(rows) >= 1:
-        write_graph_sync_id_file(rows[len(rows) - 1]["id"])
-
     return feed_update
 
 
+class SyncIdFileStore:
+    """stores the last synced graph feed id in a file
+
+    The file is replaced atomically, so that it is never left half written.
+    """
+
+    def __init__(self, path: str = SYNC_FILE_PATH):
+        self.path = path
+
+    def load(self) -> int:
+        if not os.path.isfile(self.path):
+            return 0
+        with open(self.path, "r") as f:
+            return int(f.read())
+
+    def store(self, sync_id: int) -> None:
+        _write_file_atomically(self.path, str(sync_id))
+
+
+class SyncIdDatabaseStore:
+    """stores the last synced graph feed id in the database under a name
+
+    Relay servers using the same name share the sync id. It only ever moves forward.
+    """
+
+    def __init__(self, conn, name: str = "default"):
+        self.conn = conn
+        self.name = name
+
+    def create_table(self) -> None:
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    """CREATE TABLE IF NOT EXISTS relay_graph_feed_sync (
+                           name TEXT PRIMARY KEY,
+                           last_graph_feed_id BIGINT NOT NULL
+                       )"""
+                )
+
+    def load(self) -> int:
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT last_graph_feed_id FROM relay_graph_feed_sync WHERE name=%s",
+                    (self.name,),
+                )
+                row = cur.fetchone()
+        if row is None:
+            return 0
+        return row["last_graph_feed_id"]
+
+    def store(self, sync_id: int) -> None:
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    """INSERT INTO relay_graph_feed_sync AS sync (name, last_graph_feed_id)
+                       VALUES (%s, %s)
+                       ON CONFLICT (name) DO UPDATE
+                       SET last_graph_feed_id=EXCLUDED.last_graph_feed_id
+                       WHERE sync.last_graph_feed_id < EXCLUDED.last_graph_feed_id""",
+                    (self.name, sync_id),
+                )
+
+
+class GraphFeedSync:
+    """GraphFeedSync reads the graph feed after the last synced id it holds in memory
+
+    The sync id is persisted to the store at most every `persist_interval`
+    seconds and on `persist`. After a crash, the updates since the last
+    persisted id are applied again, which gives the same graphs.
+    """
+
+    def __init__(
+        self, store: Union[SyncIdFileStore, SyncIdDatabaseStore], *, persist_interval
+    ):
+        self.store = store
+        self.persist_interval = persist_interval
+        self.sync_id = store.load()
+        self._persisted_sync_id = self.sync_id
+        self._last_persist_time = time.monotonic()
+
+    def get_updates(self, conn, limit: Optional[int] = None) -> List[FeedUpdate]:
+        rows = fetch_graph_feed_rows(conn, self.sync_id, limit)
+        if rows:
+            self.sync_id = rows[-1]["id"]
+        if time.monotonic() - self._last_persist_time >= self.persist_interval:
+            self.persist()
+        return feed_updates_from_rows(rows)
+
+    def persist(self) -> None:
+        self._last_persist_time = time.monotonic()
+        if self.sync_id == self._persisted_sync_id:
+            return
+        self.store.store(self.sync_id)
+        self._persisted_sync_id = self.sync_id
+        logger.debug("Persisted graph feed sync id %s", self.sync_id)
+
+
+def _is_zero_update(update: FeedUpdate) -> bool:
+    if isinstance(update, TrustlineUpdateFeedUpdate):
+        return (
+            update.creditline_given
+            == update.creditline_received
+            == update.interest_rate_given
+            == update.interest_rate_received
+            == 0
+        )
+    if isinstance(update, BalanceUpdateFeedUpdate):
+        return update.value == 0
+    return False
+
+
+def _trustline_key(update: Union[TrustlineUpdateFeedUpdate, BalanceUpdateFeedUpdate]):
+    return update.address, frozenset((update.from_, update.to))
+
+
+def coalesce_feed_updates(feed_updates: List[FeedUpdate]) -> List[FeedUpdate]:
+    """Remove the updates that are overwritten by later updates in feed_updates
+
+    Applying the result on a graph gives the same graph as applying all of
+    feed_updates. Per trustline, only the last trustline update and the last
+    balance update are kept, the balance together with its timestamp as
+    modification time. The order of the kept updates is not changed.
+
+    A trustline is removed from the graph when it becomes empty and recreated
+    with default values on a later update. Updates of trustlines that may have
+    been emptied by one of the updates are therefore all kept.
+    """
+    last_update_index: Dict[Tuple[Any, ...], int] = {}
+    trustlines_with_zero_updates: Set[Tuple[Any, ...]] = set()
+
+    for index, update in enumerate(feed_updates):
+        if isinstance(update, (TrustlineUpdateFeedUpdate, BalanceUpdateFeedUpdate)):
+            trustline_key = _trustline_key(update)
+            last_update_index[(type(update),) + trustline_key] = index
+            if _is_zero_update(update):
+                trustlines_with_zero_updates.add(trustline_key)
+        elif isinstance(update, (NetworkFreezeFeedUpdate, NetworkUnfreezeFeedUpdate)):
+            last_update_index[("freeze", update.address)] = index
+        else:
+            raise RuntimeError(f"Got feed update of unexpected type {update}")
+
+    kept_indices = set(last_update_index.values())
+    return [
+        update
+        for index, update in enumerate(feed_updates)
+        if index in kept_indices
+        or (
+            isinstance(update, (TrustlineUpdateFeedUpdate, BalanceUpdateFeedUpdate))
+            and _trustline_key(update) in trustlines_with_zero_updates
+        )
+    ]
+
+
+def _write_file_atomically(path: str, contents: str) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, prefix=os.path.basename(path), delete=False
+    ) as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, path)
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
 def write_graph_sync_id_file(sync_id: int):
-    with open(SYNC_FILE_PATH, "w") as f:
-        f.write(str(sync_id))
+    _write_file_atomically(SYNC_FILE_PATH, str(sync_id))
 
 
 def ensure_graph_sync_id_file_exists():
@@ -0,0 +1,61 @@
+"""cache the transfer information of confirmed transfers
+
+Finding the path, fees and balance changes of a transfer reads all balance
+updates of the trustlines along the path. Once the block of the transfer is
+confirmed, this information does not change anymore. The
+TransferInformationCache stores it per transaction hash and per event id
+(block hash, log index) of the requests for it.
+"""
+
+import logging
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+
+import cachetools
+from hexbytes import HexBytes
+
+logger = logging.getLogger("transfer_information_cache")
+
+
+def transaction_key(tx_hash) -> Tuple[str, bytes]:
+    return "tx", bytes(HexBytes(tx_hash))
+
+
+def event_id_key(block_hash, log_index: int) -> Tuple[str, bytes, int]:
+    return "event", bytes(HexBytes(block_hash)), log_index
+
+
+class TransferInformationCache:
+    """TransferInformationCache holds the transfer information found for
+    transactions whose events are at least `confirmation_depth` blocks deep.
+    It holds at most `max_entries` results, the least recently used ones are
+    evicted first.
+    """
+
+    def __init__(self, *, max_entries: int, confirmation_depth: int):
+        self.confirmation_depth = confirmation_depth
+        self._cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[List[Any]]:
+        transfer_informations = self._cache.get(key)
+        if transfer_informations is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(transfer_informations)
+
+    def store(
+        self,
+        key: Hashable,
+        transfer_informations: Sequence[Any],
+        block_number: int,
+        current_blocknumber: int,
+    ) -> bool:
+        """store the transfer informations if block_number is confirmed,
+        return whether they were stored"""
+        if current_blocknumber - block_number < self.confirmation_depth:
+            return False
+        self._cache[key] = tuple(transfer_informations)
+        logger.debug("Cached transfer information for %s", key)
+        return True
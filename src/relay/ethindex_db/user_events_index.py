@@ -0,0 +1,157 @@
+"""maintain an index of events per user next to the ethindex database
+
+The ethindex `events` table only stores the addresses of the users involved in
+an event inside of its `args` JSONB column. Queries for the events of a user
+therefore have to scan all events of the contracts in question. The
+`user_events` table holds a copy of every event row for each user involved in
+it, so that these queries become range scans over
+(user_address, address, blockNumber, transactionIndex, logIndex).
+
+Only events of final blocks (blocks with at least `reorg_depth` confirmations)
+are copied into the index. Ethindex may still delete and replace the events of
+more recent blocks, these have to be read from the `events` table. That way the
+index never has to handle reorgs and rows are only ever appended.
+"""
+
+import logging
+from typing import Iterable, Mapping, Optional, Set
+
+from .ethindex_db import get_latest_ethindex_block_number
+
+logger = logging.getLogger("user_events_index")
+
+USER_EVENTS_TABLE = "user_events"
+DEFAULT_SYNC_ID = "default"
+
+create_tables_statement = f"""
+    CREATE TABLE IF NOT EXISTS {USER_EVENTS_TABLE} (
+        user_address TEXT NOT NULL,
+        LIKE events,
+        PRIMARY KEY (user_address, blockHash, logIndex)
+    );
+    CREATE INDEX IF NOT EXISTS {USER_EVENTS_TABLE}_user_position_idx
+        ON {USER_EVENTS_TABLE} (user_address, address, blockNumber, transactionIndex, logIndex);
+    CREATE TABLE IF NOT EXISTS {USER_EVENTS_TABLE}_sync (
+        syncid TEXT PRIMARY KEY,
+        last_block_number INTEGER NOT NULL
+    );
+"""
+
+event_columns = """transactionHash, blockNumber, address, eventName, args,
+                   blockHash, transactionIndex, logIndex, timestamp"""
+
+
+def get_all_user_fields(from_to_types: Mapping[str, Iterable[str]]) -> Iterable[str]:
+    """get all the fields of event args holding a user address"""
+    all_user_fields: Set[str] = set()
+    for user_fields in from_to_types.values():
+        all_user_fields.update(user_fields)
+    return sorted(all_user_fields)
+
+
+class UserEventsIndex:
+    """UserEventsIndex copies the events of final blocks into the `user_events`
+    table. `synced_block_number` is the number of the last block whose events
+    are completely copied, or None if no block has been copied yet.
+    """
+
+    def __init__(
+        self,
+        user_fields: Iterable[str],
+        *,
+        reorg_depth: int,
+        max_blocks_per_sync: int,
+        sync_id: str = DEFAULT_SYNC_ID,
+    ):
+        self.user_fields = list(user_fields)
+        self.reorg_depth = reorg_depth
+        self.max_blocks_per_sync = max_blocks_per_sync
+        self.sync_id = sync_id
+        self.synced_block_number: Optional[int] = None
+
+    def create_tables(self, conn):
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(create_tables_statement)
+
+    def load_synced_block_number(self, conn) -> Optional[int]:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT last_block_number FROM {USER_EVENTS_TABLE}_sync WHERE syncid=%s",
+                    (self.sync_id,),
+                )
+                row = cur.fetchone()
+        self.synced_block_number = row["last_block_number"] if row else None
+        return self.synced_block_number
+
+    def sync(self, conn) -> int:
+        """copy the events of the next final blocks into the index
+
+        At most `max_blocks_per_sync` blocks are copied in one transaction.
+        Returns the number of blocks copied, 0 if the index is up to date.
+        """
+        with conn:
+            final_block_number = (
+                get_latest_ethindex_block_number(conn) - self.reorg_depth
+            )
+            from_block = (
+                0 if self.synced_block_number is None else self.synced_block_number + 1
+            )
+            to_block = min(
+                final_block_number, from_block + self.max_blocks_per_sync - 1
+            )
+            if to_block < from_block:
+                return 0
+
+            user_values = ", ".join(
+                f"(args->>'{user_field}')" for user_field in self.user_fields
+            )
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""INSERT INTO {USER_EVENTS_TABLE} (user_address, {event_columns})
+                        SELECT users.user_address, {event_columns}
+                        FROM events
+                        CROSS JOIN LATERAL (VALUES {user_values}) AS users(user_address)
+                        WHERE blockNumber>=%s
+                          AND blockNumber<=%s
+                          AND users.user_address IS NOT NULL
+                        ON CONFLICT DO NOTHING
+                    """,
+                    (from_block, to_block),
+                )
+                inserted_rows = cur.rowcount
+                cur.execute(
+                    f"""INSERT INTO {USER_EVENTS_TABLE}_sync (syncid, last_block_number)
+                        VALUES (%s, %s)
+                        ON CONFLICT (syncid) DO UPDATE SET last_block_number=EXCLUDED.last_block_number
+                    """,
+                    (self.sync_id, to_block),
+                )
+
+        self.synced_block_number = to_block
+        logger.debug(
+            "Indexed blocks %s to %s for users -> %s rows",
+            from_block,
+            to_block,
+            inserted_rows,
+        )
+        return to_block - from_block + 1
+
+    def backfill(self, conn) -> int:
+        """copy all final blocks into the index, one chunk per transaction
+
+        Returns the total number of blocks copied.
+        """
+        self.create_tables(conn)
+        self.load_synced_block_number(conn)
+        total_synced_blocks = 0
+        while True:
+            synced_blocks = self.sync(conn)
+            if synced_blocks == 0:
+                return total_synced_blocks
+            total_synced_blocks += synced_blocks
+            logger.info(
+                "Backfilled user events index up to block %s",
+                self.synced_block_number,
+            )
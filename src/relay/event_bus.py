@@ -0,0 +1,136 @@
+"""forward posted messages to the relay processes sharing the same database
+
+Every relay process follows the chain and the graph feed itself, so all of
+them publish the blockchain events to their own subscribers. Messages
+posted with `PostMessage` only arrive at one process though. The event bus
+broadcasts them, so that they reach the websockets connected to the other
+processes as well.
+
+The InProcessEventBus is used for a single relay process, it does not
+forward anything. The PostgresEventBus sends the messages with NOTIFY on
+MESSAGING_CHANNEL and receives the messages of the other processes with
+LISTEN.
+"""
+
+import json
+import logging
+import sys
+import uuid
+from typing import Callable, Optional, Tuple
+
+import gevent
+from gevent import select
+
+from .events import MessageEvent
+
+logger = logging.getLogger("event_bus")
+
+MESSAGING_CHANNEL = "relay_messaging"
+# postgres refuses notifications with payloads of 8000 bytes or more
+MAX_PAYLOAD_SIZE = 7999
+
+DeliverCallable = Callable[[str, MessageEvent], None]
+
+
+class EventBus:
+    """interface of the buses forwarding messages to other relay processes"""
+
+    def start(self, deliver: DeliverCallable) -> None:
+        """start calling deliver with the messages of the other processes"""
+        raise NotImplementedError
+
+    def broadcast(self, user_address: str, message: MessageEvent) -> None:
+        """send the message to the other processes"""
+        raise NotImplementedError
+
+
+class InProcessEventBus(EventBus):
+    """event bus of a single relay process, there is nothing to forward"""
+
+    def start(self, deliver: DeliverCallable) -> None:
+        pass
+
+    def broadcast(self, user_address: str, message: MessageEvent) -> None:
+        pass
+
+
+def encode_message(sender: str, user_address: str, message: MessageEvent) -> str:
+    return json.dumps(
+        {
+            "sender": sender,
+            "user": user_address,
+            "id": message.id,
+            "type": message.type,
+            "message": message.message,
+            "timestamp": message.timestamp,
+        }
+    )
+
+
+def decode_message(payload: str) -> Tuple[str, str, MessageEvent]:
+    """returns the sender, the user address and the message of the payload"""
+    data = json.loads(payload)
+    message = MessageEvent(
+        data["message"], timestamp=data["timestamp"], type=data["type"], id=data["id"]
+    )
+    return data["sender"], data["user"], message
+
+
+class PostgresEventBus(EventBus):
+    """event bus sending the messages via postgres LISTEN/NOTIFY
+
+    listen_conn and notify_conn have to be connections that are not used for
+    anything else, they are switched to autocommit mode. Two connections are
+    needed as the listening greenlet waits on listen_conn while other
+    greenlets broadcast.
+    """
+
+    def __init__(self, listen_conn, notify_conn, channel: str = MESSAGING_CHANNEL):
+        self.listen_conn = listen_conn
+        self.notify_conn = notify_conn
+        self.channel = channel
+        # to ignore the notifications sent by this process
+        self.process_id = uuid.uuid4().hex
+        self._deliver: Optional[DeliverCallable] = None
+
+    def start(self, deliver: DeliverCallable) -> None:
+        self._deliver = deliver
+        self.notify_conn.autocommit = True
+        self.listen_conn.autocommit = True
+        with self.listen_conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        greenlet = gevent.Greenlet.spawn(self._listen_loop)
+        greenlet.link_exception(lambda *args: sys.exit("Event bus greenlet died"))
+
+    def broadcast(self, user_address: str, message: MessageEvent) -> None:
+        payload = encode_message(self.process_id, user_address, message)
+        if len(payload.encode()) > MAX_PAYLOAD_SIZE:
+            logger.warning(
+                "Message to %s is too big to be sent to other relay processes",
+                user_address,
+            )
+            return
+        with self.notify_conn.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+    def _listen_loop(self) -> None:
+        while True:
+            select.select([self.listen_conn], [], [])
+            self.listen_conn.poll()
+            while self.listen_conn.notifies:
+                notification = self.listen_conn.notifies.pop(0)
+                self._handle_payload(notification.payload)
+
+    def _handle_payload(self, payload: str) -> None:
+        try:
+            sender, user_address, message = decode_message(payload)
+        except (ValueError, KeyError):
+            logger.warning("Ignoring invalid event bus notification: %s", payload)
+            return
+        if sender == self.process_id:
+            return
+        assert self._deliver is not None
+        try:
+            self._deliver(user_address, message)
+        except Exception:
+            logger.exception("Could not deliver message from other relay process")
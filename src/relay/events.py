@@ -1,9 +1,14 @@
+import uuid
+from typing import Optional
+
 from relay.network_graph.graph import AggregatedAccountSummary
 
 
 class Event(object):
 
     type = "Event"
+    # type of the contract emitting the event, see `relay.relay.ContractTypes`
+    contract_type: Optional[str] = None
 
     def __init__(self, timestamp: int) -> None:
         self.timestamp = timestamp
@@ -13,6 +18,9 @@ class Event(object):
 
 
 class AccountEvent(Event):
+
+    contract_type = "CurrencyNetwork"
+
     def __init__(
         self,
         network_address: str,
@@ -57,8 +65,12 @@ class MessageEvent(Event):
 
     type = "Message"
 
-    def __init__(self, message: str, *, timestamp: int, type: str = None) -> None:
+    def __init__(
+        self, message: str, *, timestamp: int, type: str = None, id: str = None
+    ) -> None:
         super().__init__(timestamp)
         if type is not None:
             self.type = type
         self.message = message
+        # identifies the message across relay processes
+        self.id = id if id is not None else uuid.uuid4().hex
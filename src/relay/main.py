@@ -10,6 +10,7 @@ from gevent.pywsgi import WSGIServer
 from geventwebsocket.handler import WebSocketHandler
 
 from relay.api.app import ApiType
+from relay.api.streams.compression import DeflateWebSocketHandler
 from relay.config.config import ValidationError, load_config, validation_error_string
 from relay.relay import TrustlinesRelay
 from relay.utils import get_version
@@ -145,20 +146,24 @@ def main(
     host = rest_config["host"]
     ipport = (host, port)
     app = ApiApp(trustlines, enabled_apis=select_enabled_apis(config_dict))
-    http_server = WSGIServer(ipport, app, log=None, handler_class=WebSocketHandler)
-
-    if report_coverage:
-
-        def shutdown(code, frame):
-            logger.info("Relay server is shutting down ...")
-            http_server.stop(timeout=60)
+    if config_dict["streams"]["permessage_deflate"]:
+        handler_class = DeflateWebSocketHandler
+    else:
+        handler_class = WebSocketHandler
+    http_server = WSGIServer(ipport, app, log=None, handler_class=handler_class)
+
+    def shutdown(code, frame):
+        logger.info("Relay server is shutting down ...")
+        http_server.stop(timeout=60)
+        trustlines.stop()
+        if report_coverage:
             coverage.stop()
             coverage.xml_report(outfile="/end2end-coverage/coverage.xml")
-            exit(signal.SIGTERM)
+        exit(signal.SIGTERM)
 
-        signal.signal(signal.SIGTERM, shutdown)
-        signal.signal(signal.SIGQUIT, shutdown)
-        signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGQUIT, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
 
     logger.info("Server is running on {}".format(ipport))
     http_server.serve_forever()
@@ -0,0 +1,215 @@
+"""stores for messages that were published while no client of the user listened
+
+The messages are kept until the user reads them with `getMissedMessages`,
+at most `max_messages_per_user` per user and at most `ttl` seconds. The
+in memory store additionally only keeps the messages of the
+`max_users` users that received messages most recently, so that its memory
+stays bounded. The database store keeps the messages in a table of the
+relay database instead and survives restarts.
+"""
+
+import time
+from collections import deque
+from typing import Deque, List, Tuple
+
+import cachetools
+from sqlalchemy import Column, Float, Integer, String, Text
+
+from relay.events import MessageEvent
+from relay.relay_db import Base, RelayDB
+
+
+class MissedMessageStore:
+    """interface of the stores for missed messages"""
+
+    def add(self, user_address: str, message: MessageEvent) -> None:
+        """stores a message that no client of the user has read"""
+        raise NotImplementedError
+
+    def remove(self, user_address: str, message_id: str) -> None:
+        """removes a message that was read after it was stored"""
+        raise NotImplementedError
+
+    def pop(self, user_address: str, limit: int = None) -> List[MessageEvent]:
+        """removes and returns the oldest `limit` missed messages of the user
+
+        All missed messages are returned, if `limit` is None.
+        """
+        raise NotImplementedError
+
+
+class InMemoryMissedMessageStore(MissedMessageStore):
+    def __init__(
+        self, *, max_messages_per_user: int, max_users: int, ttl: float
+    ) -> None:
+        self.max_messages_per_user = max_messages_per_user
+        self.ttl = ttl
+        # user address -> (time stored, message), oldest first
+        self._messages: cachetools.LRUCache = cachetools.LRUCache(maxsize=max_users)
+
+    def add(self, user_address: str, message: MessageEvent) -> None:
+        messages: Deque[Tuple[float, MessageEvent]] = self._messages.get(user_address)
+        if messages is None:
+            messages = deque(maxlen=self.max_messages_per_user)
+            self._messages[user_address] = messages
+        now = time.time()
+        self._drop_expired(messages, now)
+        messages.append((now, message))
+
+    def remove(self, user_address: str, message_id: str) -> None:
+        messages = self._messages.get(user_address)
+        if messages is None:
+            return
+        for entry in messages:
+            if entry[1].id == message_id:
+                messages.remove(entry)
+                break
+        if not messages:
+            del self._messages[user_address]
+
+    def pop(self, user_address: str, limit: int = None) -> List[MessageEvent]:
+        messages = self._messages.get(user_address)
+        if messages is None:
+            return []
+        self._drop_expired(messages, time.time())
+        if limit is None:
+            limit = len(messages)
+        result = [messages.popleft()[1] for _ in range(min(limit, len(messages)))]
+        if not messages:
+            del self._messages[user_address]
+        return result
+
+    def _drop_expired(
+        self, messages: Deque[Tuple[float, MessageEvent]], now: float
+    ) -> None:
+        while messages and messages[0][0] < now - self.ttl:
+            messages.popleft()
+
+
+class MissedMessageORM(Base):  # type: ignore
+    __tablename__ = "missed_message"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_address = Column(String, index=True, nullable=False)
+    message_id = Column(String, nullable=False)
+    type = Column(String, nullable=True)
+    message = Column(Text, nullable=False)
+    timestamp = Column(Integer, nullable=False)
+    stored_at = Column(Float, nullable=False, index=True)
+
+
+class DatabaseMissedMessageStore(MissedMessageStore, RelayDB):
+    """missed messages in the relay database, shared by all relay processes
+
+    Expired messages of all users are deleted every `cleanup_interval`
+    additions, so that messages of users who never come back do not stay.
+    """
+
+    orm_classes = [MissedMessageORM]
+
+    def __init__(
+        self,
+        engine,
+        *,
+        max_messages_per_user: int,
+        ttl: float,
+        cleanup_interval: int = 1000,
+    ) -> None:
+        self.max_messages_per_user = max_messages_per_user
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._additions_since_cleanup = 0
+        super().__init__(engine)
+
+    def add(self, user_address: str, message: MessageEvent) -> None:
+        now = time.time()
+        with self.session() as session:
+            session.add(
+                MissedMessageORM(
+                    user_address=user_address,
+                    message_id=message.id,
+                    type=message.type,
+                    message=message.message,
+                    timestamp=message.timestamp,
+                    stored_at=now,
+                )
+            )
+            self._delete_expired(session, user_address, now)
+            session.flush()
+            ids_to_keep = (
+                session.query(MissedMessageORM.id)
+                .filter(MissedMessageORM.user_address == user_address)
+                .order_by(MissedMessageORM.id.desc())
+                .limit(self.max_messages_per_user)
+                .subquery()
+            )
+            session.query(MissedMessageORM).filter(
+                MissedMessageORM.user_address == user_address,
+                MissedMessageORM.id.notin_(session.query(ids_to_keep.c.id)),
+            ).delete(synchronize_session=False)
+        self._additions_since_cleanup += 1
+        if self._additions_since_cleanup >= self.cleanup_interval:
+            self._additions_since_cleanup = 0
+            with self.session() as session:
+                session.query(MissedMessageORM).filter(
+                    MissedMessageORM.stored_at < now - self.ttl
+                ).delete(synchronize_session=False)
+
+    def remove(self, user_address: str, message_id: str) -> None:
+        with self.session() as session:
+            session.query(MissedMessageORM).filter(
+                MissedMessageORM.user_address == user_address,
+                MissedMessageORM.message_id == message_id,
+            ).delete(synchronize_session=False)
+
+    def pop(self, user_address: str, limit: int = None) -> List[MessageEvent]:
+        with self.session() as session:
+            self._delete_expired(session, user_address, time.time())
+            query = (
+                session.query(MissedMessageORM)
+                .filter(MissedMessageORM.user_address == user_address)
+                .order_by(MissedMessageORM.id)
+            )
+            if limit is not None:
+                query = query.limit(limit)
+            rows = query.all()
+            messages = [
+                MessageEvent(
+                    row.message,
+                    timestamp=row.timestamp,
+                    type=row.type,
+                    id=row.message_id,
+                )
+                for row in rows
+            ]
+            if rows:
+                session.query(MissedMessageORM).filter(
+                    MissedMessageORM.id.in_([row.id for row in rows])
+                ).delete(synchronize_session=False)
+            return messages
+
+    def _delete_expired(self, session, user_address: str, now: float) -> None:
+        session.query(MissedMessageORM).filter(
+            MissedMessageORM.user_address == user_address,
+            MissedMessageORM.stored_at < now - self.ttl,
+        ).delete(synchronize_session=False)
+
+
+def make_missed_message_store(config, engine_factory) -> MissedMessageStore:
+    """creates the store configured in the `[messaging]` section"""
+    if config["missed_messages_storage"] == "database":
+        return DatabaseMissedMessageStore(
+            engine_factory(),
+            max_messages_per_user=config["max_missed_messages_per_user"],
+            ttl=config["missed_messages_ttl"],
+        )
+    return InMemoryMissedMessageStore(
+        max_messages_per_user=config["max_missed_messages_per_user"],
+        max_users=config["max_users_with_missed_messages"],
+        ttl=config["missed_messages_ttl"],
+    )
+
+
+def default_missed_message_store() -> MissedMessageStore:
+    return InMemoryMissedMessageStore(
+        max_messages_per_user=100, max_users=100_000, ttl=7 * 24 * 3600
+    )
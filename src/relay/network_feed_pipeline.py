@@ -0,0 +1,119 @@
+"""apply and publish the graph feed updates of each currency network on its own
+
+Each NetworkFeedPipeline has a greenlet applying the updates of its network
+on the graph and a greenlet publishing the resulting events. Updates of a
+busy network therefore do not delay the other networks, and slow subscribers
+do not delay applying updates.
+"""
+
+import logging
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+import gevent
+import gevent.queue
+
+from relay.ethindex_db.graph_sync_statistics import GraphSyncStatistics
+from relay.ethindex_db.sync_updates import FeedUpdate
+
+logger = logging.getLogger("network_feed_pipeline")
+
+
+class NetworkFeedPipeline:
+    """NetworkFeedPipeline applies and publishes the feed updates of one network
+
+    `put` blocks when `max_pending_batches` batches are waiting to be applied,
+    to bound the memory used while catching up. Batches waiting to be
+    published are merged and published at once: the published events are
+    generated from the current graph, so only the latest state matters.
+    """
+
+    def __init__(
+        self,
+        network_address: str,
+        apply_updates: Callable[[List[FeedUpdate]], None],
+        publish_updates: Callable[[List[FeedUpdate]], None],
+        *,
+        max_pending_batches: int,
+        statistics: Optional[GraphSyncStatistics] = None,
+    ):
+        self.network_address = network_address
+        self._apply_updates = apply_updates
+        self._publish_updates = publish_updates
+        self._statistics = statistics
+        self._apply_queue: gevent.queue.JoinableQueue = gevent.queue.JoinableQueue(
+            maxsize=max_pending_batches
+        )
+        self._publish_queue: gevent.queue.JoinableQueue = gevent.queue.JoinableQueue()
+        # the graph feed id preceding each batch not applied yet
+        self._pending_after_feed_ids: Deque[Optional[int]] = deque()
+
+    def start(self) -> None:
+        for loop in (self._apply_loop, self._publish_loop):
+            greenlet = gevent.Greenlet.spawn(loop)
+            greenlet.link_exception(
+                lambda *args: sys.exit(
+                    f"Feed pipeline greenlet of network {self.network_address} died"
+                )
+            )
+
+    def put(self, feed_updates: List[FeedUpdate], *, after_feed_id: int = None) -> None:
+        """put a batch of updates, read from the graph feed rows after after_feed_id"""
+        self._pending_after_feed_ids.append(after_feed_id)
+        self._apply_queue.put(feed_updates)
+
+    @property
+    def pending_after_feed_id(self) -> Optional[int]:
+        """the graph feed id after which the updates not applied yet start
+
+        All updates of the network up to this id are applied. None if there
+        are no pending updates.
+        """
+        if not self._pending_after_feed_ids:
+            return None
+        return self._pending_after_feed_ids[0]
+
+    def join(self) -> None:
+        """wait until all updates put so far are applied and published"""
+        self._apply_queue.join()
+        self._publish_queue.join()
+
+    def _apply_loop(self) -> None:
+        while True:
+            feed_updates = self._apply_queue.get()
+            try:
+                start = time.perf_counter()
+                self._apply_updates(feed_updates)
+                self._pending_after_feed_ids.popleft()
+                if self._statistics is not None:
+                    self._statistics.record_network_applied(
+                        self.network_address, feed_updates, time.perf_counter() - start
+                    )
+                self._publish_queue.put(feed_updates)
+            finally:
+                self._apply_queue.task_done()
+
+    def _publish_loop(self) -> None:
+        while True:
+            batches = [self._publish_queue.get()]
+            while not self._publish_queue.empty():
+                batches.append(self._publish_queue.get_nowait())
+            feed_updates = [update for batch in batches for update in batch]
+            try:
+                start = time.perf_counter()
+                self._publish_updates(feed_updates)
+                if self._statistics is not None:
+                    self._statistics.record_network_published(
+                        self.network_address, time.perf_counter() - start
+                    )
+            finally:
+                for _ in batches:
+                    self._publish_queue.task_done()
+            if len(batches) > 1:
+                logger.debug(
+                    "Published %s merged batches of network %s",
+                    len(batches),
+                    self.network_address,
+                )
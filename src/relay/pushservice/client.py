@@ -1,8 +1,10 @@
 import logging
+from typing import Optional
 
 from relay.events import Event
 from relay.streams import Client, DisconnectedError, Subscription
 
+from .dispatcher import PushDispatcher
 from .pushservice import FirebaseRawPushService, InvalidClientTokenException
 
 logger = logging.getLogger("pushserviceclient")
@@ -11,17 +13,31 @@ logger = logging.getLogger("pushserviceclient")
 class PushNotificationClient(Client):
     """
     Stream Client that sends events as push notification
+
+    With a dispatcher, the notifications are only queued and invalid client
+    tokens are handled by the dispatcher.
     """
 
     def __init__(
-        self, rawPushService: FirebaseRawPushService, client_token: str
+        self,
+        rawPushService: FirebaseRawPushService,
+        client_token: str,
+        *,
+        user_address: str = None,
+        dispatcher: Optional[PushDispatcher] = None,
     ) -> None:
         super().__init__()
         self._rawPushService = rawPushService
         self.client_token = client_token
+        self.user_address = user_address
+        self._dispatcher = dispatcher
 
     def _execute_send(self, subscription: Subscription, event: Event) -> None:
         assert isinstance(event, Event)
+        if self._dispatcher is not None:
+            assert self.user_address is not None
+            self._dispatcher.dispatch(self.user_address, self.client_token, event)
+            return
         try:
             logger.debug(
                 f"Sending push notification for {event.type} to {self.client_token}."
@@ -1,13 +1,15 @@
+import logging
+import sys
 from collections import namedtuple
-from contextlib import contextmanager
-from typing import Iterable
+from typing import Dict, Iterable, List, Set
 
-from sqlalchemy import Column, String
+import gevent
+from sqlalchemy import Column, String, and_, or_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-Base = declarative_base()
+from relay.relay_db import Base, RelayDB
+
+logger = logging.getLogger("client_token_db")
 
 
 class TokenMappingORM(Base):  # type: ignore
@@ -27,23 +29,8 @@ class ClientTokenAlreadyExistsException(ClientTokenDBException):
 TokenMapping = namedtuple("TokenMapping", ["user_address", "client_token"])
 
 
-class ClientTokenDB:
-    def __init__(self, engine) -> None:
-        self._make_session = sessionmaker(bind=engine)
-        Base.metadata.create_all(engine)
-
-    @contextmanager
-    def session(self):
-        """Provide a transactional scope around a series of operations."""
-        session = self._make_session()
-        try:
-            yield session
-            session.commit()
-        except BaseException:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+class ClientTokenDB(RelayDB):
+    orm_classes = [TokenMappingORM]
 
     def get_client_tokens(self, user_address: str) -> Iterable[str]:
         with self.session() as session:
@@ -89,3 +76,125 @@ class ClientTokenDB:
                 TokenMappingORM.user_address == user_address,
                 TokenMappingORM.client_token == client_token,
             ).delete()
+
+    def delete_client_tokens(self, token_mappings: List[TokenMapping]) -> None:
+        """Deletes the given client tokens of users in one transaction"""
+        if not token_mappings:
+            return
+        with self.session() as session:
+            session.query(TokenMappingORM).filter(
+                or_(
+                    *[
+                        and_(
+                            TokenMappingORM.user_address == token_mapping.user_address,
+                            TokenMappingORM.client_token == token_mapping.client_token,
+                        )
+                        for token_mapping in token_mappings
+                    ]
+                )
+            ).delete(synchronize_session=False)
+
+
+class ClientTokenIndex:
+    """in-memory index of the client tokens of users, writing through to the db
+
+    All client tokens are loaded once on creation, so reading them and adding
+    a client token that is already registered does not query the database.
+    Deleted client tokens are removed from the index right away and from the
+    database in batches, as soon as `batch_size` tokens are deleted and at least
+    every `flush_interval` seconds once started. Tokens missing in the index,
+    e.g. registered by another relay process, are deleted from the database too.
+    """
+
+    def __init__(
+        self,
+        client_token_db: ClientTokenDB,
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 1,
+    ) -> None:
+        self.client_token_db = client_token_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._client_tokens: Dict[str, Set[str]] = {}
+        # deleted, but not yet from the database -> whether it was in the index
+        self._pending_deletions: Dict[TokenMapping, bool] = {}
+        for token_mapping in client_token_db.get_all_client_tokens():
+            self._add_to_index(token_mapping.user_address, token_mapping.client_token)
+
+    def start(self) -> None:
+        greenlet = gevent.Greenlet.spawn(self._flush_loop)
+        greenlet.link_exception(
+            lambda *args: sys.exit("Client token index greenlet died")
+        )
+
+    def get_client_tokens(self, user_address: str) -> Iterable[str]:
+        return list(self._client_tokens.get(user_address, ()))
+
+    def has_client_token(self, user_address: str, client_token: str) -> bool:
+        return client_token in self._client_tokens.get(user_address, ())
+
+    def get_all_client_tokens(self) -> Iterable[TokenMapping]:
+        return [
+            TokenMapping(user_address, client_token)
+            for user_address, client_tokens in self._client_tokens.items()
+            for client_token in client_tokens
+        ]
+
+    def add_client_token(self, user_address: str, client_token: str) -> None:
+        """
+        Adds a client token for the given user address
+
+        Raises:
+        ClientTokenAlreadyExistsException: If the combination of user_address and client_token already exists
+        """
+        if self.has_client_token(user_address, client_token):
+            raise ClientTokenAlreadyExistsException
+        token_mapping = TokenMapping(user_address, client_token)
+        was_indexed = self._pending_deletions.pop(token_mapping, None)
+        # an indexed token is in the database until its deletion is flushed
+        if not was_indexed:
+            try:
+                self.client_token_db.add_client_token(user_address, client_token)
+            except ClientTokenAlreadyExistsException:
+                # added concurrently or by another relay process
+                if was_indexed is None:
+                    self._add_to_index(user_address, client_token)
+                    raise
+        self._add_to_index(user_address, client_token)
+
+    def delete_client_token(self, user_address: str, client_token: str) -> None:
+        """Deletes a client token from the given user address"""
+        self.delete_client_tokens([TokenMapping(user_address, client_token)])
+
+    def delete_client_tokens(self, token_mappings: List[TokenMapping]) -> None:
+        """Deletes the given client tokens of users, the database in batches"""
+        for token_mapping in token_mappings:
+            client_tokens = self._client_tokens.get(token_mapping.user_address)
+            if client_tokens is None or token_mapping.client_token not in client_tokens:
+                # may have been added by another relay process
+                self._pending_deletions.setdefault(token_mapping, False)
+                continue
+            client_tokens.remove(token_mapping.client_token)
+            if not client_tokens:
+                del self._client_tokens[token_mapping.user_address]
+            self._pending_deletions[token_mapping] = True
+        if len(self._pending_deletions) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """deletes the pending deletions from the database"""
+        if not self._pending_deletions:
+            return
+        token_mappings = list(self._pending_deletions)
+        self._pending_deletions.clear()
+        logger.debug("Delete %s client tokens", len(token_mappings))
+        self.client_token_db.delete_client_tokens(token_mappings)
+
+    def _add_to_index(self, user_address: str, client_token: str) -> None:
+        self._client_tokens.setdefault(user_address, set()).add(client_token)
+
+    def _flush_loop(self) -> None:
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
@@ -0,0 +1,98 @@
+"""validate registered client tokens without delaying the start of the relay
+
+On startup, the push notifications of all registered client tokens are
+started right away. `validate_client_tokens` then checks the tokens in the
+background with bounded concurrency, and the InvalidClientTokenRemover
+removes the invalid tokens found by it or while sending in batches.
+"""
+
+import logging
+import sys
+from typing import Callable, Iterable, List
+
+import gevent
+import gevent.pool
+from firebase_admin import exceptions as firebase_exceptions
+
+from .client_token_db import TokenMapping
+
+logger = logging.getLogger("client_token_validation")
+
+
+class InvalidClientTokenRemover:
+    """collects invalid client tokens and removes them in batches
+
+    The collected tokens are passed to `remove_client_tokens` as soon as
+    `batch_size` tokens are collected, and at least every `flush_interval`
+    seconds once started.
+    """
+
+    def __init__(
+        self,
+        remove_client_tokens: Callable[[List[TokenMapping]], None],
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 10,
+    ) -> None:
+        self.remove_client_tokens = remove_client_tokens
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._invalid_client_tokens: List[TokenMapping] = []
+
+    def start(self) -> None:
+        greenlet = gevent.Greenlet.spawn(self._flush_loop)
+        greenlet.link_exception(
+            lambda *args: sys.exit("Invalid client token remover greenlet died")
+        )
+
+    def add(self, user_address: str, client_token: str) -> None:
+        token_mapping = TokenMapping(user_address, client_token)
+        if token_mapping in self._invalid_client_tokens:
+            return
+        self._invalid_client_tokens.append(token_mapping)
+        if len(self._invalid_client_tokens) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._invalid_client_tokens:
+            return
+        token_mappings = self._invalid_client_tokens
+        self._invalid_client_tokens = []
+        logger.debug("Remove %s invalid client tokens", len(token_mappings))
+        self.remove_client_tokens(token_mappings)
+
+    def _flush_loop(self) -> None:
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
+
+
+def validate_client_tokens(
+    token_mappings: Iterable[TokenMapping],
+    check_client_token: Callable[[str], bool],
+    on_invalid_client_token: Callable[[str, str], None],
+    *,
+    concurrency: int,
+) -> None:
+    """checks the client tokens with at most `concurrency` concurrent checks
+
+    Tokens that could not be checked because of other errors are kept.
+    """
+
+    def validate(token_mapping: TokenMapping) -> None:
+        try:
+            valid = check_client_token(token_mapping.client_token)
+        except firebase_exceptions.FirebaseError as e:
+            logger.warning(
+                "Could not check client token %s: %s", token_mapping.client_token, e
+            )
+            return
+        if not valid:
+            on_invalid_client_token(
+                token_mapping.user_address, token_mapping.client_token
+            )
+
+    pool = gevent.pool.Pool(concurrency)
+    for token_mapping in token_mappings:
+        pool.spawn(validate, token_mapping)
+    pool.join()
@@ -0,0 +1,156 @@
+"""remember which push notifications were sent to not send them twice
+
+The dedup ids of sent notifications (see `dedup_event_id`) are reduced to
+64 bit fingerprints. The HashedDedupTable keeps them in a table of fixed
+size derived from a memory budget, so a burst of notifications overwrites
+the entries closest to expiring instead of growing the memory. The
+DatabaseDedupStore keeps them in the relay database, shared by all relay
+processes and surviving restarts.
+"""
+
+import hashlib
+import time
+from array import array
+
+from sqlalchemy import BigInteger, Column, Float
+from sqlalchemy.exc import IntegrityError
+
+from relay.relay_db import Base, RelayDB
+
+DEFAULT_MEMORY_BUDGET = 4_000_000
+DEFAULT_TTL = 3600
+
+# bytes needed per entry of the HashedDedupTable: fingerprint and expiry time
+BYTES_PER_ENTRY = 8 + 4
+# number of neighbouring slots an entry may be stored in
+PROBE_LENGTH = 4
+
+
+def fingerprint(dedup_id) -> int:
+    """a 64 bit hash of the dedup id, never 0"""
+    digest = hashlib.blake2b(
+        "\x00".join(str(part) for part in dedup_id).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big") or 1
+
+
+class DedupStore:
+    """interface of the stores for the dedup ids of sent notifications"""
+
+    def contains(self, dedup_id) -> bool:
+        raise NotImplementedError
+
+    def add(self, dedup_id) -> None:
+        raise NotImplementedError
+
+
+class HashedDedupTable(DedupStore):
+    """fixed size hash table of fingerprints with expiry times
+
+    Every fingerprint has PROBE_LENGTH candidate slots. If all of them are
+    taken by unexpired entries, the one expiring first is overwritten.
+    """
+
+    def __init__(self, *, memory_budget: int, ttl: int) -> None:
+        self.ttl = ttl
+        self.number_of_slots = max(PROBE_LENGTH, memory_budget // BYTES_PER_ENTRY)
+        self._fingerprints = array("Q", [0]) * self.number_of_slots
+        # seconds since the epoch fit into 32 bit until 2106
+        self._expiry_times = array("I", [0]) * self.number_of_slots
+
+    def _slots(self, key: int):
+        first_slot = key % self.number_of_slots
+        for offset in range(PROBE_LENGTH):
+            yield (first_slot + offset) % self.number_of_slots
+
+    def contains(self, dedup_id) -> bool:
+        key = fingerprint(dedup_id)
+        now = int(time.time())
+        return any(
+            self._fingerprints[slot] == key and self._expiry_times[slot] > now
+            for slot in self._slots(key)
+        )
+
+    def add(self, dedup_id) -> None:
+        key = fingerprint(dedup_id)
+        now = int(time.time())
+        chosen_slot = None
+        for slot in self._slots(key):
+            if self._fingerprints[slot] == key or self._expiry_times[slot] <= now:
+                chosen_slot = slot
+                break
+            if (
+                chosen_slot is None
+                or self._expiry_times[slot] < self._expiry_times[chosen_slot]
+            ):
+                chosen_slot = slot
+        assert chosen_slot is not None
+        self._fingerprints[chosen_slot] = key
+        self._expiry_times[chosen_slot] = now + self.ttl
+
+
+class PushDedupORM(Base):  # type: ignore
+    __tablename__ = "push_dedup"
+    fingerprint = Column(BigInteger, primary_key=True, autoincrement=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class DatabaseDedupStore(DedupStore, RelayDB):
+    """dedup ids in the relay database, shared by all relay processes
+
+    Expired entries are deleted every `cleanup_interval` additions.
+    """
+
+    orm_classes = [PushDedupORM]
+
+    def __init__(self, engine, *, ttl: int, cleanup_interval: int = 1000) -> None:
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._additions_since_cleanup = 0
+        super().__init__(engine)
+
+    def contains(self, dedup_id) -> bool:
+        with self.session() as session:
+            return (
+                session.query(PushDedupORM.fingerprint)
+                .filter(
+                    PushDedupORM.fingerprint == _signed(fingerprint(dedup_id)),
+                    PushDedupORM.expires_at > time.time(),
+                )
+                .first()
+                is not None
+            )
+
+    def add(self, dedup_id) -> None:
+        now = time.time()
+        try:
+            with self.session() as session:
+                session.merge(
+                    PushDedupORM(
+                        fingerprint=_signed(fingerprint(dedup_id)),
+                        expires_at=now + self.ttl,
+                    )
+                )
+        except IntegrityError:
+            pass  # added by another relay process in the meantime
+        self._additions_since_cleanup += 1
+        if self._additions_since_cleanup >= self.cleanup_interval:
+            self._additions_since_cleanup = 0
+            with self.session() as session:
+                session.query(PushDedupORM).filter(
+                    PushDedupORM.expires_at <= now
+                ).delete(synchronize_session=False)
+
+
+def _signed(key: int) -> int:
+    """the fingerprint as signed 64 bit integer, as stored in bigint columns"""
+    return key - 2**64 if key >= 2**63 else key
+
+
+def make_dedup_store(config, engine_factory) -> DedupStore:
+    """creates the store configured in the `[push_notification]` section"""
+    if config["dedup_storage"] == "database":
+        return DatabaseDedupStore(engine_factory(), ttl=config["dedup_ttl"])
+    return HashedDedupTable(
+        memory_budget=config["dedup_memory_budget"], ttl=config["dedup_ttl"]
+    )
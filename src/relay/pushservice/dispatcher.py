@@ -0,0 +1,254 @@
+"""send push notifications from a queue instead of inside the publish path
+
+PushNotificationClients only build the message of an event and queue it in
+the PushDispatcher. Its workers take batches of up to `max_batch_size`
+messages from the queue and send each batch via the PushTransport.
+Messages failing with a transient error are retried with
+exponential backoff, invalid client tokens are reported to
+`on_invalid_client_token`. Duplicates of queued messages are not queued,
+duplicates of sent messages are skipped by the workers, so that the dedup
+store is never queried in the publish path.
+"""
+
+import logging
+import sys
+import time
+from typing import Callable, List, Optional, Set
+
+import attr
+import gevent
+import gevent.pool
+import gevent.queue
+from firebase_admin import exceptions as firebase_exceptions, messaging
+
+from relay.events import Event
+
+from .pushservice import (
+    INVALID_CLIENT_TOKEN_ERRORS,
+    FirebaseRawPushService,
+    _build_data_message,
+    dedup_event_id,
+)
+
+logger = logging.getLogger("pushdispatcher")
+
+# errors after which sending the same message again may succeed
+TRANSIENT_ERRORS = (
+    firebase_exceptions.UnavailableError,
+    firebase_exceptions.InternalError,
+    firebase_exceptions.ResourceExhaustedError,
+    firebase_exceptions.DeadlineExceededError,
+    firebase_exceptions.UnknownError,
+)
+
+
+class PushTransport:
+    """sends a batch of messages, implemented by FirebasePushTransport"""
+
+    def send_all(
+        self, messages: List[messaging.Message]
+    ) -> List[Optional[firebase_exceptions.FirebaseError]]:
+        """sends the messages, returns the error of every message or None
+
+        May raise a FirebaseError if the whole batch could not be sent.
+        """
+        raise NotImplementedError
+
+
+class FirebasePushTransport(PushTransport):
+    """sends every message with its own request to the FCM HTTP v1 api
+
+    The batch endpoint of FCM is shut down, the messages of a batch are sent
+    concurrently by up to `concurrency` greenlets instead.
+    """
+
+    def __init__(self, app, *, concurrency: int = 10) -> None:
+        self._app = app
+        self.concurrency = concurrency
+
+    def send_all(
+        self, messages: List[messaging.Message]
+    ) -> List[Optional[firebase_exceptions.FirebaseError]]:
+        pool = gevent.pool.Pool(self.concurrency)
+        return pool.map(self._send, messages)
+
+    def _send(
+        self, message: messaging.Message
+    ) -> Optional[firebase_exceptions.FirebaseError]:
+        try:
+            messaging.send(message, app=self._app)
+        except firebase_exceptions.FirebaseError as e:
+            return e
+        return None
+
+
+@attr.s
+class PushDispatchStatistics:
+    queued_messages: int = attr.ib(default=0)
+    sent_messages: int = attr.ib(default=0)
+    failed_messages: int = attr.ib(default=0)
+    retried_messages: int = attr.ib(default=0)
+    dropped_messages: int = attr.ib(default=0)
+    invalid_client_tokens: int = attr.ib(default=0)
+    number_of_batches: int = attr.ib(default=0)
+    last_batch_latency: Optional[float] = attr.ib(default=None)
+    total_batch_latency: float = attr.ib(default=0)
+
+    @property
+    def average_batch_latency(self) -> Optional[float]:
+        if self.number_of_batches == 0:
+            return None
+        return self.total_batch_latency / self.number_of_batches
+
+
+@attr.s
+class _PushJob:
+    user_address: str = attr.ib()
+    client_token: str = attr.ib()
+    message: messaging.Message = attr.ib()
+    dedup_id = attr.ib()
+    attempts: int = attr.ib(default=0)
+
+
+def is_invalid_client_token_error(error: firebase_exceptions.FirebaseError) -> bool:
+    # see https://firebase.google.com/docs/cloud-messaging/admin/errors
+    return error.code in INVALID_CLIENT_TOKEN_ERRORS or isinstance(
+        error, firebase_exceptions.NotFoundError
+    )
+
+
+class PushDispatcher:
+    """queues push notifications and sends them in batches with a pool of workers
+
+    `dispatch` never blocks: if `max_queue_size` messages are waiting, the new
+    message is dropped.
+    """
+
+    def __init__(
+        self,
+        push_service: FirebaseRawPushService,
+        transport: PushTransport,
+        *,
+        on_invalid_client_token: Callable[[str, str], None],
+        number_of_workers: int = 4,
+        max_batch_size: int = 100,
+        max_queue_size: int = 10_000,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+    ) -> None:
+        self.push_service = push_service
+        self.transport = transport
+        self.on_invalid_client_token = on_invalid_client_token
+        self.number_of_workers = number_of_workers
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.statistics = PushDispatchStatistics()
+        self._queue: gevent.queue.JoinableQueue = gevent.queue.JoinableQueue(
+            maxsize=max_queue_size
+        )
+        # dedup ids of the queued messages, including those waiting for a retry
+        self._queued_dedup_ids: Set = set()
+
+    def start(self) -> None:
+        for _ in range(self.number_of_workers):
+            greenlet = gevent.Greenlet.spawn(self._work)
+            greenlet.link_exception(
+                lambda *args: sys.exit("Push dispatcher greenlet died")
+            )
+
+    def join(self) -> None:
+        """wait until all queued messages are handled, retries may be pending"""
+        self._queue.join()
+
+    def dispatch(self, user_address: str, client_token: str, event: Event) -> None:
+        message = _build_data_message(client_token, event)
+        if message is None:
+            logger.debug(
+                "Did not sent push notification for event of type: %s", type(event)
+            )
+            return
+        dedup_id = dedup_event_id(client_token, event)
+        if dedup_id is not None:
+            if dedup_id in self._queued_dedup_ids:
+                logger.debug("not queuing duplicate message for event %s", event)
+                return
+            self._queued_dedup_ids.add(dedup_id)
+        self._put(_PushJob(user_address, client_token, message, dedup_id))
+
+    def _put(self, job: _PushJob) -> None:
+        try:
+            self._queue.put_nowait(job)
+            self.statistics.queued_messages += 1
+        except gevent.queue.Full:
+            self._queued_dedup_ids.discard(job.dedup_id)
+            self.statistics.dropped_messages += 1
+            logger.warning(
+                "Dropped push notification to %s, the queue is full", job.client_token
+            )
+
+    def _work(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.max_batch_size and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            self.statistics.queued_messages -= len(jobs)
+            try:
+                self._send_batch(jobs)
+            except Exception:
+                logger.exception("Could not send batch of push notifications")
+                for job in jobs:
+                    self._queued_dedup_ids.discard(job.dedup_id)
+            finally:
+                for _ in jobs:
+                    self._queue.task_done()
+
+    def _send_batch(self, jobs: List[_PushJob]) -> None:
+        unsent_jobs = []
+        for job in jobs:
+            if self.push_service.is_duplicate(job.dedup_id):
+                logger.debug("not sending duplicate message %s", job.dedup_id)
+                self._queued_dedup_ids.discard(job.dedup_id)
+            else:
+                unsent_jobs.append(job)
+        jobs = unsent_jobs
+        if not jobs:
+            return
+
+        start = time.perf_counter()
+        try:
+            errors = self.transport.send_all([job.message for job in jobs])
+        except firebase_exceptions.FirebaseError as e:
+            logger.warning("Could not send batch of push notifications: %s", e)
+            errors = [e] * len(jobs)
+        latency = time.perf_counter() - start
+        self.statistics.number_of_batches += 1
+        self.statistics.last_batch_latency = latency
+        self.statistics.total_batch_latency += latency
+
+        for job, error in zip(jobs, errors):
+            if error is None:
+                self.statistics.sent_messages += 1
+                self.push_service.mark_sent(job.dedup_id)
+                self._queued_dedup_ids.discard(job.dedup_id)
+            elif is_invalid_client_token_error(error):
+                self.statistics.invalid_client_tokens += 1
+                logger.debug("Invalid client token %s: %s", job.client_token, error)
+                self._queued_dedup_ids.discard(job.dedup_id)
+                self.on_invalid_client_token(job.user_address, job.client_token)
+            elif (
+                isinstance(error, TRANSIENT_ERRORS) and job.attempts < self.max_retries
+            ):
+                self.statistics.retried_messages += 1
+                job.attempts += 1
+                gevent.spawn_later(
+                    self.retry_backoff * 2 ** (job.attempts - 1), self._put, job
+                )
+            else:
+                self.statistics.failed_messages += 1
+                self._queued_dedup_ids.discard(job.dedup_id)
+                logger.warning(
+                    "Could not sent push notification to %s\nerror: %s",
+                    job.client_token,
+                    error,
+                )
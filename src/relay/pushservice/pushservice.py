@@ -1,7 +1,6 @@
 import logging
 from typing import Optional
 
-import cachetools
 import firebase_admin
 from firebase_admin import credentials, exceptions as firebase_exceptions, messaging
 
@@ -14,6 +13,13 @@ from relay.blockchain.currency_network_events import (
 from relay.blockchain.events import BlockchainEvent
 from relay.events import Event, MessageEvent
 
+from .dedup_store import (
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_TTL,
+    DedupStore,
+    HashedDedupTable,
+)
+
 logger = logging.getLogger("pushservice")
 
 # see https://firebase.google.com/docs/cloud-messaging/admin/errors
@@ -62,28 +68,40 @@ def create_firebase_app_from_path_to_keyfile(path_to_keyfile: str):
 class FirebaseRawPushService:
     """Sends push notifications to firebase. Sending is done based on raw client tokens"""
 
-    def __init__(self, app) -> None:
+    def __init__(self, app, dedup_store: DedupStore = None) -> None:
         """
         Initializes the push service
         Args:
             app: The initialized firebase_admin App
+            dedup_store: The store remembering sent messages to not send them twice
         """
 
         self._app = app
-        self.cache = cachetools.TTLCache(100_000, ttl=3600)
+        if dedup_store is None:
+            dedup_store = HashedDedupTable(
+                memory_budget=DEFAULT_MEMORY_BUDGET, ttl=DEFAULT_TTL
+            )
+        self.dedup_store = dedup_store
+
+    def is_duplicate(self, msgid) -> bool:
+        """whether a message with the dedup id msgid was already sent"""
+        return msgid is not None and self.dedup_store.contains(msgid)
+
+    def mark_sent(self, msgid) -> None:
+        if msgid is not None:
+            self.dedup_store.add(msgid)
 
     def send_event(self, client_token, event: Event):
         message = _build_data_message(client_token, event)
 
         if message is not None:
             msgid = dedup_event_id(client_token, event)
-            if msgid is not None and msgid in self.cache:
+            if self.is_duplicate(msgid):
                 logger.debug("not sending duplicate message for event %s", event)
                 return
             try:
                 messaging.send(message, app=self._app)
-                if msgid is not None:
-                    self.cache[msgid] = True
+                self.mark_sent(msgid)
             except firebase_exceptions.FirebaseError as e:
                 # Check if error code is because token is invalid
                 # see https://firebase.google.com/docs/cloud-messaging/admin/errors
@@ -3,14 +3,16 @@ import logging
 import os
 import sys
 from collections import defaultdict
-from copy import deepcopy
+from copy import copy
 from enum import Enum
+from operator import attrgetter
 from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Union, cast
 
 import eth_account
 import eth_keyfile
 import gevent
 import sqlalchemy
+import toolz
 from eth_utils import is_checksum_address, to_checksum_address
 from sqlalchemy.engine.url import URL
 from tlbin import load_packaged_contracts, load_packaged_merged_abis
@@ -21,17 +23,43 @@ from relay import signing_middleware
 from relay.blockchain.identity_events import FeePaymentEventType
 from relay.blockchain.identity_proxy import IdentityProxy
 from relay.blockchain.proxy import LogFilterListener
-from relay.ethindex_db import ethindex_db
+from relay.ethindex_db import ethindex_db, mediation_fees_ledger
+from relay.ethindex_db.events_cache import EventsCache
+from relay.ethindex_db.graph_feed_notifications import (
+    GraphFeedListener,
+    install_notify_trigger,
+)
+from relay.ethindex_db.graph_sync_statistics import GraphSyncStatistics
+from relay.ethindex_db.interests_ledger import AccruedInterestsLedger
+from relay.ethindex_db.mediation_fees_ledger import MediationFeesLedger
 from relay.ethindex_db.sync_updates import (
     BalanceUpdateFeedUpdate,
     FeedUpdate,
+    GraphFeedSync,
+    SyncIdDatabaseStore,
+    SyncIdFileStore,
     TrustlineUpdateFeedUpdate,
-    graph_update_getter,
+    coalesce_feed_updates,
+    get_max_graph_feed_id,
 )
+from relay.ethindex_db.transfer_information_cache import TransferInformationCache
+from relay.ethindex_db.user_events_index import UserEventsIndex, get_all_user_fields
 from relay.pushservice.client import PushNotificationClient
 from relay.pushservice.client_token_db import (
     ClientTokenAlreadyExistsException,
     ClientTokenDB,
+    ClientTokenIndex,
+    TokenMapping,
+)
+from relay.pushservice.client_token_validation import (
+    InvalidClientTokenRemover,
+    validate_client_tokens,
+)
+from relay.pushservice.dedup_store import make_dedup_store
+from relay.pushservice.dispatcher import (
+    FirebasePushTransport,
+    PushDispatcher,
+    PushDispatchStatistics,
 )
 from relay.pushservice.pushservice import (
     FirebaseRawPushService,
@@ -40,6 +68,7 @@ from relay.pushservice.pushservice import (
 )
 from relay.web3provider import create_provider_from_config
 
+from .balance_event_debouncer import BalanceEventDebouncer
 from .blockchain import (
     currency_network_events,
     exchange_events,
@@ -54,10 +83,16 @@ from .blockchain.node import Node
 from .blockchain.token_proxy import TokenProxy
 from .blockchain.unw_eth_proxy import UnwEthProxy
 from .ethindex_db.events_informations import EventsInformationFetcher
+from .event_bus import EventBus, InProcessEventBus, PostgresEventBus
 from .events import BalanceEvent, NetworkBalanceEvent
 from .exchange.orderbook import OrderBookGreenlet
+from .missed_message_store import (
+    default_missed_message_store,
+    make_missed_message_store,
+)
+from .network_feed_pipeline import NetworkFeedPipeline
 from .network_graph.graph import CurrencyNetworkGraph
-from .streams import MessagingSubject, Subject
+from .streams import EventCursor, MessagingSubjects, SendQueueStatistics, Subject
 
 logger = logging.getLogger("relay")
 
@@ -119,7 +154,8 @@ class TrustlinesRelay:
         self.currency_network_proxies: Dict[str, CurrencyNetworkProxy] = {}
         self.currency_network_graphs: Dict[str, CurrencyNetworkGraph] = {}
         self.subjects = defaultdict(Subject)
-        self.messaging = defaultdict(MessagingSubject)
+        self.messaging = MessagingSubjects(default_missed_message_store())
+        self.stream_send_queue_statistics = SendQueueStatistics()
         self.contracts = {}
         self.node: Node = None
         self._web3 = None
@@ -127,10 +163,21 @@ class TrustlinesRelay:
         self.unw_eth_proxies: Dict[str, UnwEthProxy] = {}
         self.token_proxies: Dict[str, TokenProxy] = {}
         self._firebase_raw_push_service: Optional[FirebaseRawPushService] = None
-        self._client_token_db: Optional[ClientTokenDB] = None
+        self._client_token_index: Optional[ClientTokenIndex] = None
+        self._balance_event_debouncer: Optional[BalanceEventDebouncer] = None
+        self._push_dispatcher: Optional[PushDispatcher] = None
+        self._invalid_client_token_remover: Optional[InvalidClientTokenRemover] = None
         self.fixed_gas_price: Optional[int] = None
         self.known_identity_factories: List[str] = []
         self._log_listener = None
+        self.user_events_index: Optional[UserEventsIndex] = None
+        self.events_cache: Optional[EventsCache] = None
+        self.mediation_fees_ledger: Optional[MediationFeesLedger] = None
+        self.accrued_interests_ledger: Optional[AccruedInterestsLedger] = None
+        self.transfer_information_cache: Optional[TransferInformationCache] = None
+        self.graph_sync_statistics = GraphSyncStatistics()
+        self._graph_feed_sync: Optional[GraphFeedSync] = None
+        self._network_feed_pipelines: Dict[str, NetworkFeedPipeline] = {}
 
     @property
     def network_addresses(self) -> Iterable[str]:
@@ -180,6 +227,8 @@ class TrustlinesRelay:
             event_builders=all_event_builders,
             from_to_types=currency_network_events.from_to_types,
             address_to_contract_types=address_to_contract_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
 
     def get_ethindex_db_for_token(self, address: str):
@@ -192,6 +241,8 @@ class TrustlinesRelay:
             standard_event_types=token_events.standard_event_types,
             event_builders=token_events.event_builders,
             from_to_types=token_events.from_to_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
 
     def get_ethindex_db_for_unw_eth(self, address: str):
@@ -204,6 +255,8 @@ class TrustlinesRelay:
             standard_event_types=unw_eth_events.standard_event_types,
             event_builders=unw_eth_events.event_builders,
             from_to_types=unw_eth_events.from_to_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
 
     def get_ethindex_db_for_exchange(self, address: Optional[str] = None):
@@ -216,6 +269,8 @@ class TrustlinesRelay:
             standard_event_types=exchange_events.standard_event_types,
             event_builders=exchange_events.event_builders,
             from_to_types=exchange_events.from_to_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
 
     def is_currency_network(self, address: str) -> bool:
@@ -268,6 +323,15 @@ class TrustlinesRelay:
         end_time: int = None,
     ):
         event_selector = self.get_ethindex_db_for_currency_network(network_address)
+        if self.accrued_interests_ledger is not None:
+            return self.accrued_interests_ledger.get_accrued_interests(
+                event_selector,
+                network_address,
+                user_address,
+                counterparty_address,
+                start_time,
+                end_time,
+            )
         return EventsInformationFetcher(
             event_selector
         ).get_list_of_paid_interests_for_trustline_in_between_timestamps(
@@ -288,12 +352,25 @@ class TrustlinesRelay:
         )
 
     def get_transfer_information_for_tx_hash(self, tx_hash: str):
-        fetcher = EventsInformationFetcher(self.get_ethindex_db_for_currency_network())
-        return fetcher.get_transfer_details_for_tx(tx_hash)
+        return self._get_transfer_information_fetcher().get_transfer_details_for_tx(
+            tx_hash
+        )
+
+    def get_transfer_information_for_tx_hashes(self, tx_hashes: List[str]):
+        return self._get_transfer_information_fetcher().get_transfer_details_for_txs(
+            tx_hashes
+        )
 
     def get_transfer_information_from_event_id(self, block_hash, log_index):
-        fetcher = EventsInformationFetcher(self.get_ethindex_db_for_currency_network())
-        return fetcher.get_transfer_details_for_id(block_hash, log_index)
+        return self._get_transfer_information_fetcher().get_transfer_details_for_id(
+            block_hash, log_index
+        )
+
+    def _get_transfer_information_fetcher(self) -> EventsInformationFetcher:
+        return EventsInformationFetcher(
+            self.get_ethindex_db_for_currency_network(),
+            transfer_information_cache=self.transfer_information_cache,
+        )
 
     def get_paid_delegation_fees_for_tx_hash(self, tx_hash):
         event_proxy = IdentityProxy(self._web3, abi=self.contracts["Identity"]["abi"])
@@ -316,6 +393,15 @@ class TrustlinesRelay:
             prevent_mediator_interests=current_network_graph.prevent_mediator_interests,
         )
         event_selector = self.get_ethindex_db_for_currency_network(network_address)
+        if self.mediation_fees_ledger is not None:
+            return self.mediation_fees_ledger.get_earned_mediation_fees(
+                event_selector,
+                network_address,
+                user_address,
+                empty_graph,
+                start_time,
+                end_time,
+            )
         return EventsInformationFetcher(
             event_selector
         ).get_earned_mediation_fees_in_between_timestamps(
@@ -409,6 +495,11 @@ class TrustlinesRelay:
         )
 
     def start(self):
+        self.messaging = MessagingSubjects(
+            make_missed_message_store(self.config["messaging"], create_engine),
+            self._make_event_bus(),
+        )
+        self.messaging.start()
         self._load_gas_price_settings(self.config["relay"]["gas_price_computation"])
         self.contracts = load_packaged_contracts()
         if self.config["exchange"]["enable"]:
@@ -422,22 +513,157 @@ class TrustlinesRelay:
         if self.config["delegate"]["enable"]:
             self._start_delegate()
         self._load_addresses()
+        if self.config["events_cache"]["enable"]:
+            self.events_cache = EventsCache(
+                max_rows=self.config["events_cache"]["max_rows"],
+                confirmation_depth=self.config["events_cache"]["confirmation_depth"],
+            )
+        if self.config["transfer_information_cache"]["enable"]:
+            self.transfer_information_cache = TransferInformationCache(
+                max_entries=self.config["transfer_information_cache"]["max_entries"],
+                confirmation_depth=self.config["transfer_information_cache"][
+                    "confirmation_depth"
+                ],
+            )
+        if self.config["mediation_fees_ledger"]["enable"]:
+            mediation_fees_ledger.create_tables(ethindex_db.connect(""))
+            self.mediation_fees_ledger = MediationFeesLedger(
+                confirmation_depth=self.config["mediation_fees_ledger"][
+                    "confirmation_depth"
+                ]
+            )
+        if self.config["user_events_index"]["enable"]:
+            self._start_sync_user_events_index()
+        if self.config["accrued_interests_ledger"]["enable"]:
+            self._start_sync_accrued_interests_ledger()
         self._start_sync_graphs_via_feed()
 
+    def _make_event_bus(self) -> EventBus:
+        if self.config["messaging"]["event_bus"] == "postgres":
+            return PostgresEventBus(ethindex_db.connect(""), ethindex_db.connect(""))
+        return InProcessEventBus()
+
+    def stop(self):
+        """persist the state that is only held in memory, used on shutdown"""
+        if self._graph_feed_sync is not None:
+            self._graph_feed_sync.persist()
+        if self._invalid_client_token_remover is not None:
+            self._invalid_client_token_remover.flush()
+        if self._client_token_index is not None:
+            self._client_token_index.flush()
+
     def _start_sync_graphs_via_feed(self):
+        config = self.config["trustline_index"]
         conn = ethindex_db.connect("")
-        updates_getter = graph_update_getter()
+        if config["sync_id_storage"] == "database":
+            sync_id_store: Union[
+                SyncIdFileStore, SyncIdDatabaseStore
+            ] = SyncIdDatabaseStore(ethindex_db.connect(""), config["sync_id_name"])
+            sync_id_store.create_table()
+        else:
+            sync_id_store = SyncIdFileStore()
+        self._graph_feed_sync = GraphFeedSync(
+            sync_id_store, persist_interval=config["sync_id_persist_interval"]
+        )
+        graph_feed_sync = self._graph_feed_sync
+
+        if config["balance_event_window"] > 0:
+            self._balance_event_debouncer = BalanceEventDebouncer(
+                self._publish_trustline_events,
+                self._publish_network_balance_event,
+                window=config["balance_event_window"],
+                max_delay=config["balance_event_max_delay"],
+            )
+            self._balance_event_debouncer.start()
+
+        listener: Optional[GraphFeedListener] = None
+        if config["listen_for_notifications"]:
+            if config["install_notification_trigger"]:
+                install_notify_trigger(conn)
+            listener = GraphFeedListener(ethindex_db.connect(""))
+            listener.listen()
 
         def sync():
+            notified = False
             while True:
-                graph_updates = updates_getter(conn)
-                self._apply_feed_update_on_graph(graph_updates)
-                self._publish_feed_update_events(graph_updates)
-                gevent.sleep(self.config["trustline_index"]["sync_interval"])
+                # Catch up in chunks to bound the memory needed after a downtime
+                first_chunk = True
+                while True:
+                    after_feed_id = graph_feed_sync.sync_id
+                    graph_updates = coalesce_feed_updates(
+                        graph_feed_sync.get_updates(
+                            conn, limit=config["feed_chunk_size"]
+                        )
+                    )
+                    for network_address, network_updates in toolz.groupby(
+                        attrgetter("address"), graph_updates
+                    ).items():
+                        self._put_network_feed_updates(
+                            network_address, network_updates, after_feed_id
+                        )
+                    # The empty chunk ending a catch up is not a sync of its own
+                    if graph_updates or first_chunk:
+                        self.graph_sync_statistics.record_sync(graph_updates, notified)
+                    if not graph_updates:
+                        break
+                    notified = False
+                    first_chunk = False
+                self.graph_sync_statistics.record_feed_ids(
+                    self._get_applied_feed_id(graph_feed_sync.sync_id),
+                    get_max_graph_feed_id(conn),
+                )
+                # Polling stays as fallback in case notifications get lost
+                if listener is not None:
+                    notified = listener.wait(config["sync_interval"])
+                else:
+                    gevent.sleep(config["sync_interval"])
 
         greenlet = gevent.Greenlet.spawn(sync)
         greenlet.link_exception(lambda *args: sys.exit("Graph sync greenlet died"))
 
+    def _start_sync_user_events_index(self):
+        config = self.config["user_events_index"]
+        conn = ethindex_db.connect("")
+        user_events_index = UserEventsIndex(
+            get_all_user_fields(all_from_to_types),
+            reorg_depth=config["reorg_depth"],
+            max_blocks_per_sync=config["max_blocks_per_sync"],
+        )
+        user_events_index.create_tables(conn)
+        user_events_index.load_synced_block_number(conn)
+        self.user_events_index = user_events_index
+
+        def sync():
+            while True:
+                # Catch up without sleeping, e.g. when the index was not backfilled
+                if user_events_index.sync(conn) == 0:
+                    gevent.sleep(config["sync_interval"])
+
+        greenlet = gevent.Greenlet.spawn(sync)
+        greenlet.link_exception(
+            lambda *args: sys.exit("User events index sync greenlet died")
+        )
+
+    def _start_sync_accrued_interests_ledger(self):
+        config = self.config["accrued_interests_ledger"]
+        conn = ethindex_db.connect("")
+        accrued_interests_ledger = AccruedInterestsLedger(
+            reorg_depth=config["reorg_depth"],
+            max_blocks_per_sync=config["max_blocks_per_sync"],
+        )
+        accrued_interests_ledger.create_tables(conn)
+        self.accrued_interests_ledger = accrued_interests_ledger
+
+        def sync():
+            while True:
+                if accrued_interests_ledger.sync(conn) == 0:
+                    gevent.sleep(config["sync_interval"])
+
+        greenlet = gevent.Greenlet.spawn(sync)
+        greenlet.link_exception(
+            lambda *args: sys.exit("Accrued interests ledger sync greenlet died")
+        )
+
     def new_network(self, address: str) -> None:
         assert is_checksum_address(address)
         if address in self.network_addresses:
@@ -517,22 +743,33 @@ class TrustlinesRelay:
 
     def add_push_client_token(self, user_address: str, client_token: str) -> None:
         if self._firebase_raw_push_service is not None:
+            if self._client_token_index is not None and (
+                self._client_token_index.has_client_token(user_address, client_token)
+            ):
+                return  # already registered and started
             self._start_pushnotifications(user_address, client_token)
             try:
-                if self._client_token_db is not None:
-                    self._client_token_db.add_client_token(user_address, client_token)
+                if self._client_token_index is not None:
+                    self._client_token_index.add_client_token(
+                        user_address, client_token
+                    )
             except ClientTokenAlreadyExistsException:
                 pass  # all good
 
     def delete_push_client_token(self, user_address: str, client_token: str) -> None:
         if self._firebase_raw_push_service is not None:
-            if self._client_token_db is not None:
-                self._client_token_db.delete_client_token(user_address, client_token)
+            if self._client_token_index is not None:
+                self._client_token_index.delete_client_token(user_address, client_token)
             self._stop_pushnotifications(user_address, client_token)
 
-    def _start_pushnotifications(self, user_address: str, client_token: str) -> None:
+    def _start_pushnotifications(
+        self, user_address: str, client_token: str, check_client_token: bool = True
+    ) -> None:
         assert self._firebase_raw_push_service is not None
-        if not self._firebase_raw_push_service.check_client_token(client_token):
+        if (
+            check_client_token
+            and not self._firebase_raw_push_service.check_client_token(client_token)
+        ):
             raise InvalidClientTokenException
         for subscription in self.subjects[user_address].subscriptions:
             if (
@@ -543,17 +780,21 @@ class TrustlinesRelay:
         logger.debug(
             "Add client token {} for address {}".format(client_token, user_address)
         )
-        client = PushNotificationClient(self._firebase_raw_push_service, client_token)
+        client = PushNotificationClient(
+            self._firebase_raw_push_service,
+            client_token,
+            user_address=user_address,
+            dispatcher=self._push_dispatcher,
+        )
         self.subjects[user_address].subscribe(client)
         # Silent: Do not mark notifications as read, so that we can query them later
         self.messaging[user_address].subscribe(client, silent=True)
 
     def _stop_pushnotifications(self, user_address: str, client_token: str) -> None:
         success = False
-        subscriptions = self.subjects[user_address].subscriptions
-
-        # Copy the list because we will delete items while iterating over it
-        for subscription in subscriptions[:]:
+        # Closing the clients while iterating is fine, the subscription set
+        # applies the removals afterwards
+        for subscription in self.subjects[user_address].subscriptions:
             if (
                 isinstance(subscription.client, PushNotificationClient)
                 and subscription.client.client_token == client_token
@@ -607,6 +848,8 @@ class TrustlinesRelay:
             standard_event_types=currency_network_events.trustline_event_types,
             event_builders=currency_network_events.event_builders,
             from_to_types=currency_network_events.from_to_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
 
         events = ethindex.get_trustline_events(
@@ -634,10 +877,14 @@ class TrustlinesRelay:
         event_type: str = None,
         from_block: int = 0,
         contract_type: ContractTypes = None,
+        after: EventCursor = None,
+        limit: int = None,
     ) -> List[BlockchainEvent]:
         """
         Get all events of users for user_address.
         Filter with from_block, event_type and contract_type
+        or only get the events after the position `after` instead of from_block.
+        Only the first `limit` events are returned if limit is given
         """
         assert is_checksum_address(user_address)
         event_types: Optional[List[str]]
@@ -669,11 +916,15 @@ class TrustlinesRelay:
             event_builders=all_event_builders,
             from_to_types=all_from_to_types,
             address_to_contract_types=address_to_contract_types,
+            user_events_index=self.user_events_index,
+            events_cache=self.events_cache,
         )
         return ethindex.get_all_contract_events(
             event_types,
             user_address=user_address,
             from_block=from_block,
+            after=after,
+            limit=limit,
         )
 
     def get_user_token_events(
@@ -763,6 +1014,53 @@ class TrustlinesRelay:
             from_block=from_block,
         )
 
+    def _put_network_feed_updates(
+        self, network_address: str, feed_updates: List[FeedUpdate], after_feed_id: int
+    ):
+        """hand the feed updates of one network to the pipeline of the network"""
+        if network_address not in self.currency_network_graphs:
+            logger.warning(
+                f"Got event_feed with unknown network address {network_address}"
+            )
+            return
+        pipeline = self._network_feed_pipelines.get(network_address)
+        if pipeline is None:
+            pipeline = NetworkFeedPipeline(
+                network_address,
+                self._apply_feed_update_on_graph,
+                self._publish_feed_update_events,
+                max_pending_batches=self.config["trustline_index"][
+                    "max_pending_batches_per_network"
+                ],
+                statistics=self.graph_sync_statistics,
+            )
+            pipeline.start()
+            self._network_feed_pipelines[network_address] = pipeline
+        pipeline.put(feed_updates, after_feed_id=after_feed_id)
+
+    def _get_applied_feed_id(self, fetched_feed_id: int) -> int:
+        """the id up to which the fetched graph feed rows are applied by all pipelines"""
+        pending_after_feed_ids = [
+            pipeline.pending_after_feed_id
+            for pipeline in self._network_feed_pipelines.values()
+            if pipeline.pending_after_feed_id is not None
+        ]
+        return min([fetched_feed_id] + pending_after_feed_ids)
+
+    def get_graph_sync_status(self, network_address: str) -> Dict:
+        return self.graph_sync_statistics.get_network_status(network_address)
+
+    def get_graph_sync_statistics(self) -> GraphSyncStatistics:
+        return self.graph_sync_statistics
+
+    def get_stream_send_queue_statistics(self) -> SendQueueStatistics:
+        return self.stream_send_queue_statistics
+
+    def get_push_dispatch_statistics(self) -> Optional[PushDispatchStatistics]:
+        if self._push_dispatcher is None:
+            return None
+        return self._push_dispatcher.statistics
+
     def _apply_feed_update_on_graph(
         self,
         feed_update: Iterable[FeedUpdate],
@@ -793,6 +1091,18 @@ class TrustlinesRelay:
         processed_trusline_updates: Set[str] = set()
         processed_user_updates: Set[str] = set()
 
+        # Coalesce the events over several syncs if configured
+        if self._balance_event_debouncer is not None:
+            publish_trustline_events = (
+                self._balance_event_debouncer.add_trustline_update
+            )
+            publish_network_balance_event = (
+                self._balance_event_debouncer.add_user_update
+            )
+        else:
+            publish_trustline_events = self._publish_trustline_events
+            publish_network_balance_event = self._publish_network_balance_event
+
         for update in feed_update:
             if update.address not in self.currency_network_graphs.keys():
                 continue
@@ -806,7 +1116,7 @@ class TrustlinesRelay:
                     update.from_, update.to, update.address
                 )
                 if trustline_id not in processed_trusline_updates:
-                    self._publish_trustline_events(
+                    publish_trustline_events(
                         user1=update.from_,
                         user2=update.to,
                         network_address=update.address,
@@ -816,7 +1126,7 @@ class TrustlinesRelay:
 
                 for user in [update.from_, update.to]:
                     if user not in processed_user_updates:
-                        self._publish_network_balance_event(
+                        publish_network_balance_event(
                             user=user,
                             network_address=update.address,
                             timestamp=update.timestamp,
@@ -893,30 +1203,77 @@ class TrustlinesRelay:
         logger.info("Start pushnotification service")
         path = self.config["push_notification"]["firebase_credentials_path"]
         app = create_firebase_app_from_path_to_keyfile(path)
-        self._firebase_raw_push_service = FirebaseRawPushService(app)
-        self._client_token_db = ClientTokenDB(engine=create_engine())
+        self._firebase_raw_push_service = FirebaseRawPushService(
+            app,
+            dedup_store=make_dedup_store(
+                self.config["push_notification"], create_engine
+            ),
+        )
+        self._client_token_index = ClientTokenIndex(
+            ClientTokenDB(engine=create_engine())
+        )
+        self._client_token_index.start()
+        self._invalid_client_token_remover = InvalidClientTokenRemover(
+            self._remove_client_tokens
+        )
+        self._invalid_client_token_remover.start()
+        config = self.config["push_notification"]
+        self._push_dispatcher = PushDispatcher(
+            self._firebase_raw_push_service,
+            FirebasePushTransport(app, concurrency=config["send_concurrency"]),
+            on_invalid_client_token=self._invalid_client_token_remover.add,
+            number_of_workers=config["number_of_workers"],
+            max_batch_size=config["max_batch_size"],
+            max_queue_size=config["max_queue_size"],
+            max_retries=config["max_retries"],
+            retry_backoff=config["retry_backoff"],
+        )
+        self._push_dispatcher.start()
         logger.info("Firebase pushservice started")
         self._start_pushnotifications_for_registered_users()
 
-    def _start_pushnotifications_for_registered_users(self):
-        number_of_new_listeners = 0
-        for token_mapping in self._client_token_db.get_all_client_tokens():
+    def _remove_client_tokens(self, token_mappings: List[TokenMapping]) -> None:
+        assert self._client_token_index is not None
+        for token_mapping in token_mappings:
             try:
-                self._start_pushnotifications(
-                    token_mapping.user_address, token_mapping.client_token
-                )
-                number_of_new_listeners += 1
-            except InvalidClientTokenException:
-                # token now invalid, so delete it from database
-                self._client_token_db.delete_client_token(
+                self._stop_pushnotifications(
                     token_mapping.user_address, token_mapping.client_token
                 )
-                pass
+            except TokenNotFoundException:
+                pass  # already removed
+        self._client_token_index.delete_client_tokens(token_mappings)
+
+    def _start_pushnotifications_for_registered_users(self):
+        """start the push notifications of all registered client tokens
+
+        The tokens are not checked before, but in the background if
+        `validate_client_tokens_at_startup` is set. Otherwise invalid tokens
+        are only noticed when sending to them.
+        """
+        config = self.config["push_notification"]
+        token_mappings = self._client_token_index.get_all_client_tokens()
+        for token_mapping in token_mappings:
+            self._start_pushnotifications(
+                token_mapping.user_address,
+                token_mapping.client_token,
+                check_client_token=False,
+            )
         logger.debug(
             "Start pushnotifications for {} registered user devices".format(
-                number_of_new_listeners
+                len(token_mappings)
             )
         )
+        if config["validate_client_tokens_at_startup"]:
+            greenlet = gevent.Greenlet.spawn(
+                validate_client_tokens,
+                token_mappings,
+                self._firebase_raw_push_service.check_client_token,
+                self._invalid_client_token_remover.add,
+                concurrency=config["client_token_validation_concurrency"],
+            )
+            greenlet.link_exception(
+                lambda *args: sys.exit("Client token validation greenlet died")
+            )
 
     def _process_transfer(self, transfer_event):
         self._publish_blockchain_event(transfer_event)
@@ -977,7 +1334,9 @@ class TrustlinesRelay:
 
     def _publish_blockchain_event(self, event):
         for user in [event.from_, event.to]:
-            event_with_user = deepcopy(event)
+            # a shallow copy is enough, the events are not modified apart
+            # from setting the user
+            event_with_user = copy(event)
             event_with_user.user = user
             self._publish_user_event(event_with_user)
 
@@ -0,0 +1,37 @@
+"""tables the relay keeps in its own database, next to the ethindex tables"""
+
+from contextlib import contextmanager
+from typing import Sequence
+
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+Base = declarative_base()
+
+
+class RelayDB:
+    """base of the classes keeping their data in tables of the relay database
+
+    The tables of `orm_classes` are created if they do not exist yet.
+    """
+
+    orm_classes: Sequence = ()
+
+    def __init__(self, engine) -> None:
+        self._make_session = sessionmaker(bind=engine)
+        Base.metadata.create_all(
+            engine, tables=[orm_class.__table__ for orm_class in self.orm_classes]
+        )
+
+    @contextmanager
+    def session(self):
+        """Provide a transactional scope around a series of operations."""
+        session = self._make_session()
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
@@ -1,17 +1,99 @@
 import logging
 import random
-from typing import Iterable, List  # noqa: F401
-
-from .events import Event, MessageEvent
+from collections import deque
+from enum import Enum
+from typing import (  # noqa: F401
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import attr
+import gevent
+import gevent.event
+
+from .event_bus import EventBus, InProcessEventBus
+from .events import AccountEvent, Event, MessageEvent
+from .missed_message_store import MissedMessageStore, default_missed_message_store
 
 logger = logging.getLogger("streams")
 
 
+class SubscriptionSet:
+    """insertion ordered set of subscriptions that may change while iterating
+
+    Adding and removing are O(1). Publishing iterates over the set without
+    copying it, even though notifying a subscription may unsubscribe it and
+    other greenlets may subscribe in the meantime: while any iteration is
+    running, changes are only recorded and they are applied once the last
+    iteration has finished. Removed subscriptions are skipped right away.
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: Dict["Subscription", None] = {}
+        # subscription -> whether it is added, applied when no iteration runs
+        self._pending: Dict["Subscription", bool] = {}
+        self._running_iterations = 0
+        self._size = 0
+
+    def add(self, subscription: "Subscription") -> None:
+        if subscription in self:
+            return
+        self._size += 1
+        if self._running_iterations:
+            self._pending[subscription] = True
+        else:
+            self._subscriptions[subscription] = None
+
+    def remove(self, subscription: "Subscription") -> None:
+        if subscription not in self:
+            raise ValueError("Unknown subscription")
+        self._size -= 1
+        if self._running_iterations:
+            self._pending.pop(subscription, None)
+            if subscription in self._subscriptions:
+                self._pending[subscription] = False
+        else:
+            del self._subscriptions[subscription]
+
+    def __contains__(self, subscription: object) -> bool:
+        if subscription in self._pending:
+            return self._pending[subscription]  # type: ignore
+        return subscription in self._subscriptions
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator["Subscription"]:
+        self._running_iterations += 1
+        try:
+            for subscription in self._subscriptions:
+                if self._pending.get(subscription, True):
+                    yield subscription
+        finally:
+            self._running_iterations -= 1
+            if not self._running_iterations:
+                self._apply_pending()
+
+    def _apply_pending(self) -> None:
+        for subscription, added in self._pending.items():
+            if added:
+                self._subscriptions[subscription] = None
+            else:
+                del self._subscriptions[subscription]
+        self._pending.clear()
+
+
 class Client(object):
     """Represents the connection to a client. Different subscriptions can be connected to the same client"""
 
     def __init__(self) -> None:
-        self.subscriptions: List[Subscription] = []
+        self.subscriptions = SubscriptionSet()
         self.closed = False
 
     def register(self, subscription: "Subscription") -> None:
@@ -19,7 +101,7 @@ class Client(object):
         Registers a subscription that this client has done.
         On closing the connection with `close` these subscription will get unsubscribed
         """
-        self.subscriptions.append(subscription)
+        self.subscriptions.add(subscription)
 
     def unregister(self, subscription: "Subscription") -> None:
         """
@@ -40,6 +122,15 @@ class Client(object):
             raise RuntimeError("Client connection is closed")
         self._execute_send(subscription, event)
 
+    def send_replay(self, subscription: "Subscription", events: List[Event]) -> None:
+        """
+        Sends replayed events together with the events held back meanwhile
+        Raises:
+            DisconnectedError: This is raised if the client has already disconnected.
+        """
+        for event in events:
+            self.send(subscription, event)
+
     def _execute_send(self, subscription: "Subscription", event: Event) -> None:
         """
         Executes the sending
@@ -55,9 +146,7 @@ class Client(object):
         """
         if not self.closed:
             self.closed = True
-            for subscription in self.subscriptions[
-                :
-            ]:  # copy, because we are deleting from that list
+            for subscription in self.subscriptions:
                 subscription.unsubscribe()
             assert len(self.subscriptions) == 0
 
@@ -66,26 +155,319 @@ class DisconnectedError(Exception):
     pass
 
 
+class OverflowPolicy(Enum):
+    """what a QueuedClient does with a new event when its send queue is full
+
+    Messages are neither dropped nor coalesced while other events are queued.
+    """
+
+    # drop the oldest queued event
+    DROP_OLDEST = "drop_oldest"
+    # replace a queued balance event of the same account, drop the oldest
+    # queued event if there is none
+    COALESCE = "coalesce"
+    # close the client, it is too slow to keep up
+    DISCONNECT = "disconnect"
+
+
+@attr.s
+class SendQueueStatistics:
+    """statistics about the send queues of all QueuedClients sharing it"""
+
+    number_of_clients: int = attr.ib(default=0)
+    queued_events: int = attr.ib(default=0)
+    max_queue_depth: int = attr.ib(default=0)
+    dropped_events: int = attr.ib(default=0)
+    coalesced_events: int = attr.ib(default=0)
+    disconnected_clients: int = attr.ib(default=0)
+
+
+class QueuedClient(Client):
+    """Client that sends events from a bounded queue in its own greenlet
+
+    `send` only queues the event, so that a slow connection does not delay
+    publishing events to other clients. What happens when more than
+    `max_queue_size` events are queued is decided by the `overflow_policy`.
+    Queued events that are dropped or cannot be sent are handed back to
+    their subscription with `notify_failed`. Replayed events are all queued
+    regardless of the overflow policy, so that the replay has no gaps.
+
+    The events of subscriptions with batching enabled are collected for
+    `batch_window` seconds and sent together with `_execute_send_batch`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_queue_size: int,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        statistics: Optional[SendQueueStatistics] = None,
+        batch_window: float = 0.05,
+    ) -> None:
+        super().__init__()
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size has to be positive")
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.statistics = (
+            statistics if statistics is not None else SendQueueStatistics()
+        )
+        self.statistics.number_of_clients += 1
+        self.batch_window = batch_window
+        self._queue: Deque[Tuple[Subscription, Event]] = deque()
+        self._has_events = gevent.event.Event()
+        self._greenlet: Optional[gevent.Greenlet] = None
+        self._batched_subscriptions = SubscriptionSet()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def enable_batching(self, subscription: "Subscription") -> None:
+        """send the events of the subscription in batches"""
+        if subscription not in self.subscriptions:
+            raise ValueError("Unknown subscription")
+        self._batched_subscriptions.add(subscription)
+
+    def unregister(self, subscription: "Subscription") -> None:
+        super().unregister(subscription)
+        if subscription in self._batched_subscriptions:
+            self._batched_subscriptions.remove(subscription)
+
+    def send(self, subscription: "Subscription", event: Event) -> None:
+        if subscription not in self.subscriptions:
+            raise ValueError("Unknown subscription")
+        if self.closed:
+            raise RuntimeError("Client connection is closed")
+        if len(self._queue) >= self.max_queue_size:
+            self._handle_overflow(subscription, event)
+        else:
+            self._enqueue(subscription, event)
+        self._start_send_loop()
+
+    def send_replay(self, subscription: "Subscription", events: List[Event]) -> None:
+        if subscription not in self.subscriptions:
+            raise ValueError("Unknown subscription")
+        if self.closed:
+            raise RuntimeError("Client connection is closed")
+        for event in events:
+            self._enqueue(subscription, event)
+        self._start_send_loop()
+
+    def _start_send_loop(self) -> None:
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._send_loop)
+
+    def _enqueue(self, subscription: "Subscription", event: Event) -> None:
+        self._queue.append((subscription, event))
+        self.statistics.queued_events += 1
+        self.statistics.max_queue_depth = max(
+            self.statistics.max_queue_depth, len(self._queue)
+        )
+        self._has_events.set()
+
+    def _handle_overflow(self, subscription: "Subscription", event: Event) -> None:
+        if self.overflow_policy == OverflowPolicy.DISCONNECT:
+            logger.info("Disconnecting client with %s queued events", len(self._queue))
+            self.statistics.disconnected_clients += 1
+            self._disconnect()
+            raise DisconnectedError("Send queue overflow")
+        if self.overflow_policy == OverflowPolicy.COALESCE and self._coalesce(
+            subscription, event
+        ):
+            return
+        self._drop_oldest()
+        self._enqueue(subscription, event)
+
+    def _drop_oldest(self) -> None:
+        """drop the oldest queued event, a message only if there is no other event"""
+        for index, (_, queued_event) in enumerate(self._queue):
+            if not isinstance(queued_event, MessageEvent):
+                del self._queue[index]
+                break
+        else:
+            queued_subscription, queued_event = self._queue.popleft()
+            queued_subscription.notify_failed(queued_event)
+        self.statistics.queued_events -= 1
+        self.statistics.dropped_events += 1
+
+    def _coalesce(self, subscription: "Subscription", event: Event) -> bool:
+        """replace a queued event of the same account by the newer event"""
+        key = _coalescing_key(event)
+        if key is None:
+            return False
+        for index, (queued_subscription, queued_event) in enumerate(self._queue):
+            if (
+                queued_subscription is subscription
+                and _coalescing_key(queued_event) == key
+            ):
+                self._queue[index] = (subscription, event)
+                self.statistics.coalesced_events += 1
+                return True
+        return False
+
+    def _send_loop(self) -> None:
+        while not self.closed:
+            self._has_events.wait()
+            self._has_events.clear()
+            if self.batch_window > 0 and self._has_batched_events():
+                gevent.sleep(self.batch_window)
+            batch: List[Tuple[Subscription, Event]] = []
+            while self._queue and not self.closed:
+                subscription, event = self._queue.popleft()
+                self.statistics.queued_events -= 1
+                if subscription in self._batched_subscriptions:
+                    batch.append((subscription, event))
+                    continue
+                try:
+                    self._execute_send(subscription, event)
+                except DisconnectedError:
+                    subscription.notify_failed(event)
+                    self.close()
+                except Exception:
+                    logger.exception("Could not send event %s", event)
+                    subscription.notify_failed(event)
+            if batch and self.closed:
+                self._notify_failed(batch)
+            elif batch:
+                try:
+                    self._execute_send_batch(batch)
+                except DisconnectedError:
+                    self._notify_failed(batch)
+                    self.close()
+                except Exception:
+                    logger.exception("Could not send batch of %s events", len(batch))
+                    self._notify_failed(batch)
+
+    @staticmethod
+    def _notify_failed(batch: Iterable[Tuple["Subscription", Event]]) -> None:
+        for subscription, event in batch:
+            subscription.notify_failed(event)
+
+    def _has_batched_events(self) -> bool:
+        return bool(self._batched_subscriptions) and any(
+            subscription in self._batched_subscriptions
+            for subscription, _ in self._queue
+        )
+
+    def _execute_send_batch(self, batch: List[Tuple["Subscription", Event]]) -> None:
+        """
+        Sends the events of batched subscriptions at once
+        May be implemented by sub class, sends them one by one otherwise
+        may raise DisconnectedError
+        """
+        for subscription, event in batch:
+            self._execute_send(subscription, event)
+
+    def _disconnect(self) -> None:
+        """disconnect a client that is too slow, may be extended by sub class"""
+        self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.statistics.number_of_clients -= 1
+            self.statistics.queued_events -= len(self._queue)
+            unsent_events = list(self._queue)
+            self._queue.clear()
+            self._notify_failed(unsent_events)
+            super().close()
+            # wake up the send loop so that it stops
+            self._has_events.set()
+
+
+def _coalescing_key(event: Event):
+    """events with the same key only differ in the newer account state"""
+    if not isinstance(event, AccountEvent):
+        return None
+    return (
+        type(event),
+        event.network_address,
+        event.user,
+        getattr(event, "counter_party", None),
+    )
+
+
+# position of a blockchain event: (blockNumber, transactionIndex, logIndex)
+EventCursor = Tuple[int, int, int]
+
+
+def event_cursor(event: Event) -> Optional[EventCursor]:
+    """the position of a blockchain event, None for other events"""
+    block_number = getattr(event, "blocknumber", None)
+    transaction_index = getattr(event, "transaction_index", None)
+    log_index = getattr(event, "log_index", None)
+    if block_number is None or transaction_index is None or log_index is None:
+        return None
+    return (block_number, transaction_index, log_index)
+
+
+def _optional_frozenset(values: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    return frozenset(values) if values is not None else None
+
+
+@attr.s(frozen=True)
+class SubscriptionFilter:
+    """selects the events a subscription is notified about
+
+    None matches any value. Events without a network address do not match
+    `network_addresses` and events without a contract type do not match
+    `contract_types`.
+    """
+
+    network_addresses: Optional[FrozenSet[str]] = attr.ib(
+        default=None, converter=_optional_frozenset
+    )
+    event_types: Optional[FrozenSet[str]] = attr.ib(
+        default=None, converter=_optional_frozenset
+    )
+    contract_types: Optional[FrozenSet[str]] = attr.ib(
+        default=None, converter=_optional_frozenset
+    )
+
+    def matches(self, event: Event) -> bool:
+        if self.event_types is not None and event.type not in self.event_types:
+            return False
+        if (
+            self.contract_types is not None
+            and event.contract_type not in self.contract_types
+        ):
+            return False
+        if (
+            self.network_addresses is not None
+            and getattr(event, "network_address", None) not in self.network_addresses
+        ):
+            return False
+        return True
+
+
 class Subject(object):
     """
     A subject that clients can subscribe to to get notifications
     """
 
     def __init__(self) -> None:
-        self.subscriptions: List[Subscription] = []
+        self.subscriptions = SubscriptionSet()
 
-    def subscribe(self, client: Client) -> "Subscription":
+    def subscribe(
+        self, client: Client, *, subscription_filter: SubscriptionFilter = None
+    ) -> "Subscription":
         """
         Subscribe to the topic to get notified about updates
         Args:
             client: the client that wants to subscribe
+            subscription_filter: only notify about the matching events, all if None
 
         Returns: The subscription. Can be used to cancel these updates
 
         """
         logger.debug("New Subscription")
-        subscription = Subscription(client, id=self._create_id(), subject=self)
-        self.subscriptions.append(subscription)
+        subscription = Subscription(
+            client,
+            id=self._create_id(),
+            subject=self,
+            subscription_filter=subscription_filter,
+        )
+        self.subscriptions.add(subscription)
         return subscription
 
     def unsubscribe(self, subscription: "Subscription") -> None:
@@ -98,9 +480,13 @@ class Subject(object):
             logger.debug("Sent event to {} subscribers".format(len(self.subscriptions)))
         result = 0
         # The call to notify in the following code is allowed to unsubscribe
-        # the client. That means we need to copy the self.subscriptions list as
-        # it's being modified when unsubscribing.
-        for subscription in self.subscriptions[:]:
+        # the client. SubscriptionSet defers these changes until iterating is done.
+        for subscription in self.subscriptions:
+            # filtered out before the client serializes anything
+            if subscription.filter is not None and not subscription.filter.matches(
+                event
+            ):
+                continue
             if subscription.notify(event):
                 result += 1
         return result
@@ -111,16 +497,29 @@ class Subject(object):
 
 
 class Subscription:
-    def __init__(self, client: Client, *, id: str, subject: Subject) -> None:
+    def __init__(
+        self,
+        client: Client,
+        *,
+        id: str,
+        subject: Subject,
+        subscription_filter: SubscriptionFilter = None,
+    ) -> None:
         self.client = client
         self.id = id
         self.subject = subject
+        self.filter = subscription_filter
         self.closed = False
+        # live events held back while missed events are replayed
+        self._held_events: Optional[List[Event]] = None
         self.client.register(self)
 
     def notify(self, event: Event) -> bool:
         assert isinstance(event, Event)
         if not self.closed:
+            if self._held_events is not None:
+                self._held_events.append(event)
+                return True
             try:
                 self.client.send(self, event)
                 return True
@@ -129,6 +528,44 @@ class Subscription:
 
         return False
 
+    def notify_failed(self, event: Event) -> None:
+        """called by the client when a queued event could not be sent"""
+        pass
+
+    def hold(self) -> None:
+        """hold back live events until `resume` is called"""
+        self._held_events = []
+
+    def resume(self, replayed_events: Iterable[Event], cursor: EventCursor) -> None:
+        """send the replayed events after cursor, then the held back live events
+
+        Held back events that were already replayed are skipped, so the
+        client receives every event once and in order.
+        """
+        held_events = self._held_events or []
+        self._held_events = None
+        events = []
+        last_cursor = cursor
+        for event in replayed_events:
+            event_position = event_cursor(event)
+            assert event_position is not None, "Replayed events need a cursor"
+            if event_position <= last_cursor:
+                continue
+            if self.filter is None or self.filter.matches(event):
+                events.append(event)
+            last_cursor = event_position
+        for event in held_events:
+            event_position = event_cursor(event)
+            if event_position is not None and event_position <= last_cursor:
+                continue
+            events.append(event)
+        if self.closed or not events:
+            return
+        try:
+            self.client.send_replay(self, events)
+        except DisconnectedError:
+            self.unsubscribe()
+
     def unsubscribe(self) -> None:
         if not self.closed:
             self.closed = True
@@ -137,15 +574,25 @@ class Subscription:
 
 
 class MessagingSubject(Subject):
-    def __init__(self):
+    def __init__(self, user: str, missed_message_store: MissedMessageStore = None):
         super().__init__()
-        self.events: List[MessageEvent] = []
-
-    def subscribe(self, client: Client, *, silent=False) -> "MessagingSubscription":
+        self.user = user
+        if missed_message_store is None:
+            missed_message_store = default_missed_message_store()
+        self.missed_message_store = missed_message_store
+
+    def subscribe(
+        self,
+        client: Client,
+        *,
+        subscription_filter: SubscriptionFilter = None,
+        silent=False,
+    ) -> "MessagingSubscription":
         """
         Subscribe to the topic to get notified about updates
         Args:
             client: the client that wants to subscribe
+            subscription_filter: only notify about the matching messages, all if None
             silent: whether this subscription should mark messages as read
 
         Returns: The subscription. Can be used to cancel these updates
@@ -153,17 +600,29 @@ class MessagingSubject(Subject):
         """
         logger.debug("New MessagingSubscription")
         subscription = MessagingSubscription(
-            client, id=self._create_id(), subject=self, silent=silent
+            client,
+            id=self._create_id(),
+            subject=self,
+            subscription_filter=subscription_filter,
+            silent=silent,
         )
-        self.subscriptions.append(subscription)
+        self.subscriptions.add(subscription)
         return subscription
 
-    def get_missed_messages(self) -> Iterable[MessageEvent]:
-        events = self.events
-        self.events = []
-        return events
+    def get_missed_messages(self, limit: int = None) -> Iterable[MessageEvent]:
+        """removes and returns the oldest `limit` missed messages, all if None"""
+        return self.missed_message_store.pop(self.user, limit)
 
     def publish(self, event: Event) -> int:
+        """sends the message to the subscribers, stores it if no one read it"""
+        read_by = self.deliver(event)
+        if not read_by:
+            assert isinstance(event, MessageEvent)
+            self.missed_message_store.add(self.user, event)
+        return read_by
+
+    def deliver(self, event: Event) -> int:
+        """sends the message to the subscribers without storing it"""
         logger.debug("Publish Message")
         if not isinstance(event, MessageEvent):
             raise RuntimeError("Can only send MessageEvent over message subject")
@@ -173,23 +632,81 @@ class MessagingSubject(Subject):
             )
         read_by = 0
         # The call to notify in the following code is allowed to unsubscribe
-        # the client. That means we need to copy the self.subscriptions list as
-        # it's being modified when unsubscribing.
-        for subscription in self.subscriptions[:]:
+        # the client. SubscriptionSet defers these changes until iterating is done.
+        for subscription in self.subscriptions:
+            if subscription.filter is not None and not subscription.filter.matches(
+                event
+            ):
+                continue
             if isinstance(subscription, MessagingSubscription):
                 successfully = subscription.notify(event)
                 if successfully and not subscription.silent:
                     read_by += 1
             else:
                 raise RuntimeError("Unexpected Subscription")
-        if not read_by:
-            self.events.append(event)
         return read_by
 
 
+class MessagingSubjects(dict):
+    """the messaging subjects of all users, created on first access
+
+    Messages have to be published with `publish`, so that the event bus
+    forwards them to the subscribers connected to other relay processes.
+    """
+
+    def __init__(
+        self, missed_message_store: MissedMessageStore, event_bus: EventBus = None
+    ) -> None:
+        super().__init__()
+        self.missed_message_store = missed_message_store
+        self.event_bus = event_bus if event_bus is not None else InProcessEventBus()
+
+    def __missing__(self, user: str) -> MessagingSubject:
+        subject = MessagingSubject(user, self.missed_message_store)
+        self[user] = subject
+        return subject
+
+    def start(self) -> None:
+        self.event_bus.start(self._deliver_from_other_process)
+
+    def publish(self, user: str, message: MessageEvent) -> int:
+        """publishes the message to the subscribers of the user in all processes
+
+        Returns the number of subscribers of this process that read it. The
+        message is stored as missed message if none of them read it, it is
+        removed again by another process where a subscriber reads it.
+        """
+        read_by = self[user].publish(message)
+        self.event_bus.broadcast(user, message)
+        return read_by
+
+    def _deliver_from_other_process(self, user: str, message: MessageEvent) -> None:
+        subject = self.get(user)
+        if subject is not None and subject.deliver(message):
+            self.missed_message_store.remove(user, message.id)
+
+
 class MessagingSubscription(Subscription):
     def __init__(
-        self, client: Client, *, id: str, subject: Subject, silent=False
+        self,
+        client: Client,
+        *,
+        id: str,
+        subject: Subject,
+        subscription_filter: SubscriptionFilter = None,
+        silent=False,
     ) -> None:
-        super().__init__(client, id=id, subject=subject)
+        super().__init__(
+            client, id=id, subject=subject, subscription_filter=subscription_filter
+        )
         self.silent = silent
+
+    def notify_failed(self, event: Event) -> None:
+        """store a message counted as read when it was queued as missed message"""
+        if self.silent or not isinstance(event, MessageEvent):
+            return
+        subject = self.subject
+        assert isinstance(subject, MessagingSubject)
+        # other subscriptions of the user may have failed to send it as well
+        subject.missed_message_store.remove(subject.user, event.id)
+        subject.missed_message_store.add(subject.user, event)
@@ -0,0 +1,45 @@
+import gevent
+
+from relay.ethindex_db import ethindex_db
+from relay.event_bus import PostgresEventBus
+from relay.events import MessageEvent
+from relay.missed_message_store import InMemoryMissedMessageStore
+from relay.streams import Client, Event, MessagingSubjects, Subscription
+
+USER = "0x" + "1" * 40
+
+
+class LogClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def _execute_send(self, subscription: Subscription, event: Event) -> None:
+        self.events.append(event)
+
+
+def make_process():
+    return MessagingSubjects(
+        InMemoryMissedMessageStore(max_messages_per_user=10, max_users=10, ttl=100),
+        PostgresEventBus(ethindex_db.connect(""), ethindex_db.connect("")),
+    )
+
+
+def test_postgres_event_bus_forwards_messages_to_other_process():
+    sending_process, receiving_process = make_process(), make_process()
+    sending_process.start()
+    receiving_process.start()
+    local_client, remote_client = LogClient(), LogClient()
+    sending_process[USER].subscribe(local_client)
+    receiving_process[USER].subscribe(remote_client)
+
+    message = MessageEvent("hello", timestamp=0)
+    sending_process.publish(USER, message)
+
+    with gevent.Timeout(5):
+        while not remote_client.events:
+            gevent.sleep(0.01)
+
+    assert [event.id for event in remote_client.events] == [message.id]
+    # the sending process does not deliver its own notification a second time
+    assert [event.id for event in local_client.events] == [message.id]
@@ -0,0 +1,76 @@
+import time
+
+import psycopg2.extras
+import pytest
+
+from relay.blockchain.currency_network_events import TransferEventType
+from relay.ethindex_db.events_informations import EventsInformationFetcher
+from tests.chain_integration.database_integration.conftest import make_ethindex_db
+
+NETWORK = "0x" + "f" * 40
+SENDER = "0x" + "1" * 40
+RECEIVER = "0x" + "2" * 40
+NUMBER_OF_TRANSFERS = 100_000
+# Far in the past of any block of the test chain
+BLOCK_NUMBER_OFFSET = 10_000_000
+
+
+@pytest.fixture()
+def synthetic_transfers(generic_db_connection):
+    rows = [
+        (
+            "0x" + f"{i:064x}",
+            BLOCK_NUMBER_OFFSET + i,
+            NETWORK,
+            TransferEventType,
+            psycopg2.extras.Json(
+                {"_from": SENDER, "_to": RECEIVER, "_value": str(10**20 + i)}
+            ),
+            "0x" + f"{i:064x}",
+            0,
+            0,
+            i,
+        )
+        for i in range(NUMBER_OF_TRANSFERS)
+    ]
+    with generic_db_connection as conn:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                """INSERT INTO events (transactionHash, blockNumber, address, eventName,
+                       args, blockHash, transactionIndex, logIndex, timestamp)
+                   VALUES %s""",
+                rows,
+            )
+
+    yield
+
+    with generic_db_connection as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM events WHERE address=%s", (NETWORK,))
+
+
+@pytest.mark.benchmark
+def test_total_sum_transferred_over_many_transfers(
+    synthetic_transfers, generic_db_connection
+):
+    fetcher = EventsInformationFetcher(make_ethindex_db(NETWORK, generic_db_connection))
+
+    start = time.perf_counter()
+    total = fetcher.get_total_sum_transferred(SENDER, RECEIVER)
+    duration = time.perf_counter() - start
+
+    # values above 2**64 make sure the database does not sum with an overflowing type
+    assert total == sum(10**20 + i for i in range(NUMBER_OF_TRANSFERS))
+    print(f"Summed {NUMBER_OF_TRANSFERS} transfers in {duration:.3f}s")
+
+    start = time.perf_counter()
+    total = fetcher.get_total_sum_transferred(
+        SENDER, RECEIVER, start_time=1000, end_time=1999
+    )
+    duration = time.perf_counter() - start
+
+    assert total == sum(10**20 + i for i in range(1000, 2000))
+    print(
+        f"Summed a window of 1000 out of {NUMBER_OF_TRANSFERS} transfers in {duration:.3f}s"
+    )
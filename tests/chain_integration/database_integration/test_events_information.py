@@ -8,6 +8,7 @@ from relay.ethindex_db.events_informations import (
     EventsInformationFetcher,
     IdentifiedNotPartOfTransferException,
 )
+from relay.ethindex_db.transfer_information_cache import TransferInformationCache
 from relay.network_graph.graph import CurrencyNetworkGraph
 from relay.network_graph.interests import calculate_interests
 from relay.network_graph.payment_path import FeePayer
@@ -517,6 +518,59 @@ def test_get_transfer_information_trustline_update(
     assert transfer_information.currency_network == network.address
 
 
+def test_get_transfer_information_for_many_transactions(
+    ethindex_db_for_currency_network_with_trustlines,
+    currency_network_with_trustlines_session,
+    accounts,
+    chain,
+    wait_for_ethindex_to_sync,
+):
+    network = currency_network_with_trustlines_session
+    tx_hashes = [
+        network.transfer_on_path(value, [accounts[0], accounts[1]]).hex()
+        for value in (10, 20)
+    ]
+    tx_without_transfer = network.update_trustline_with_accept(
+        accounts[0], accounts[4], 100, 100
+    ).hex()
+    chain.mine_blocks(5)
+    wait_for_ethindex_to_sync()
+
+    fetcher = EventsInformationFetcher(
+        ethindex_db_for_currency_network_with_trustlines,
+        transfer_information_cache=TransferInformationCache(
+            max_entries=10, confirmation_depth=5
+        ),
+    )
+    for _ in range(2):
+        # the second round is served from the cache
+        transfer_details = fetcher.get_transfer_details_for_txs(
+            tx_hashes + [tx_without_transfer]
+        )
+
+        assert list(transfer_details) == tx_hashes + [tx_without_transfer]
+
+        assert [details.value for details in transfer_details[tx_hashes[0]]] == [10]
+        assert [details.value for details in transfer_details[tx_hashes[1]]] == [20]
+        assert transfer_details[tx_without_transfer] == []
+        assert transfer_details[tx_hashes[0]] == fetcher.get_transfer_details_for_tx(
+            tx_hashes[0]
+        )
+
+    # only the first transfer is cached
+    fetcher = EventsInformationFetcher(
+        ethindex_db_for_currency_network_with_trustlines,
+        transfer_information_cache=TransferInformationCache(
+            max_entries=10, confirmation_depth=5
+        ),
+    )
+    fetcher.get_transfer_details_for_txs(tx_hashes[:1])
+    transfer_details = fetcher.get_transfer_details_for_txs(
+        [tx_without_transfer] + tx_hashes
+    )
+    assert list(transfer_details) == [tx_without_transfer] + tx_hashes
+
+
 def test_transfer_by_wrong_balance_update(
     ethindex_db_for_currency_network,
     currency_network,
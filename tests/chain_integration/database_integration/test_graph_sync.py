@@ -9,6 +9,10 @@ from relay.blockchain.currency_network_events import (
     TrustlineUpdateEventType,
 )
 from relay.ethindex_db.ethindex_db import CurrencyNetworkEthindexDB
+from relay.ethindex_db.graph_feed_notifications import (
+    GraphFeedListener,
+    install_notify_trigger,
+)
 from relay.ethindex_db.sync_updates import (
     BalanceUpdateFeedUpdate,
     NetworkFreezeFeedUpdate,
@@ -125,6 +129,24 @@ def test_get_event_feed_trustline_update(
     assert update.interest_rate_received == interest_rate_received
 
 
+def test_listener_notified_on_graph_feed_update(
+    currency_network: CurrencyNetworkProxy,
+    wait_for_ethindex_to_sync,
+    accounts,
+    generic_db_connection,
+):
+    install_notify_trigger(generic_db_connection)
+    listener = GraphFeedListener(generic_db_connection)
+    listener.listen()
+    assert not listener.wait(0)
+
+    currency_network.update_trustline_with_accept(accounts[0], accounts[1], 100, 200)
+    wait_for_ethindex_to_sync()
+
+    assert listener.wait(1)
+    assert not listener.wait(0)
+
+
 def test_get_event_feed_balance_update(
     currency_network_with_trustlines_and_interests_session: CurrencyNetworkProxy,
     wait_for_ethindex_to_sync,
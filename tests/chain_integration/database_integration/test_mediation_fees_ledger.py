@@ -0,0 +1,71 @@
+import pytest
+
+from relay.ethindex_db import mediation_fees_ledger
+from relay.ethindex_db.events_informations import EventsInformationFetcher
+from relay.ethindex_db.mediation_fees_ledger import MediationFeesLedger
+from relay.network_graph.graph import CurrencyNetworkGraph
+
+
+@pytest.fixture()
+def ledger(generic_db_connection):
+    mediation_fees_ledger.create_tables(generic_db_connection)
+
+    yield MediationFeesLedger(confirmation_depth=2)
+
+    mediation_fees_ledger.clear_ledger(generic_db_connection)
+
+
+def make_graph(currency_network):
+    return CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=currency_network.capacity_imbalance_fee_divisor,
+        default_interest_rate=currency_network.default_interest_rate,
+        custom_interests=currency_network.custom_interests,
+        prevent_mediator_interests=currency_network.prevent_mediator_interests,
+    )
+
+
+def get_fees_from_ledger(ledger, ethindex_db, currency_network, user):
+    return ledger.get_earned_mediation_fees(
+        ethindex_db, currency_network.address, user, make_graph(currency_network)
+    )
+
+
+def get_fees_from_replay(ethindex_db, currency_network, user):
+    return EventsInformationFetcher(ethindex_db).get_earned_mediation_fees(
+        user, make_graph(currency_network)
+    )
+
+
+def test_ledger_matches_full_replay(
+    ledger,
+    ethindex_db_for_currency_network_with_trustlines_and_interests,
+    currency_network_with_trustlines_and_interests_session,
+    accounts,
+    chain,
+    wait_for_ethindex_to_sync,
+):
+    currency_network = currency_network_with_trustlines_and_interests_session
+    ethindex_db = ethindex_db_for_currency_network_with_trustlines_and_interests
+    path = [accounts[0], accounts[1], accounts[2]]
+
+    currency_network.transfer_on_path(150, path)
+    currency_network.transfer_receiver_pays_on_path(1150, path)
+    chain.mine_blocks(3)
+    wait_for_ethindex_to_sync()
+
+    # The first call fills the ledger, the second one reads from it
+    for _ in range(2):
+        assert get_fees_from_ledger(
+            ledger, ethindex_db, currency_network, accounts[1]
+        ) == get_fees_from_replay(ethindex_db, currency_network, accounts[1])
+
+    # Further transfers are replayed from the checkpoint,
+    # the last one is not confirmed yet
+    currency_network.transfer_on_path(300, path)
+    chain.mine_blocks(3)
+    currency_network.transfer_on_path(400, path)
+    wait_for_ethindex_to_sync()
+
+    fees = get_fees_from_ledger(ledger, ethindex_db, currency_network, accounts[1])
+    assert len(fees) == 4
+    assert fees == get_fees_from_replay(ethindex_db, currency_network, accounts[1])
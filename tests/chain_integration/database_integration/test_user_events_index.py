@@ -0,0 +1,150 @@
+import pytest
+
+from relay.blockchain import currency_network_events
+from relay.ethindex_db.user_events_index import (
+    USER_EVENTS_TABLE,
+    UserEventsIndex,
+    get_all_user_fields,
+)
+from relay.relay import all_from_to_types
+from tests.chain_integration.database_integration.conftest import make_ethindex_db
+
+
+@pytest.fixture()
+def user_events_index(generic_db_connection):
+    index = UserEventsIndex(
+        get_all_user_fields(all_from_to_types),
+        reorg_depth=0,
+        max_blocks_per_sync=3,
+    )
+    index.create_tables(generic_db_connection)
+
+    yield index
+
+    with generic_db_connection:
+        with generic_db_connection.cursor() as cur:
+            cur.execute(f"DROP TABLE {USER_EVENTS_TABLE}, {USER_EVENTS_TABLE}_sync")
+
+
+@pytest.fixture()
+def ethindex_db_with_user_events_index(
+    currency_network_with_trustlines_session, generic_db_connection, user_events_index
+):
+    ethindex_db = make_ethindex_db(
+        currency_network_with_trustlines_session.address, generic_db_connection
+    )
+    ethindex_db.user_events_index = user_events_index
+    return ethindex_db
+
+
+def make_transfers(currency_network, accounts):
+    currency_network.transfer_on_path(10, path=[accounts[0], accounts[1]])
+    currency_network.transfer_on_path(20, path=[accounts[1], accounts[2]])
+    currency_network.transfer_on_path(30, path=[accounts[2], accounts[1]])
+
+
+def assert_same_events(events, expected_events):
+    assert [(event.transaction_hash, event.type, event.user) for event in events] == [
+        (event.transaction_hash, event.type, event.user) for event in expected_events
+    ]
+
+
+def test_backfill_copies_events_per_user(
+    user_events_index,
+    generic_db_connection,
+    currency_network_with_trustlines_session,
+    accounts,
+    wait_for_ethindex_to_sync,
+):
+    make_transfers(currency_network_with_trustlines_session, accounts)
+    wait_for_ethindex_to_sync()
+
+    user_events_index.backfill(generic_db_connection)
+
+    with generic_db_connection:
+        with generic_db_connection.cursor() as cur:
+            cur.execute(
+                f"""SELECT count(*) FROM {USER_EVENTS_TABLE}
+                    WHERE user_address=%s AND address=%s AND eventName=%s""",
+                (
+                    accounts[1],
+                    currency_network_with_trustlines_session.address,
+                    currency_network_events.TransferEventType,
+                ),
+            )
+            assert cur.fetchone()["count"] >= 3
+
+
+@pytest.mark.parametrize("is_backfilled", [True, False])
+def test_user_events_same_with_index(
+    ethindex_db_with_user_events_index,
+    ethindex_db_for_currency_network_with_trustlines,
+    user_events_index,
+    generic_db_connection,
+    currency_network_with_trustlines_session,
+    accounts,
+    wait_for_ethindex_to_sync,
+    is_backfilled,
+):
+    make_transfers(currency_network_with_trustlines_session, accounts)
+    wait_for_ethindex_to_sync()
+    if is_backfilled:
+        user_events_index.backfill(generic_db_connection)
+    else:
+        user_events_index.sync(generic_db_connection)
+    # Events of blocks that are not indexed yet are read from the events table
+    currency_network_with_trustlines_session.transfer_on_path(
+        40, path=[accounts[0], accounts[1]]
+    )
+    wait_for_ethindex_to_sync()
+
+    assert_same_events(
+        ethindex_db_with_user_events_index.get_all_network_events(accounts[1]),
+        ethindex_db_for_currency_network_with_trustlines.get_all_network_events(
+            accounts[1]
+        ),
+    )
+    assert_same_events(
+        ethindex_db_with_user_events_index.get_network_events(
+            currency_network_events.TransferEventType, accounts[1]
+        ),
+        ethindex_db_for_currency_network_with_trustlines.get_network_events(
+            currency_network_events.TransferEventType, accounts[1]
+        ),
+    )
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_user_events_after_cursor(
+    ethindex_db_with_user_events_index,
+    ethindex_db_for_currency_network_with_trustlines,
+    user_events_index,
+    generic_db_connection,
+    currency_network_with_trustlines_session,
+    accounts,
+    wait_for_ethindex_to_sync,
+    use_index,
+):
+    make_transfers(currency_network_with_trustlines_session, accounts)
+    wait_for_ethindex_to_sync()
+    if use_index:
+        user_events_index.backfill(generic_db_connection)
+        ethindex_db = ethindex_db_with_user_events_index
+    else:
+        ethindex_db = ethindex_db_for_currency_network_with_trustlines
+
+    events = ethindex_db.get_all_network_events(accounts[1])
+    cursor_event = events[-3]
+    cursor = (
+        cursor_event.blocknumber,
+        cursor_event.transaction_index,
+        cursor_event.log_index,
+    )
+
+    assert_same_events(
+        ethindex_db.get_all_network_events(accounts[1], after=cursor), events[-2:]
+    )
+    assert_same_events(
+        ethindex_db.get_all_network_events(accounts[1], after=cursor, limit=1),
+        events[-2:-1],
+    )
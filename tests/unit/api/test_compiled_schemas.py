@@ -0,0 +1,230 @@
+import json
+
+import pytest
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from relay.api import schemas
+from relay.api.compiled_schemas import compile_schema
+from relay.api.resources import _get_extended_account_summary
+from relay.blockchain import currency_network_events, exchange_events, token_events
+from relay.network_graph.graph import AccountSummary
+from relay.network_graph.payment_path import FeePayer, PaymentPath
+
+from .test_schemas import web3_transfer_event
+
+A = "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b"
+B = "0x51a240271AB8AB9f9a21C82d9a85396b704E164d"
+NETWORK = "0x" + "1" * 40
+
+
+def currency_network_events_():
+    transfer = currency_network_events.TransferEvent(
+        web3_transfer_event, 10, 1000, user=A
+    )
+    trustline_update = currency_network_events.TrustlineUpdateEvent(
+        AttributeDict(
+            {
+                **web3_transfer_event,
+                "event": "TrustlineUpdate",
+                "args": AttributeDict(
+                    {
+                        "_creditor": A,
+                        "_debtor": B,
+                        "_creditlineGiven": 2**200,
+                        "_creditlineReceived": 0,
+                        "_interestRateGiven": 100,
+                        "_interestRateReceived": 0,
+                        "_isFrozen": True,
+                    }
+                ),
+            }
+        ),
+        10,
+        1000,
+        user=B,
+    )
+    balance_update = currency_network_events.BalanceUpdateEvent(
+        AttributeDict(
+            {
+                **web3_transfer_event,
+                "event": "BalanceUpdate",
+                "args": AttributeDict({"_from": A, "_to": B, "_value": -(2**100)}),
+                "blockNumber": None,
+                "blockHash": None,
+            }
+        ),
+        10,
+        1000,
+    )
+    balance_update.block_hash = HexBytes(b"")
+    return [transfer, trustline_update, balance_update]
+
+
+def token_event():
+    return token_events.TransferEvent(
+        AttributeDict(
+            {
+                **web3_transfer_event,
+                "args": AttributeDict({"_from": A, "_to": B, "_value": 5}),
+            }
+        ),
+        10,
+        1000,
+        user=A,
+    )
+
+
+def exchange_event():
+    return exchange_events.LogFillEvent(
+        AttributeDict(
+            {
+                **web3_transfer_event,
+                "event": "LogFill",
+                "args": AttributeDict(
+                    {
+                        "maker": A,
+                        "taker": B,
+                        "orderHash": "0x" + "ab" * 32,
+                        "makerToken": A,
+                        "takerToken": B,
+                        "filledMakerTokenAmount": 10,
+                        "filledTakerTokenAmount": 20,
+                    }
+                ),
+            }
+        ),
+        10,
+        1000,
+        user=A,
+    )
+
+
+def trustlines():
+    account_summary = AccountSummary(
+        balance=-(2**100),
+        creditline_given=100,
+        creditline_received=2**120,
+        interest_rate_given=1,
+        interests_received=2,
+        is_frozen=False,
+    )
+    trustline = _get_extended_account_summary_of(account_summary)
+    frozen_trustline = _get_extended_account_summary_of(AccountSummary(is_frozen=True))
+    trustline_dict = {
+        "creditline_left_given": 1,
+        "creditline_left_received": 2,
+        "balance": 0,
+        "user": A,
+        "counterParty": B,
+    }
+    return [trustline, frozen_trustline, trustline_dict]
+
+
+def _get_extended_account_summary_of(account_summary):
+    class Graph:
+        def get_account_sum(self, a_address, b_address, timestamp):
+            return account_summary
+
+    return _get_extended_account_summary(Graph(), NETWORK, A, B, timestamp=0)
+
+
+def assert_dumps_identical(schema, obj):
+    expected = json.dumps(schema.dump(obj))
+    assert json.dumps(compile_schema(schema)(obj)) == expected
+
+
+@pytest.mark.parametrize(
+    "schema, obj",
+    [
+        (schemas.TrustlineSchema(many=True), trustlines()),
+        (schemas.TrustlineSchema(), trustlines()[0]),
+        (
+            schemas.UserCurrencyNetworkEventSchema(many=True),
+            currency_network_events_(),
+        ),
+        (schemas.CurrencyNetworkEventSchema(many=True), currency_network_events_()),
+        (
+            schemas.AnyEventSchema(many=True),
+            currency_network_events_() + [token_event(), exchange_event()],
+        ),
+        (schemas.UserTokenEventSchema(many=True), [token_event()]),
+        (schemas.UserExchangeEventSchema(many=True), [exchange_event()]),
+        (
+            schemas.PaymentPathSchema(),
+            PaymentPath(fee=2**70, path=[A, B], value=10, fee_payer=FeePayer.SENDER),
+        ),
+        (
+            schemas.AccruedInterestListSchema(many=True),
+            [
+                {
+                    "accruedInterests": [
+                        {"value": 1, "interest_rate": 2, "timestamp": 3}
+                    ],
+                    "user": A,
+                    "counterparty": B,
+                }
+            ],
+        ),
+        (
+            schemas.MetaTransactionFeeSchema(many=True),
+            [
+                {
+                    "base_fee": 1,
+                    "gas_price": 2,
+                    "fee_recipient": A,
+                    "currency_network_of_fees": None,
+                }
+            ],
+        ),
+        (schemas.TrustlineSchema(many=True), []),
+        (schemas.TrustlineSchema(many=True), None),
+    ],
+)
+def test_compiled_dump_is_identical(schema, obj):
+    assert_dumps_identical(schema, obj)
+
+
+def test_compiled_dump_of_generator_is_identical():
+    schema = schemas.TrustlineSchema(many=True)
+
+    assert json.dumps(compile_schema(schema)(iter(trustlines()))) == json.dumps(
+        schema.dump(trustlines())
+    )
+
+
+def test_default_is_used_for_missing_attribute():
+    event = {"timestamp": 1000, "blocknumber": 10}
+
+    assert_dumps_identical(schemas.BlockchainEventSchema(), event)
+    assert compile_schema(schemas.BlockchainEventSchema())(event)["type"] == "event"
+
+
+@pytest.mark.parametrize(
+    "schema",
+    [
+        schemas.TrustlineSchema(many=True),
+        schemas.UserCurrencyNetworkEventSchema(many=True),
+        schemas.AnyEventSchema(many=True),
+        schemas.PaymentPathSchema(),
+        schemas.AccruedInterestListSchema(),
+    ],
+)
+def test_hot_schemas_are_compiled(schema):
+    assert compile_schema(schema) != schema.dump
+
+
+def test_schema_with_post_dump_is_not_compiled():
+    schema = schemas.MetaTransactionFeeSchema()
+
+    assert compile_schema(schema) == schema.dump
+
+
+def test_invalid_value_fails_like_schema():
+    trustline = trustlines()[0]
+    trustline.interest_rate_given = None
+
+    with pytest.raises(AssertionError):
+        schemas.TrustlineSchema().dump(trustline)
+    with pytest.raises(AssertionError):
+        compile_schema(schemas.TrustlineSchema())(trustline)
@@ -0,0 +1,41 @@
+import json
+import time
+
+import pytest
+
+from relay.api import schemas
+from relay.api.compiled_schemas import compile_schema
+
+from .test_compiled_schemas import currency_network_events_, trustlines
+
+NUMBER_OF_ITEMS = 5000
+
+
+def measure(dump, objs):
+    start = time.perf_counter()
+    result = dump(objs)
+    return result, time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "schema, make_items",
+    [
+        (schemas.TrustlineSchema(many=True), trustlines),
+        (schemas.UserCurrencyNetworkEventSchema(many=True), currency_network_events_),
+        (schemas.AnyEventSchema(many=True), currency_network_events_),
+    ],
+)
+def test_compiled_dump_speedup(schema, make_items):
+    items = make_items()
+    objs = [items[i % len(items)] for i in range(NUMBER_OF_ITEMS)]
+
+    expected, schema_duration = measure(schema.dump, objs)
+    result, compiled_duration = measure(compile_schema(schema), objs)
+
+    assert json.dumps(result) == json.dumps(expected)
+    print(
+        f"{type(schema).__name__} {NUMBER_OF_ITEMS} items: "
+        f"schema {schema_duration:.3f}s, compiled {compiled_duration:.3f}s, "
+        f"speedup {schema_duration / compiled_duration:.1f}x"
+    )
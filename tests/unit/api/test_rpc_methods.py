@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+import pytest
+from marshmallow import ValidationError
+from web3.datastructures import AttributeDict
+
+from relay.api.streams import rpc_methods
+from relay.blockchain import currency_network_events, token_events
+from relay.streams import Client, Subject
+
+from .test_schemas import web3_transfer_event
+
+USER = "0x51a240271AB8AB9f9a21C82d9a85396b704E164d"
+CURSOR = {"blockNumber": 0, "transactionIndex": 0, "logIndex": 0}
+
+
+class LogClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def _execute_send(self, subscription, event):
+        self.events.append(event)
+
+
+class FakeRelay:
+    """returns the given events from `get_user_events` like the ethindex"""
+
+    def __init__(self, events, max_replayed_events=10):
+        self.events = events
+        self.subjects = defaultdict(Subject)
+        self.config = {"streams": {"max_replayed_events": max_replayed_events}}
+
+    def get_user_events(self, user_address, contract_type=None, after=None, limit=None):
+        events = [
+            event
+            for event in self.events
+            if (contract_type is None or event.contract_type == contract_type.value)
+            and (event.blocknumber, event.transaction_index, event.log_index) > after
+        ]
+        return events[:limit]
+
+
+def network_transfer(block_number):
+    event = currency_network_events.TransferEvent(
+        AttributeDict({**web3_transfer_event, "blockNumber": block_number}), 10, 1000
+    )
+    event.user = USER
+    return event
+
+
+def token_transfer(block_number):
+    return token_events.TransferEvent(
+        AttributeDict({**web3_transfer_event, "blockNumber": block_number}),
+        10,
+        1000,
+        user=USER,
+    )
+
+
+def test_missed_network_events_are_replayed():
+    events = [network_transfer(3), network_transfer(4)]
+    client = LogClient()
+
+    rpc_methods.subscribe(
+        FakeRelay(events), client, event="all", user=USER, cursor=CURSOR
+    )
+
+    assert client.events == events
+
+
+def test_missed_token_events_are_not_replayed():
+    network_event = network_transfer(3)
+    client = LogClient()
+
+    rpc_methods.subscribe(
+        FakeRelay([network_event, token_transfer(4)]),
+        client,
+        event="all",
+        user=USER,
+        cursor=CURSOR,
+    )
+
+    assert client.events == [network_event]
+
+
+def test_nothing_is_replayed_for_other_contract_types():
+    client = LogClient()
+
+    rpc_methods.subscribe(
+        FakeRelay([network_transfer(3), token_transfer(4)]),
+        client,
+        event="all",
+        user=USER,
+        contractTypes=["Token"],
+        cursor=CURSOR,
+    )
+
+    assert client.events == []
+
+
+def test_too_many_missed_events_are_rejected():
+    relay = FakeRelay([network_transfer(i) for i in range(3, 6)], max_replayed_events=2)
+
+    with pytest.raises(ValidationError):
+        rpc_methods.subscribe(relay, LogClient(), event="all", user=USER, cursor=CURSOR)
+    assert len(relay.subjects[USER].subscriptions) == 0
@@ -0,0 +1,121 @@
+import io
+
+import pytest
+from geventwebsocket.exceptions import ProtocolError
+from geventwebsocket.websocket import Header
+
+from relay.api.streams.compression import (
+    COMPRESSED_FLAG,
+    MIN_COMPRESSED_SIZE,
+    DeflateWebSocket,
+    compress_message,
+    decompress_message,
+    negotiate_deflate,
+    parse_deflate_offer,
+)
+
+MESSAGE = '{"jsonrpc": "2.0", "method": "subscription_0x1", "params": {}}' * 10
+
+
+class FakeStream:
+    def __init__(self, incoming=b""):
+        self.incoming = io.BytesIO(incoming)
+        self.outgoing = io.BytesIO()
+
+    def read(self, size):
+        return self.incoming.read(size)
+
+    def write(self, data):
+        self.outgoing.write(data)
+
+
+def make_websocket(incoming=b""):
+    stream = FakeStream(incoming)
+    return DeflateWebSocket({}, stream, handler=None, window_bits=15), stream
+
+
+def client_frame(payload: bytes, flags: int = 0) -> bytes:
+    mask = b"\x01\x02\x03\x04"
+    header = Header.encode_header(
+        True, DeflateWebSocket.OPCODE_TEXT, mask, len(payload), flags
+    )
+    masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return header + masked
+
+
+@pytest.mark.parametrize(
+    "header, offer",
+    [
+        ("", None),
+        ("x-webkit-deflate-frame", None),
+        ("permessage-deflate", {}),
+        (
+            "permessage-deflate; client_max_window_bits, x-other",
+            {"client_max_window_bits": ""},
+        ),
+        (
+            'x-other, permessage-deflate; server_max_window_bits="10"',
+            {"server_max_window_bits": "10"},
+        ),
+    ],
+)
+def test_parse_deflate_offer(header, offer):
+    assert parse_deflate_offer(header) == offer
+
+
+@pytest.mark.parametrize(
+    "offer, window_bits",
+    [
+        ({}, 15),
+        ({"server_max_window_bits": "10"}, 10),
+        ({"server_max_window_bits": "8"}, None),
+        ({"server_max_window_bits": "x"}, None),
+    ],
+)
+def test_negotiate_deflate(offer, window_bits):
+    assert negotiate_deflate(offer) == window_bits
+
+
+def test_compress_roundtrip():
+    data = MESSAGE.encode()
+    compressed = compress_message(data)
+    assert len(compressed) < len(data)
+    assert decompress_message(compressed) == data
+
+
+def test_decompress_limits_size():
+    with pytest.raises(ProtocolError):
+        decompress_message(compress_message(b"a" * 1000), max_size=100)
+
+
+def test_send_compresses_big_messages():
+    websocket, stream = make_websocket()
+    websocket.send(MESSAGE)
+
+    sent = io.BytesIO(stream.outgoing.getvalue())
+    header = Header.decode_header(sent)
+    assert header.flags == COMPRESSED_FLAG
+    assert decompress_message(sent.read(header.length)) == MESSAGE.encode()
+
+
+def test_send_does_not_compress_small_messages():
+    websocket, stream = make_websocket()
+    message = "a" * (MIN_COMPRESSED_SIZE - 1)
+    websocket.send(message)
+
+    sent = io.BytesIO(stream.outgoing.getvalue())
+    header = Header.decode_header(sent)
+    assert header.flags == 0
+    assert sent.read(header.length) == message.encode()
+
+
+def test_receive_compressed_message():
+    websocket, _ = make_websocket(
+        client_frame(compress_message(MESSAGE.encode()), COMPRESSED_FLAG)
+    )
+    assert websocket.receive() == MESSAGE
+
+
+def test_receive_uncompressed_message():
+    websocket, _ = make_websocket(client_frame(b"hello"))
+    assert websocket.receive() == "hello"
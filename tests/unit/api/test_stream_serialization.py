@@ -0,0 +1,150 @@
+import json
+from copy import copy
+
+import gevent
+import pytest
+from tinyrpc.protocols.jsonrpc import JSONRPCBatchRequest, JSONRPCProtocol
+
+from relay.api import schemas
+from relay.api.streams import serialization
+from relay.api.streams.transport import RPCWebSocketClient
+from relay.blockchain.currency_network_events import TransferEvent
+from relay.events import BalanceEvent, MessageEvent
+from relay.network_graph.graph import AggregatedAccountSummary
+from relay.streams import Subject
+
+from .test_schemas import web3_transfer_event
+
+SUBSCRIPTION_ID = "0x00000000000000AB"
+
+
+class LogWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def user_transfer_event():
+    event = TransferEvent(web3_transfer_event, 10, 1000)
+    event.user = event.to
+    return event
+
+
+def balance_event():
+    return BalanceEvent(
+        "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b",
+        "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b",
+        "0x51a240271AB8AB9f9a21C82d9a85396b704E164d",
+        AggregatedAccountSummary(
+            balance=-5, creditline_given=100, creditline_received=20
+        ),
+        1000,
+    )
+
+
+def serialize_with_tinyrpc(subscription_id, data):
+    request = JSONRPCProtocol().create_request(
+        "subscription_" + subscription_id, args={"event": data}, one_way=True
+    )
+    return request.serialize().decode()
+
+
+@pytest.mark.parametrize(
+    "event, schema",
+    [
+        (user_transfer_event(), schemas.UserCurrencyNetworkEventSchema()),
+        (balance_event(), schemas.UserCurrencyNetworkEventSchema()),
+        (MessageEvent("hello", timestamp=1000), schemas.MessageEventSchema()),
+    ],
+)
+def test_notification_matches_tinyrpc_serialization(event, schema):
+    notification = serialization.create_subscription_notification(
+        SUBSCRIPTION_ID, serialization.serialize_event(event)
+    )
+
+    assert notification == serialize_with_tinyrpc(SUBSCRIPTION_ID, schema.dump(event))
+
+
+def test_event_is_serialized_once_for_all_subscriptions(monkeypatch):
+    dumped_events = []
+    schema = serialization._user_currency_network_event_schema
+    original_dump = schema.dump
+
+    def counting_dump(event):
+        dumped_events.append(event)
+        return original_dump(event)
+
+    monkeypatch.setattr(schema, "dump", counting_dump)
+
+    subject = Subject()
+    websockets = [LogWebSocket() for _ in range(3)]
+    subscriptions = [
+        subject.subscribe(
+            RPCWebSocketClient(websocket, JSONRPCProtocol(), max_queue_size=10)
+        )
+        for websocket in websockets
+    ]
+    event = user_transfer_event()
+    subject.publish(event)
+    gevent.sleep(0.01)
+
+    assert len(dumped_events) == 1
+    for websocket, subscription in zip(websockets, subscriptions):
+        assert websocket.sent == [
+            serialize_with_tinyrpc(
+                subscription.id,
+                schemas.UserCurrencyNetworkEventSchema().dump(event),
+            )
+        ]
+
+
+def test_user_views_of_an_event_are_serialized_separately():
+    event = TransferEvent(web3_transfer_event, 10, 1000)
+    sender_event, receiver_event = copy(event), copy(event)
+    sender_event.user = event.from_
+    receiver_event.user = event.to
+
+    sender_data = serialization.serialize_event(sender_event)
+    receiver_data = serialization.serialize_event(receiver_event)
+
+    assert '"direction": "sent"' in sender_data
+    assert '"direction": "received"' in receiver_data
+
+
+def test_batch_notification_matches_tinyrpc_serialization():
+    events = [user_transfer_event(), balance_event()]
+    notifications = [
+        serialization.create_subscription_notification(
+            SUBSCRIPTION_ID, serialization.serialize_event(event)
+        )
+        for event in events
+    ]
+    batch = JSONRPCBatchRequest(
+        JSONRPCProtocol().create_request(
+            "subscription_" + SUBSCRIPTION_ID,
+            kwargs={"event": schemas.UserCurrencyNetworkEventSchema().dump(event)},
+            one_way=True,
+        )
+        for event in events
+    )
+
+    assert serialization.create_batch_notification(notifications) == (
+        batch.serialize().decode()
+    )
+
+
+def test_batched_subscription_sends_one_frame():
+    subject = Subject()
+    websocket = LogWebSocket()
+    client = RPCWebSocketClient(
+        websocket, JSONRPCProtocol(), max_queue_size=10, batch_window=0.01
+    )
+    client.enable_batching(subject.subscribe(client))
+    for _ in range(3):
+        subject.publish(balance_event())
+    gevent.sleep(0.02)
+
+    assert len(websocket.sent) == 1
+    assert len(json.loads(websocket.sent[0])) == 3
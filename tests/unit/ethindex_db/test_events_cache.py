@@ -0,0 +1,84 @@
+import pytest
+
+from relay.ethindex_db.events_cache import EventsCache
+
+QUERY_KEY = ("address=%s", ("0x1",))
+
+
+class FakeEventsTable:
+    def __init__(self, block_numbers):
+        self.rows = [{"blockNumber": block_number} for block_number in block_numbers]
+        self.fetched_after = []
+
+    def fetch_rows(self, block_number):
+        self.fetched_after.append(block_number)
+        return [row for row in self.rows if row["blockNumber"] > block_number]
+
+
+@pytest.fixture()
+def events_cache():
+    return EventsCache(max_rows=10, confirmation_depth=5)
+
+
+def test_first_query_fetches_all_rows(events_cache):
+    table = FakeEventsTable([1, 2, 9])
+
+    rows = events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+
+    assert rows == table.rows
+    assert table.fetched_after == [-1]
+    assert events_cache.misses == 1
+
+
+def test_second_query_only_fetches_unconfirmed_tail(events_cache):
+    table = FakeEventsTable([1, 2, 9])
+    events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+
+    rows = events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+
+    assert rows == table.rows
+    assert table.fetched_after == [-1, 5]
+    assert events_cache.hits == 1
+
+
+def test_high_water_mark_moves_with_new_blocks(events_cache):
+    table = FakeEventsTable([1, 2, 9])
+    events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+    table.rows.append({"blockNumber": 12})
+
+    events_cache.get_rows(QUERY_KEY, 20, table.fetch_rows)
+    rows = events_cache.get_rows(QUERY_KEY, 20, table.fetch_rows)
+
+    assert rows == table.rows
+    assert table.fetched_after == [-1, 5, 15]
+
+
+def test_unconfirmed_rows_are_not_cached(events_cache):
+    table = FakeEventsTable([1, 9])
+    events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+    # the unconfirmed event is removed by a reorg
+    del table.rows[1]
+
+    rows = events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+
+    assert rows == [{"blockNumber": 1}]
+
+
+def test_least_recently_used_query_is_evicted(events_cache):
+    table = FakeEventsTable(range(1, 5))
+    other_query_key = ("address=%s", ("0x2",))
+
+    events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+    events_cache.get_rows(other_query_key, 10, table.fetch_rows)
+    events_cache.get_rows(("address=%s", ("0x3",)), 10, table.fetch_rows)
+    events_cache.get_rows(QUERY_KEY, 10, table.fetch_rows)
+
+    assert events_cache.misses == 4
+
+
+def test_result_bigger_than_cache_is_not_cached(events_cache):
+    table = FakeEventsTable(range(1, 20))
+
+    assert events_cache.get_rows(QUERY_KEY, 30, table.fetch_rows) == table.rows
+    assert events_cache.get_rows(QUERY_KEY, 30, table.fetch_rows) == table.rows
+    assert events_cache.misses == 2
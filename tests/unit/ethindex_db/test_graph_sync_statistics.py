@@ -0,0 +1,63 @@
+import pytest
+
+from relay.ethindex_db.graph_sync_statistics import GraphSyncStatistics
+from relay.ethindex_db.sync_updates import NetworkFreezeFeedUpdate
+
+NETWORK = "0x" + "0" * 40
+
+
+def feed_updates(*timestamps):
+    return [
+        NetworkFreezeFeedUpdate(address=NETWORK, timestamp=timestamp)
+        for timestamp in timestamps
+    ]
+
+
+def test_statistics_without_updates():
+    statistics = GraphSyncStatistics()
+    statistics.record_sync([], notified=False)
+
+    assert statistics.number_of_syncs == 1
+    assert statistics.last_staleness is None
+    assert statistics.average_staleness is None
+
+
+def test_statistics_staleness():
+    statistics = GraphSyncStatistics()
+    statistics.record_sync(feed_updates(90, 97), notified=True, now=100)
+    statistics.record_sync([], notified=False, now=105)
+    statistics.record_sync(feed_updates(104), notified=True, now=105)
+
+    assert statistics.number_of_syncs == 3
+    assert statistics.number_of_notified_syncs == 2
+    assert statistics.number_of_applied_updates == 3
+    assert statistics.last_staleness == 1
+    assert statistics.max_staleness == 3
+    assert statistics.average_staleness == pytest.approx(2)
+
+
+def test_statistics_per_network():
+    statistics = GraphSyncStatistics()
+    statistics.record_network_applied(NETWORK, feed_updates(5, 8), duration=0.5)
+    statistics.record_network_applied(NETWORK, feed_updates(7), duration=0.1)
+    statistics.record_network_published(NETWORK, duration=0.2)
+    statistics.record_feed_ids(applied_feed_id=10, max_feed_id=15)
+
+    network_statistics = statistics.networks[NETWORK]
+    assert network_statistics.number_of_applied_updates == 3
+    assert network_statistics.updates_in_last_batch == 1
+    assert network_statistics.newest_update_timestamp == 8
+    assert network_statistics.newest_update_age(now=10) == 2
+    assert network_statistics.last_apply_duration == 0.1
+    assert network_statistics.last_publish_duration == 0.2
+    assert statistics.feed_id_lag == 5
+
+
+def test_network_status_of_network_without_updates():
+    statistics = GraphSyncStatistics()
+    statistics.record_feed_ids(applied_feed_id=0, max_feed_id=None)
+
+    status = statistics.get_network_status(NETWORK)
+    assert status["feed_id_lag"] == 0
+    assert status["number_of_applied_updates"] == 0
+    assert status["newest_update_age"] is None
@@ -0,0 +1,109 @@
+import pytest
+from web3.datastructures import AttributeDict
+
+from relay.blockchain.currency_network_events import (
+    BalanceUpdateEvent,
+    BalanceUpdateEventType,
+    TrustlineUpdateEvent,
+    TrustlineUpdateEventType,
+)
+from relay.ethindex_db.events_informations import get_accrued_interests_from_events
+from relay.ethindex_db.interests_ledger import (
+    TrustlineInterestsState,
+    apply_event_on_state,
+    get_trustline_key,
+)
+
+NETWORK = "0x" + "0" * 40
+A = "0x" + "1" * 40
+B = "0x" + "2" * 40
+ONE_YEAR = 365 * 24 * 3600
+
+
+def make_event(event_class, event_type, args, timestamp, log_index, user):
+    web3_event = AttributeDict(
+        {
+            "args": AttributeDict(args),
+            "event": event_type,
+            "logIndex": log_index,
+            "transactionIndex": 0,
+            "transactionHash": "0x" + "ab" * 32,
+            "address": NETWORK,
+            "blockHash": "0x" + "cd" * 32,
+            "blockNumber": log_index,
+        }
+    )
+    return event_class(web3_event, 100, timestamp, user=user)
+
+
+def balance_update(from_, to, value, timestamp, log_index, user):
+    return make_event(
+        BalanceUpdateEvent,
+        BalanceUpdateEventType,
+        {"_from": from_, "_to": to, "_value": value},
+        timestamp,
+        log_index,
+        user,
+    )
+
+
+def trustline_update(creditor, debtor, given, received, timestamp, log_index, user):
+    return make_event(
+        TrustlineUpdateEvent,
+        TrustlineUpdateEventType,
+        {
+            "_creditor": creditor,
+            "_debtor": debtor,
+            "_creditlineGiven": 1000,
+            "_creditlineReceived": 1000,
+            "_interestRateGiven": given,
+            "_interestRateReceived": received,
+        },
+        timestamp,
+        log_index,
+        user,
+    )
+
+
+def events_of_trustline(user):
+    return [
+        trustline_update(A, B, 100, 200, 0, 0, user),
+        balance_update(A, B, 500, 0, 1, user),
+        balance_update(B, A, 300, ONE_YEAR, 2, user),
+        # the rate change is only used for the next balance update
+        trustline_update(B, A, 300, 400, ONE_YEAR, 3, user),
+        balance_update(B, A, 600, ONE_YEAR, 4, user),
+        balance_update(A, B, 50, 2 * ONE_YEAR, 5, user),
+        trustline_update(A, B, 1000, 1000, 2 * ONE_YEAR + 10, 6, user),
+        balance_update(A, B, 0, 3 * ONE_YEAR, 7, user),
+    ]
+
+
+@pytest.mark.parametrize("user, counterparty", [(A, B), (B, A)])
+def test_state_matches_recomputation_from_events(user, counterparty):
+    events = events_of_trustline(user)
+    expected_interests = get_accrued_interests_from_events(
+        [event for event in events if isinstance(event, BalanceUpdateEvent)],
+        [event for event in events if isinstance(event, TrustlineUpdateEvent)],
+    )
+
+    _, user_a, _ = get_trustline_key(NETWORK, user, counterparty)
+    sign = 1 if user == user_a else -1
+    state = TrustlineInterestsState()
+    interests = []
+    for event in events:
+        accrued_interests = apply_event_on_state(state, user_a, event)
+        if accrued_interests is not None:
+            accrued_interests.value *= sign
+            interests.append(accrued_interests)
+
+    assert len(expected_interests) == 3
+    assert interests == expected_interests
+
+
+def test_state_survives_json_roundtrip():
+    state = TrustlineInterestsState()
+    for event in events_of_trustline(A)[:4]:
+        apply_event_on_state(state, A, event)
+
+    assert TrustlineInterestsState.from_json(state.__dict__.copy()) == state
@@ -0,0 +1,199 @@
+import random
+
+import pytest
+
+from relay.ethindex_db import sync_updates
+from relay.ethindex_db.sync_updates import (
+    BalanceUpdateFeedUpdate,
+    GraphFeedSync,
+    NetworkFreezeFeedUpdate,
+    NetworkUnfreezeFeedUpdate,
+    SyncIdFileStore,
+    TrustlineUpdateFeedUpdate,
+    coalesce_feed_updates,
+)
+from relay.network_graph.graph import CurrencyNetworkGraph
+
+NETWORK = "0x" + "0" * 40
+A = "0x" + "1" * 40
+B = "0x" + "2" * 40
+C = "0x" + "3" * 40
+
+
+def trustline_update(creditor, debtor, given, received, timestamp, interests=0):
+    return TrustlineUpdateFeedUpdate(
+        address=NETWORK,
+        timestamp=timestamp,
+        args={
+            "_creditor": creditor,
+            "_debtor": debtor,
+            "_creditlineGiven": given,
+            "_creditlineReceived": received,
+            "_interestRateGiven": interests,
+            "_interestRateReceived": interests,
+            "_isFrozen": False,
+        },
+    )
+
+
+def balance_update(from_, to, value, timestamp):
+    return BalanceUpdateFeedUpdate(
+        address=NETWORK,
+        timestamp=timestamp,
+        args={"_from": from_, "_to": to, "_value": value},
+    )
+
+
+def apply_on_new_graph(feed_updates):
+    graph = CurrencyNetworkGraph(default_interest_rate=1)
+    for update in feed_updates:
+        graph.update_from_feed(update)
+    return graph
+
+
+def trustlines_of(graph):
+    # the order of the users of an edge depends on the order of updates
+    return sorted(
+        (min(a, b), max(a, b), data) for a, b, data in graph.graph.edges(data=True)
+    )
+
+
+def assert_same_graphs(graph, other_graph):
+    assert graph.is_frozen == other_graph.is_frozen
+    assert trustlines_of(graph) == trustlines_of(other_graph)
+
+
+def test_coalesce_keeps_last_updates_in_order():
+    updates = [
+        trustline_update(A, B, 100, 200, 1),
+        balance_update(A, B, 10, 1),
+        trustline_update(B, A, 300, 400, 2),
+        NetworkFreezeFeedUpdate(address=NETWORK, timestamp=2),
+        balance_update(B, A, 20, 3),
+        trustline_update(A, C, 100, 100, 3),
+        NetworkUnfreezeFeedUpdate(address=NETWORK, timestamp=3),
+    ]
+
+    assert coalesce_feed_updates(updates) == [
+        updates[2],
+        updates[4],
+        updates[5],
+        updates[6],
+    ]
+
+
+def test_coalesce_keeps_modification_time_of_last_balance_update():
+    updates = [
+        balance_update(A, B, 10, 1),
+        balance_update(A, B, 20, 2),
+        trustline_update(A, B, 100, 200, 3),
+    ]
+
+    coalesced_graph = apply_on_new_graph(coalesce_feed_updates(updates))
+
+    assert coalesced_graph.graph[A][B]["m_time"] == 2
+    assert_same_graphs(coalesced_graph, apply_on_new_graph(updates))
+
+
+def test_coalesce_keeps_all_updates_of_emptied_trustline():
+    updates = [
+        trustline_update(A, B, 100, 200, 1),
+        trustline_update(A, B, 0, 0, 2),
+        balance_update(A, B, 10, 3),
+    ]
+
+    assert coalesce_feed_updates(updates) == updates
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_coalesced_updates_give_same_graph(seed):
+    rng = random.Random(seed)
+    users = [A, B, C]
+    updates = []
+    for timestamp in range(30):
+        a, b = rng.sample(users, 2)
+        kind = rng.random()
+        if kind < 0.45:
+            updates.append(
+                trustline_update(
+                    a, b, rng.choice([0, 100]), rng.choice([0, 50]), timestamp
+                )
+            )
+        elif kind < 0.9:
+            updates.append(balance_update(a, b, rng.choice([0, 5, -5]), timestamp))
+        elif kind < 0.95:
+            updates.append(
+                NetworkFreezeFeedUpdate(address=NETWORK, timestamp=timestamp)
+            )
+        else:
+            updates.append(
+                NetworkUnfreezeFeedUpdate(address=NETWORK, timestamp=timestamp)
+            )
+
+    assert_same_graphs(
+        apply_on_new_graph(coalesce_feed_updates(updates)), apply_on_new_graph(updates)
+    )
+
+
+def test_sync_id_file_store(tmp_path):
+    store = SyncIdFileStore(str(tmp_path / "sync_id"))
+    assert store.load() == 0
+
+    store.store(123)
+    store.store(456)
+
+    assert store.load() == 456
+    assert [path.name for path in tmp_path.iterdir()] == ["sync_id"]
+
+
+class MemoryStore:
+    def __init__(self):
+        self.stored = []
+
+    def load(self):
+        return 5
+
+    def store(self, sync_id):
+        self.stored.append(sync_id)
+
+
+@pytest.fixture()
+def feed_rows(monkeypatch):
+    rows = [
+        {"id": 6, "eventname": "NetworkFreeze", "address": NETWORK, "timestamp": 1},
+        {"id": 7, "eventname": "NetworkUnfreeze", "address": NETWORK, "timestamp": 2},
+    ]
+
+    def fetch_graph_feed_rows(conn, last_synced_graph_id, limit=None):
+        return [row for row in rows if row["id"] > last_synced_graph_id][:limit]
+
+    monkeypatch.setattr(sync_updates, "fetch_graph_feed_rows", fetch_graph_feed_rows)
+    return rows
+
+
+def test_graph_feed_sync_keeps_sync_id_in_memory(feed_rows):
+    store = MemoryStore()
+    graph_feed_sync = GraphFeedSync(store, persist_interval=3600)
+
+    assert graph_feed_sync.get_updates(None, limit=1) == [
+        NetworkFreezeFeedUpdate(address=NETWORK, timestamp=1)
+    ]
+    assert graph_feed_sync.get_updates(None, limit=1) == [
+        NetworkUnfreezeFeedUpdate(address=NETWORK, timestamp=2)
+    ]
+    assert graph_feed_sync.get_updates(None, limit=1) == []
+    assert store.stored == []
+
+    graph_feed_sync.persist()
+    graph_feed_sync.persist()
+
+    assert store.stored == [7]
+
+
+def test_graph_feed_sync_persists_after_interval(feed_rows):
+    store = MemoryStore()
+    graph_feed_sync = GraphFeedSync(store, persist_interval=0)
+
+    graph_feed_sync.get_updates(None)
+
+    assert store.stored == [7]
@@ -0,0 +1,48 @@
+import pytest
+
+from relay.ethindex_db.transfer_information_cache import (
+    TransferInformationCache,
+    event_id_key,
+    transaction_key,
+)
+
+TX_HASH = "0x" + "ab" * 32
+BLOCK_HASH = "0x" + "cd" * 32
+
+
+@pytest.fixture()
+def cache():
+    return TransferInformationCache(max_entries=2, confirmation_depth=5)
+
+
+def test_store_confirmed(cache):
+    assert cache.store(transaction_key(TX_HASH), ["info"], 10, 15)
+    assert cache.get(transaction_key(TX_HASH)) == ["info"]
+    assert cache.hits == 1
+
+
+def test_do_not_store_unconfirmed(cache):
+    assert not cache.store(transaction_key(TX_HASH), ["info"], 10, 14)
+    assert cache.get(transaction_key(TX_HASH)) is None
+    assert cache.misses == 1
+
+
+def test_keys_do_not_depend_on_hash_case():
+    assert transaction_key(TX_HASH) == transaction_key(TX_HASH.upper()[2:])
+    assert event_id_key(BLOCK_HASH, 1) == event_id_key(BLOCK_HASH.upper()[2:], 1)
+
+
+def test_evict_least_recently_used(cache):
+    keys = [event_id_key(BLOCK_HASH, log_index) for log_index in range(3)]
+    for key in keys:
+        cache.store(key, ["info"], 10, 20)
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == ["info"]
+
+
+def test_cached_list_can_not_be_modified(cache):
+    cache.store(transaction_key(TX_HASH), ["info"], 10, 20)
+    cache.get(transaction_key(TX_HASH)).append("other")
+
+    assert cache.get(transaction_key(TX_HASH)) == ["info"]
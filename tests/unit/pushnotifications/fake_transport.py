@@ -0,0 +1,43 @@
+from typing import Dict, List, Optional
+
+import gevent
+from firebase_admin import exceptions as firebase_exceptions, messaging
+
+from relay.pushservice.dispatcher import PushTransport
+
+
+class FakePushTransport(PushTransport):
+    """records the sent messages instead of sending them to firebase
+
+    errors_by_token holds the errors to return for messages to a client token,
+    one per attempt. `latency` seconds are slept per batch.
+    """
+
+    def __init__(
+        self,
+        errors_by_token: Dict[
+            str, List[Optional[firebase_exceptions.FirebaseError]]
+        ] = None,
+        latency: float = 0,
+    ) -> None:
+        self.errors_by_token = errors_by_token or {}
+        self.latency = latency
+        self.batches: List[List[messaging.Message]] = []
+
+    @property
+    def sent_messages(self) -> List[messaging.Message]:
+        return [message for batch in self.batches for message in batch]
+
+    def send_all(
+        self, messages: List[messaging.Message]
+    ) -> List[Optional[firebase_exceptions.FirebaseError]]:
+        if self.latency:
+            gevent.sleep(self.latency)
+        self.batches.append(list(messages))
+        return [self._next_error(message.token) for message in messages]
+
+    def _next_error(self, client_token: str):
+        errors = self.errors_by_token.get(client_token)
+        if errors:
+            return errors.pop(0)
+        return None
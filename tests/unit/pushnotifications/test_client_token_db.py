@@ -4,6 +4,8 @@ from sqlalchemy import create_engine
 from relay.pushservice.client_token_db import (
     ClientTokenAlreadyExistsException,
     ClientTokenDB,
+    ClientTokenIndex,
+    TokenMapping,
 )
 
 
@@ -62,3 +64,137 @@ def test_all_tokens(client_token_db: ClientTokenDB):
         ("0x124", "token2"),
         ("0x125", "token3"),
     }
+
+
+def test_delete_client_tokens(client_token_db: ClientTokenDB):
+    client_token_db.add_client_token("0x123", "token1")
+    client_token_db.add_client_token("0x123", "token2")
+    client_token_db.add_client_token("0x456", "token1")
+
+    client_token_db.delete_client_tokens(
+        [TokenMapping("0x123", "token1"), TokenMapping("0x456", "token1")]
+    )
+
+    assert client_token_db.get_client_tokens("0x123") == ["token2"]
+    assert client_token_db.get_client_tokens("0x456") == []
+
+
+class CountingClientTokenDB(ClientTokenDB):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.number_of_writes = 0
+
+    def add_client_token(self, user_address, client_token):
+        self.number_of_writes += 1
+        super().add_client_token(user_address, client_token)
+
+    def delete_client_tokens(self, token_mappings):
+        self.number_of_writes += 1
+        super().delete_client_tokens(token_mappings)
+
+
+@pytest.fixture()
+def counting_client_token_db():
+    return CountingClientTokenDB(create_engine("sqlite:///:memory:"))
+
+
+def test_client_token_index_loads_tokens(counting_client_token_db):
+    counting_client_token_db.add_client_token("0x123", "token1")
+    counting_client_token_db.add_client_token("0x123", "token2")
+    counting_client_token_db.add_client_token("0x456", "token3")
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+
+    assert set(client_token_index.get_client_tokens("0x123")) == {"token1", "token2"}
+    assert set(client_token_index.get_all_client_tokens()) == {
+        TokenMapping("0x123", "token1"),
+        TokenMapping("0x123", "token2"),
+        TokenMapping("0x456", "token3"),
+    }
+
+
+def test_client_token_index_writes_through(counting_client_token_db):
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    client_token_index.add_client_token("0x123", "token")
+
+    assert client_token_index.has_client_token("0x123", "token")
+    assert counting_client_token_db.get_client_tokens("0x123") == ["token"]
+
+
+def test_client_token_index_duplicate_does_not_write(counting_client_token_db):
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    client_token_index.add_client_token("0x123", "token")
+    with pytest.raises(ClientTokenAlreadyExistsException):
+        client_token_index.add_client_token("0x123", "token")
+    assert counting_client_token_db.number_of_writes == 1
+
+
+def test_client_token_index_added_by_other_process(counting_client_token_db):
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    counting_client_token_db.add_client_token("0x123", "token")
+    with pytest.raises(ClientTokenAlreadyExistsException):
+        client_token_index.add_client_token("0x123", "token")
+    assert client_token_index.has_client_token("0x123", "token")
+
+
+def test_client_token_index_batches_deletions(counting_client_token_db):
+    for i in range(3):
+        counting_client_token_db.add_client_token("0x123", f"token{i}")
+    client_token_index = ClientTokenIndex(counting_client_token_db, batch_size=3)
+    counting_client_token_db.number_of_writes = 0
+
+    client_token_index.delete_client_token("0x123", "token0")
+    client_token_index.delete_client_token("0x123", "token1")
+    assert client_token_index.get_client_tokens("0x123") == ["token2"]
+    assert counting_client_token_db.number_of_writes == 0
+
+    client_token_index.delete_client_token("0x123", "token2")
+    assert client_token_index.get_client_tokens("0x123") == []
+    assert counting_client_token_db.get_client_tokens("0x123") == []
+    assert counting_client_token_db.number_of_writes == 1
+
+
+def test_client_token_index_flush(counting_client_token_db):
+    counting_client_token_db.add_client_token("0x123", "token")
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    client_token_index.delete_client_token("0x123", "token")
+    assert counting_client_token_db.get_client_tokens("0x123") == ["token"]
+
+    client_token_index.flush()
+    assert counting_client_token_db.get_client_tokens("0x123") == []
+
+
+def test_client_token_index_add_pending_deletion(counting_client_token_db):
+    counting_client_token_db.add_client_token("0x123", "token")
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    counting_client_token_db.number_of_writes = 0
+
+    client_token_index.delete_client_token("0x123", "token")
+    client_token_index.add_client_token("0x123", "token")
+    client_token_index.flush()
+
+    assert client_token_index.has_client_token("0x123", "token")
+    assert counting_client_token_db.get_client_tokens("0x123") == ["token"]
+    assert counting_client_token_db.number_of_writes == 0
+
+
+def test_client_token_index_deletes_token_of_other_process(counting_client_token_db):
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+    counting_client_token_db.add_client_token("0x123", "token")
+
+    client_token_index.delete_client_token("0x123", "token")
+    client_token_index.flush()
+
+    assert counting_client_token_db.get_client_tokens("0x123") == []
+
+
+def test_client_token_index_add_pending_deletion_of_other_process(
+    counting_client_token_db,
+):
+    client_token_index = ClientTokenIndex(counting_client_token_db)
+
+    client_token_index.delete_client_token("0x123", "token")
+    client_token_index.add_client_token("0x123", "token")
+    client_token_index.flush()
+
+    assert client_token_index.has_client_token("0x123", "token")
+    assert counting_client_token_db.get_client_tokens("0x123") == ["token"]
@@ -0,0 +1,80 @@
+import gevent
+from firebase_admin import exceptions as firebase_exceptions
+
+from relay.pushservice.client_token_db import TokenMapping
+from relay.pushservice.client_token_validation import (
+    InvalidClientTokenRemover,
+    validate_client_tokens,
+)
+
+
+def test_validate_client_tokens_reports_invalid_tokens():
+    token_mappings = [TokenMapping(f"0x{i}", f"token{i}") for i in range(10)]
+    invalid_tokens = []
+
+    def check_client_token(client_token):
+        if client_token == "token5":
+            raise firebase_exceptions.UnavailableError("unavailable")
+        return int(client_token[-1]) % 2 == 0
+
+    validate_client_tokens(
+        token_mappings,
+        check_client_token,
+        lambda user, token: invalid_tokens.append(token),
+        concurrency=3,
+    )
+
+    # token5 could not be checked and is kept
+    assert sorted(invalid_tokens) == ["token1", "token3", "token7", "token9"]
+
+
+def test_validate_client_tokens_with_bounded_concurrency():
+    running_checks = []
+    max_running_checks = 0
+
+    def check_client_token(client_token):
+        nonlocal max_running_checks
+        running_checks.append(client_token)
+        max_running_checks = max(max_running_checks, len(running_checks))
+        gevent.sleep(0.001)
+        running_checks.remove(client_token)
+        return True
+
+    validate_client_tokens(
+        [TokenMapping("0x1", f"token{i}") for i in range(20)],
+        check_client_token,
+        lambda user, token: None,
+        concurrency=4,
+    )
+
+    assert max_running_checks == 4
+
+
+def test_remover_removes_in_batches():
+    removed_batches = []
+    remover = InvalidClientTokenRemover(removed_batches.append, batch_size=2)
+
+    remover.add("0x1", "token1")
+    remover.add("0x1", "token1")
+    assert removed_batches == []
+    remover.add("0x2", "token2")
+    remover.add("0x3", "token3")
+    remover.flush()
+
+    assert removed_batches == [
+        [TokenMapping("0x1", "token1"), TokenMapping("0x2", "token2")],
+        [TokenMapping("0x3", "token3")],
+    ]
+
+
+def test_remover_flushes_periodically():
+    removed_batches = []
+    remover = InvalidClientTokenRemover(
+        removed_batches.append, batch_size=100, flush_interval=0.01
+    )
+    remover.start()
+
+    remover.add("0x1", "token1")
+    gevent.sleep(0.05)
+
+    assert removed_batches == [[TokenMapping("0x1", "token1")]]
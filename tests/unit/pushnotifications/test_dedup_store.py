@@ -0,0 +1,100 @@
+import pytest
+import sqlalchemy
+
+from relay.pushservice import dedup_store as dedup_store_module
+from relay.pushservice.dedup_store import (
+    PROBE_LENGTH,
+    DatabaseDedupStore,
+    HashedDedupTable,
+    fingerprint,
+)
+from relay.pushservice.pushservice import FirebaseRawPushService
+
+DEDUP_ID = ("token", "Transfer", "0x" + "a" * 64)
+OTHER_DEDUP_ID = ("token", "Transfer", "0x" + "b" * 64)
+
+
+@pytest.fixture()
+def now(monkeypatch):
+    current_time = [1_600_000_000.0]
+    monkeypatch.setattr(dedup_store_module.time, "time", lambda: current_time[0])
+    return current_time
+
+
+@pytest.fixture(params=["memory", "database"])
+def dedup_store(request):
+    if request.param == "memory":
+        return HashedDedupTable(memory_budget=10_000, ttl=60)
+    return DatabaseDedupStore(sqlalchemy.create_engine("sqlite:///:memory:"), ttl=60)
+
+
+def test_contains_added(dedup_store, now):
+    dedup_store.add(DEDUP_ID)
+    assert dedup_store.contains(DEDUP_ID)
+    assert not dedup_store.contains(OTHER_DEDUP_ID)
+
+
+def test_add_twice(dedup_store, now):
+    dedup_store.add(DEDUP_ID)
+    dedup_store.add(DEDUP_ID)
+    assert dedup_store.contains(DEDUP_ID)
+
+
+def test_entries_expire(dedup_store, now):
+    dedup_store.add(DEDUP_ID)
+    now[0] += 59
+    assert dedup_store.contains(DEDUP_ID)
+    now[0] += 1
+    assert not dedup_store.contains(DEDUP_ID)
+
+
+def test_add_after_expiry(dedup_store, now):
+    dedup_store.add(DEDUP_ID)
+    now[0] += 100
+    dedup_store.add(DEDUP_ID)
+    assert dedup_store.contains(DEDUP_ID)
+
+
+def test_database_store_deletes_expired_entries(now):
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    dedup_store = DatabaseDedupStore(engine, ttl=60, cleanup_interval=2)
+    dedup_store.add(DEDUP_ID)
+    now[0] += 100
+    dedup_store.add(OTHER_DEDUP_ID)
+    assert engine.execute("SELECT count(*) FROM push_dedup").scalar() == 1
+
+
+def test_database_stores_share_entries(now):
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    DatabaseDedupStore(engine, ttl=60).add(DEDUP_ID)
+    assert DatabaseDedupStore(engine, ttl=60).contains(DEDUP_ID)
+
+
+def test_table_size_follows_memory_budget():
+    assert HashedDedupTable(memory_budget=12_000, ttl=60).number_of_slots == 1000
+
+
+def test_full_table_evicts_entry_expiring_first(now):
+    dedup_store = HashedDedupTable(memory_budget=0, ttl=60)
+    assert dedup_store.number_of_slots == PROBE_LENGTH
+    dedup_ids = [("token", "Transfer", i) for i in range(PROBE_LENGTH + 1)]
+    for dedup_id in dedup_ids:
+        dedup_store.add(dedup_id)
+        now[0] += 1
+
+    assert not dedup_store.contains(dedup_ids[0])
+    assert all(dedup_store.contains(dedup_id) for dedup_id in dedup_ids[1:])
+
+
+def test_fingerprint_is_stable():
+    assert fingerprint(DEDUP_ID) == fingerprint(tuple(DEDUP_ID))
+    assert fingerprint(DEDUP_ID) != fingerprint(OTHER_DEDUP_ID)
+
+
+def test_push_service_uses_dedup_store(now):
+    dedup_store = HashedDedupTable(memory_budget=10_000, ttl=60)
+    push_service = FirebaseRawPushService(app=None, dedup_store=dedup_store)
+    push_service.mark_sent(DEDUP_ID)
+    assert dedup_store.contains(DEDUP_ID)
+    assert push_service.is_duplicate(DEDUP_ID)
+    assert not push_service.is_duplicate(None)
@@ -0,0 +1,190 @@
+import time
+
+import gevent
+import pytest
+from firebase_admin import exceptions as firebase_exceptions, messaging
+
+from relay.blockchain.currency_network_events import TrustlineUpdateEvent
+from relay.events import MessageEvent
+from relay.pushservice.dispatcher import FirebasePushTransport, PushDispatcher
+from relay.pushservice.pushservice import FirebaseRawPushService
+
+from .fake_transport import FakePushTransport
+
+USER = "0x" + "1" * 40
+
+
+def payment_request(text="request"):
+    return MessageEvent(text, type="PaymentRequest", timestamp=int(time.time()))
+
+
+@pytest.fixture()
+def invalid_tokens():
+    return []
+
+
+def make_dispatcher(transport, invalid_tokens, **kwargs):
+    dispatcher = PushDispatcher(
+        FirebaseRawPushService(app=None),
+        transport,
+        on_invalid_client_token=lambda user, token: invalid_tokens.append(
+            (user, token)
+        ),
+        **kwargs,
+    )
+    dispatcher.start()
+    return dispatcher
+
+
+def test_dispatch_sends_messages_in_batches(invalid_tokens):
+    transport = FakePushTransport()
+    dispatcher = make_dispatcher(
+        transport, invalid_tokens, number_of_workers=1, max_batch_size=2
+    )
+
+    for i in range(5):
+        dispatcher.dispatch(USER, f"token{i}", payment_request())
+    dispatcher.join()
+
+    assert [len(batch) for batch in transport.batches] == [2, 2, 1]
+    assert [message.token for message in transport.sent_messages] == [
+        f"token{i}" for i in range(5)
+    ]
+    assert dispatcher.statistics.sent_messages == 5
+    assert dispatcher.statistics.number_of_batches == 3
+    assert dispatcher.statistics.queued_messages == 0
+    assert dispatcher.statistics.average_batch_latency is not None
+
+
+def test_events_without_notification_are_not_queued(invalid_tokens):
+    transport = FakePushTransport()
+    dispatcher = make_dispatcher(transport, invalid_tokens)
+
+    dispatcher.dispatch(USER, "token", MessageEvent("hello", timestamp=0))
+    dispatcher.join()
+
+    assert transport.batches == []
+
+
+def test_duplicates_of_queued_messages_are_not_queued(
+    invalid_tokens, web3_event_trustline_update
+):
+    transport = FakePushTransport()
+    dispatcher = make_dispatcher(transport, invalid_tokens)
+    event = TrustlineUpdateEvent(web3_event_trustline_update, 10, 123456, "0x1234")
+
+    dispatcher.dispatch(USER, "token", event)
+    dispatcher.dispatch(USER, "token", event)
+    dispatcher.join()
+    dispatcher.dispatch(USER, "token", event)
+    dispatcher.join()
+
+    assert len(transport.sent_messages) == 1
+
+
+def test_duplicates_of_sent_messages_are_not_sent(
+    invalid_tokens, web3_event_trustline_update
+):
+    transport = FakePushTransport()
+    dispatcher = make_dispatcher(transport, invalid_tokens)
+    event = TrustlineUpdateEvent(web3_event_trustline_update, 10, 123456, "0x1234")
+    # sent by another relay process sharing the dedup store
+    dispatcher.push_service.mark_sent(("token", event.type, event.transaction_hash))
+
+    dispatcher.dispatch(USER, "token", event)
+    dispatcher.join()
+
+    assert transport.sent_messages == []
+
+
+def test_invalid_client_token_is_reported(invalid_tokens):
+    transport = FakePushTransport(
+        {"token": [firebase_exceptions.NotFoundError("not registered")]}
+    )
+    dispatcher = make_dispatcher(transport, invalid_tokens)
+
+    dispatcher.dispatch(USER, "token", payment_request())
+    dispatcher.join()
+
+    assert invalid_tokens == [(USER, "token")]
+    assert dispatcher.statistics.invalid_client_tokens == 1
+
+
+def test_transient_errors_are_retried(invalid_tokens):
+    transport = FakePushTransport(
+        {"token": [firebase_exceptions.UnavailableError("unavailable")] * 2}
+    )
+    dispatcher = make_dispatcher(transport, invalid_tokens, retry_backoff=0.01)
+
+    dispatcher.dispatch(USER, "token", payment_request())
+    gevent.sleep(0.1)
+
+    assert len(transport.sent_messages) == 3
+    assert dispatcher.statistics.retried_messages == 2
+    assert dispatcher.statistics.sent_messages == 1
+
+
+def test_retries_are_limited(invalid_tokens):
+    transport = FakePushTransport(
+        {"token": [firebase_exceptions.UnavailableError("unavailable")] * 5}
+    )
+    dispatcher = make_dispatcher(
+        transport, invalid_tokens, retry_backoff=0.01, max_retries=1
+    )
+
+    dispatcher.dispatch(USER, "token", payment_request())
+    gevent.sleep(0.1)
+
+    assert len(transport.sent_messages) == 2
+    assert dispatcher.statistics.failed_messages == 1
+
+
+def test_messages_are_dropped_when_queue_is_full(invalid_tokens):
+    transport = FakePushTransport()
+    dispatcher = PushDispatcher(
+        FirebaseRawPushService(app=None),
+        transport,
+        on_invalid_client_token=lambda user, token: None,
+        max_queue_size=2,
+    )
+
+    for i in range(3):
+        dispatcher.dispatch(USER, f"token{i}", payment_request())
+
+    assert dispatcher.statistics.queued_messages == 2
+    assert dispatcher.statistics.dropped_messages == 1
+
+
+def test_slow_transport_does_not_block_dispatch(invalid_tokens):
+    transport = FakePushTransport(latency=0.5)
+    dispatcher = make_dispatcher(transport, invalid_tokens, number_of_workers=2)
+
+    start = time.perf_counter()
+    for i in range(100):
+        dispatcher.dispatch(USER, f"token{i}", payment_request())
+    dispatch_duration = time.perf_counter() - start
+    dispatcher.join()
+
+    assert dispatch_duration < 0.5
+    assert len(transport.sent_messages) == 100
+
+
+def test_firebase_transport_sends_messages_one_by_one(monkeypatch):
+    sent_tokens = []
+    error = firebase_exceptions.NotFoundError("not registered")
+
+    def send(message, app):
+        gevent.sleep(0)
+        if message.token == "invalid":
+            raise error
+        sent_tokens.append(message.token)
+
+    monkeypatch.setattr(messaging, "send", send)
+    messages = [
+        messaging.Message(token=token) for token in ["token0", "invalid", "token1"]
+    ]
+
+    errors = FirebasePushTransport(app=None, concurrency=3).send_all(messages)
+
+    assert errors == [None, error, None]
+    assert sorted(sent_tokens) == ["token0", "token1"]
@@ -0,0 +1,178 @@
+import gevent
+import pytest
+
+from relay.balance_event_debouncer import BalanceEventDebouncer
+
+NETWORK = "0x" + "0" * 40
+A = "0x" + "a" * 40
+B = "0x" + "b" * 40
+
+WINDOW = 10
+
+
+class Clock:
+    def __init__(self):
+        self.time = 1000.0
+
+    def __call__(self):
+        return self.time
+
+
+@pytest.fixture()
+def published():
+    return []
+
+
+@pytest.fixture()
+def clock():
+    return Clock()
+
+
+def make_debouncer(published, clock, *, window=WINDOW, max_delay=100):
+    def publish_trustline_events(**kwargs):
+        published.append(("trustline", kwargs))
+
+    def publish_network_balance_event(**kwargs):
+        published.append(("balance", kwargs))
+
+    return BalanceEventDebouncer(
+        publish_trustline_events,
+        publish_network_balance_event,
+        window=window,
+        max_delay=max_delay,
+        clock=clock,
+    )
+
+
+def advance(debouncer, clock, seconds):
+    clock.time += seconds
+    debouncer._publish_due(clock.time)
+
+
+def test_updates_are_published_after_window(published, clock):
+    debouncer = make_debouncer(published, clock)
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=1)
+
+    advance(debouncer, clock, WINDOW / 2)
+    assert published == []
+    advance(debouncer, clock, WINDOW / 2)
+    assert published == [
+        ("balance", dict(user=A, network_address=NETWORK, timestamp=1))
+    ]
+
+
+def test_updates_in_window_are_coalesced_to_latest(published, clock):
+    debouncer = make_debouncer(published, clock)
+    for timestamp in range(5):
+        debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=timestamp)
+        debouncer.add_trustline_update(
+            user1=B, user2=A, network_address=NETWORK, timestamp=timestamp
+        )
+    advance(debouncer, clock, WINDOW)
+
+    assert published == [
+        ("balance", dict(user=A, network_address=NETWORK, timestamp=4)),
+        (
+            "trustline",
+            dict(user1=A, user2=B, network_address=NETWORK, timestamp=4),
+        ),
+    ]
+    assert debouncer.statistics.coalesced_events == 8
+    assert debouncer.statistics.published_events == 2
+
+
+def test_update_restarts_window(published, clock):
+    debouncer = make_debouncer(published, clock)
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=1)
+    advance(debouncer, clock, WINDOW / 2)
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=2)
+
+    advance(debouncer, clock, WINDOW / 2)
+    assert published == []
+    advance(debouncer, clock, WINDOW / 2)
+    assert len(published) == 1
+
+
+def test_trustline_updates_are_coalesced_in_both_directions(published, clock):
+    debouncer = make_debouncer(published, clock)
+    debouncer.add_trustline_update(
+        user1=A, user2=B, network_address=NETWORK, timestamp=1
+    )
+    debouncer.add_trustline_update(
+        user1=B, user2=A, network_address=NETWORK, timestamp=2
+    )
+    advance(debouncer, clock, WINDOW)
+
+    assert len(published) == 1
+
+
+def test_users_of_different_networks_are_published_separately(published, clock):
+    other_network = "0x" + "1" * 40
+    debouncer = make_debouncer(published, clock)
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=1)
+    debouncer.add_user_update(user=A, network_address=other_network, timestamp=1)
+    advance(debouncer, clock, WINDOW)
+
+    assert len(published) == 2
+
+
+def test_continuous_updates_are_published_after_max_delay(published, clock):
+    debouncer = make_debouncer(published, clock, max_delay=3 * WINDOW)
+    for timestamp in range(10):
+        debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=timestamp)
+        advance(debouncer, clock, WINDOW / 2)
+
+    # without a max delay nothing would be published while the updates continue
+    assert [event["timestamp"] for _, event in published] == [5]
+
+
+def test_flush_publishes_pending_updates(published, clock):
+    debouncer = make_debouncer(published, clock)
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=1)
+    debouncer.flush()
+
+    assert len(published) == 1
+
+
+def test_failing_publish_does_not_stop_publishing(published, clock):
+    def failing_publish(**kwargs):
+        raise RuntimeError("failed")
+
+    def publish_network_balance_event(**kwargs):
+        published.append(kwargs)
+
+    debouncer = BalanceEventDebouncer(
+        failing_publish,
+        publish_network_balance_event,
+        window=WINDOW,
+        max_delay=100,
+        clock=clock,
+    )
+    debouncer.add_trustline_update(
+        user1=A, user2=B, network_address=NETWORK, timestamp=1
+    )
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=2)
+    advance(debouncer, clock, WINDOW)
+
+    assert published == [dict(user=A, network_address=NETWORK, timestamp=2)]
+
+
+def test_started_debouncer_publishes_due_updates(published):
+    debouncer = BalanceEventDebouncer(
+        lambda **kwargs: None,
+        lambda **kwargs: published.append(kwargs),
+        window=0,
+        max_delay=0,
+    )
+    debouncer.start()
+    debouncer.add_user_update(user=A, network_address=NETWORK, timestamp=1)
+
+    with gevent.Timeout(5):
+        while not published:
+            gevent.sleep(0.001)
+    assert published == [dict(user=A, network_address=NETWORK, timestamp=1)]
+
+
+def test_max_delay_smaller_than_window_is_rejected():
+    with pytest.raises(ValueError):
+        BalanceEventDebouncer(print, print, window=2, max_delay=1)
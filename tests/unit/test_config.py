@@ -9,6 +9,7 @@ from relay.config.config import (
     load_config,
     validation_error_string,
 )
+from relay.config.schema import MessagingSchema
 
 
 class NestedSchema(Schema):
@@ -88,6 +89,22 @@ def test_correct_fee_config_is_valid(correct_fees_config_file):
     load_config(correct_fees_config_file)
 
 
+@pytest.mark.parametrize(
+    "messaging_config",
+    [
+        {"event_bus": "postgres", "missed_messages_storage": "database"},
+        {"event_bus": "in_process", "missed_messages_storage": "memory"},
+    ],
+)
+def test_messaging_config_is_valid(messaging_config):
+    MessagingSchema().load(messaging_config)
+
+
+def test_postgres_event_bus_requires_database_missed_messages_storage():
+    with pytest.raises(ValidationError):
+        MessagingSchema().load({"event_bus": "postgres"})
+
+
 def test_validation_error_message():
     error_message = ""
     try:
@@ -1,4 +1,5 @@
 from relay.blockchain.currency_network_events import TransferEvent, TrustlineUpdateEvent
+from relay.relay import all_event_builders, all_event_contract_types
 
 
 def test_trustline_update_event(web3_event_trustline_update):
@@ -26,3 +27,9 @@ def test_transfer_event(web3_event_transfer, test_extra_data):
     assert event.status == "pending"
     assert event.direction == "sent"
     assert event.extra_data == test_extra_data
+
+
+def test_contract_types_of_event_builders():
+    for key, event_builder in all_event_builders.items():
+        assert event_builder.contract_type in all_event_contract_types
+        assert key.startswith(event_builder.contract_type)
@@ -0,0 +1,91 @@
+import pytest
+
+from relay.event_bus import EventBus, decode_message, encode_message
+from relay.events import MessageEvent
+from relay.missed_message_store import InMemoryMissedMessageStore
+from relay.streams import Client, Event, MessagingSubjects, Subscription
+
+USER = "0x" + "1" * 40
+
+
+class LinkedEventBus(EventBus):
+    """delivers broadcasts synchronously to the other linked buses"""
+
+    def __init__(self, linked_buses):
+        self.linked_buses = linked_buses
+        self.linked_buses.append(self)
+        self.deliver = None
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def broadcast(self, user_address, message):
+        for bus in self.linked_buses:
+            if bus is not self:
+                bus.deliver(user_address, message)
+
+
+class LogClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def _execute_send(self, subscription: Subscription, event: Event) -> None:
+        self.events.append(event)
+
+
+@pytest.fixture()
+def store():
+    return InMemoryMissedMessageStore(max_messages_per_user=10, max_users=10, ttl=100)
+
+
+@pytest.fixture()
+def processes(store):
+    """messaging subjects of two relay processes sharing the missed message store"""
+    linked_buses = []
+    processes = [
+        MessagingSubjects(store, LinkedEventBus(linked_buses)) for _ in range(2)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def test_encode_decode_message():
+    message = MessageEvent("hello", timestamp=123, type="PaymentRequest")
+
+    sender, user, decoded = decode_message(encode_message("sender", USER, message))
+
+    assert sender == "sender"
+    assert user == USER
+    assert decoded.id == message.id
+    assert decoded.type == message.type
+    assert decoded.message == message.message
+    assert decoded.timestamp == message.timestamp
+
+
+def test_message_reaches_subscriber_of_other_process(processes, store):
+    client = LogClient()
+    processes[1][USER].subscribe(client)
+
+    message = MessageEvent("hello", timestamp=0)
+    assert processes[0].publish(USER, message) == 0
+
+    assert [event.id for event in client.events] == [message.id]
+    # read on the other process, so it is no longer missed
+    assert store.pop(USER) == []
+
+
+def test_message_is_missed_if_nobody_reads_it(processes, store):
+    processes[1][USER].subscribe(LogClient(), silent=True)
+
+    message = MessageEvent("hello", timestamp=0)
+    processes[0].publish(USER, message)
+
+    assert [event.id for event in store.pop(USER)] == [message.id]
+
+
+def test_messages_of_other_processes_do_not_create_subjects(processes):
+    processes[0].publish(USER, MessageEvent("hello", timestamp=0))
+
+    assert USER not in processes[1]
@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import create_engine
+
+from relay import missed_message_store as store_module
+from relay.events import MessageEvent
+from relay.missed_message_store import (
+    DatabaseMissedMessageStore,
+    InMemoryMissedMessageStore,
+)
+
+USER = "0x" + "1" * 40
+OTHER_USER = "0x" + "2" * 40
+TTL = 100
+
+
+@pytest.fixture()
+def now(monkeypatch):
+    class Clock:
+        time = 1_000_000.0
+
+    monkeypatch.setattr(store_module.time, "time", lambda: Clock.time)
+    return Clock
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryMissedMessageStore(
+            max_messages_per_user=3, max_users=10, ttl=TTL
+        )
+    return DatabaseMissedMessageStore(
+        create_engine("sqlite:///:memory:"), max_messages_per_user=3, ttl=TTL
+    )
+
+
+def message(text, type=None):
+    return MessageEvent(text, timestamp=123, type=type)
+
+
+def texts(messages):
+    return [message.message for message in messages]
+
+
+def test_pop_returns_messages_of_user(store):
+    store.add(USER, message("a", type="PaymentRequest"))
+    store.add(OTHER_USER, message("b"))
+
+    messages = store.pop(USER)
+
+    assert texts(messages) == ["a"]
+    assert messages[0].type == "PaymentRequest"
+    assert messages[0].timestamp == 123
+    assert store.pop(USER) == []
+    assert texts(store.pop(OTHER_USER)) == ["b"]
+
+
+def test_pop_with_limit(store):
+    for text in ["a", "b", "c"]:
+        store.add(USER, message(text))
+
+    assert texts(store.pop(USER, limit=2)) == ["a", "b"]
+    assert texts(store.pop(USER, limit=2)) == ["c"]
+    assert store.pop(USER, limit=2) == []
+
+
+def test_oldest_messages_are_dropped_above_cap(store):
+    for text in ["a", "b", "c", "d", "e"]:
+        store.add(USER, message(text))
+
+    assert texts(store.pop(USER)) == ["c", "d", "e"]
+
+
+def test_messages_expire(store, now):
+    store.add(USER, message("a"))
+    now.time += TTL / 2
+    store.add(USER, message("b"))
+    now.time += TTL / 2 + 1
+
+    assert texts(store.pop(USER)) == ["b"]
+
+
+def test_in_memory_store_keeps_most_recent_users():
+    store = InMemoryMissedMessageStore(max_messages_per_user=3, max_users=2, ttl=TTL)
+    users = ["0x" + str(i) * 40 for i in range(3)]
+    for user in users:
+        store.add(user, message(user))
+
+    assert store.pop(users[0]) == []
+    assert texts(store.pop(users[1])) == [users[1]]
+    assert texts(store.pop(users[2])) == [users[2]]
+
+
+def test_remove_message(store):
+    messages = [message(text) for text in ["a", "b", "c"]]
+    for missed_message in messages:
+        store.add(USER, missed_message)
+
+    store.remove(USER, messages[1].id)
+
+    assert [missed_message.id for missed_message in store.pop(USER)] == [
+        messages[0].id,
+        messages[2].id,
+    ]
+
+
+def test_database_store_deletes_expired_messages_of_all_users(now):
+    engine = create_engine("sqlite:///:memory:")
+    store = DatabaseMissedMessageStore(
+        engine, max_messages_per_user=3, ttl=TTL, cleanup_interval=2
+    )
+    store.add(USER, message("a"))
+    now.time += TTL + 1
+    store.add(OTHER_USER, message("b"))
+
+    assert engine.execute("SELECT count(*) FROM missed_message").scalar() == 1
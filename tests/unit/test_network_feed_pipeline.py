@@ -0,0 +1,99 @@
+import gevent
+import gevent.event
+import pytest
+
+from relay.ethindex_db.graph_sync_statistics import GraphSyncStatistics
+from relay.ethindex_db.sync_updates import NetworkFreezeFeedUpdate
+from relay.network_feed_pipeline import NetworkFeedPipeline
+
+NETWORK = "0x" + "0" * 40
+
+
+def feed_updates(*timestamps):
+    return [
+        NetworkFreezeFeedUpdate(address=NETWORK, timestamp=timestamp)
+        for timestamp in timestamps
+    ]
+
+
+@pytest.fixture()
+def applied():
+    return []
+
+
+@pytest.fixture()
+def published():
+    return []
+
+
+@pytest.fixture()
+def statistics():
+    return GraphSyncStatistics()
+
+
+def test_pipeline_applies_and_publishes_in_order(applied, published, statistics):
+    pipeline = NetworkFeedPipeline(
+        NETWORK,
+        applied.extend,
+        published.extend,
+        max_pending_batches=10,
+        statistics=statistics,
+    )
+    pipeline.start()
+
+    pipeline.put(feed_updates(1, 2))
+    pipeline.put(feed_updates(3))
+    pipeline.join()
+
+    assert applied == feed_updates(1, 2, 3)
+    assert published == feed_updates(1, 2, 3)
+    assert statistics.networks[NETWORK].number_of_applied_updates == 3
+    assert statistics.networks[NETWORK].last_publish_duration is not None
+
+
+def test_slow_publishing_does_not_delay_applying(applied):
+    publishing_may_continue = gevent.event.Event()
+    publish_calls = []
+
+    def publish(updates):
+        publish_calls.append(updates)
+        publishing_may_continue.wait()
+
+    pipeline = NetworkFeedPipeline(
+        NETWORK, applied.extend, publish, max_pending_batches=10
+    )
+    pipeline.start()
+
+    for timestamp in range(3):
+        pipeline.put(feed_updates(timestamp))
+        gevent.sleep(0.01)
+
+    assert applied == feed_updates(0, 1, 2)
+    assert publish_calls == [feed_updates(0)]
+
+    publishing_may_continue.set()
+    pipeline.join()
+
+    # the batches waiting for the slow publisher are published at once
+    assert publish_calls == [feed_updates(0), feed_updates(1, 2)]
+
+
+def test_pending_after_feed_id(applied):
+    applying_may_continue = gevent.event.Event()
+
+    def apply(updates):
+        applying_may_continue.wait()
+        applied.extend(updates)
+
+    pipeline = NetworkFeedPipeline(NETWORK, apply, list, max_pending_batches=10)
+    pipeline.start()
+    assert pipeline.pending_after_feed_id is None
+
+    pipeline.put(feed_updates(1), after_feed_id=10)
+    pipeline.put(feed_updates(2), after_feed_id=20)
+    gevent.sleep(0.01)
+    assert pipeline.pending_after_feed_id == 10
+
+    applying_may_continue.set()
+    pipeline.join()
+    assert pipeline.pending_after_feed_id is None
@@ -1,16 +1,23 @@
 from collections import namedtuple
 
 import gevent
+import gevent.event
 import pytest
 
-from relay.events import MessageEvent
+from relay.events import MessageEvent, NetworkBalanceEvent
+from relay.network_graph.graph import AggregatedAccountSummary
 from relay.streams import (
     Client,
     DisconnectedError,
     Event,
     MessagingSubject,
+    OverflowPolicy,
+    QueuedClient,
+    SendQueueStatistics,
     Subject,
     Subscription,
+    SubscriptionFilter,
+    event_cursor,
 )
 
 IdEventTuple = namedtuple("IdEventTuple", "id, event")
@@ -44,6 +51,40 @@ class GeventClient(Client):
         raise DisconnectedError
 
 
+class QueuedLogClient(QueuedClient):
+    def __init__(self, *, blocked=False, **kwargs):
+        super().__init__(**kwargs)
+        self.events = []
+        self.may_send = gevent.event.Event()
+        if not blocked:
+            self.may_send.set()
+
+    def _execute_send(self, subscription: Subscription, event: Event) -> None:
+        self.may_send.wait()
+        if isinstance(event, MessageEvent) and event.message == "disconnect":
+            raise DisconnectedError
+        self.events.append(IdEventTuple(subscription.id, event))
+
+
+class BatchLogClient(QueuedLogClient):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def _execute_send_batch(self, batch) -> None:
+        self.batches.append([event.message for _, event in batch])
+
+
+def messages(*texts):
+    return [MessageEvent(text, timestamp=0) for text in texts]
+
+
+def balance_event(balance, user="0x1"):
+    return NetworkBalanceEvent(
+        "0xnetwork", user, AggregatedAccountSummary(balance=balance), 0
+    )
+
+
 @pytest.fixture()
 def subject():
     return Subject()
@@ -51,7 +92,7 @@ def subject():
 
 @pytest.fixture()
 def messaging_subject():
-    return MessagingSubject()
+    return MessagingSubject("0x" + "1" * 40)
 
 
 @pytest.fixture()
@@ -148,7 +189,7 @@ def test_unsubscription_race_condition(subject):
         ),
         raise_error=True,
     )
-    assert subject.subscriptions == []
+    assert len(subject.subscriptions) == 0
 
 
 def test_many_subscription(subject):
@@ -189,3 +230,404 @@ def test_not_reading_client_does_not_mark_as_read(messaging_subject, client):
     assert messaging_subject.publish(event=MessageEvent("test2", timestamp=0)) == 1
     missed_messages = messaging_subject.get_missed_messages()
     assert len(missed_messages) == 0
+
+
+def test_queued_client_sends_in_order(subject):
+    client = QueuedLogClient(max_queue_size=10)
+    subject.subscribe(client)
+    for event in messages("a", "b", "c"):
+        assert subject.publish(event) == 1
+    assert client.events == []
+
+    gevent.sleep(0.01)
+
+    assert [item.event.message for item in client.events] == ["a", "b", "c"]
+    assert client.statistics.queued_events == 0
+
+
+def test_slow_queued_client_does_not_block_publishing(subject):
+    slow_client = QueuedLogClient(max_queue_size=10, blocked=True)
+    client = QueuedLogClient(max_queue_size=10)
+    subject.subscribe(slow_client)
+    subject.subscribe(client)
+
+    subject.publish(MessageEvent("test", timestamp=0))
+    gevent.sleep(0.01)
+
+    assert len(client.events) == 1
+    assert slow_client.events == []
+    assert slow_client.queue_depth == 0  # taken by the blocked send loop
+
+
+def test_queue_overflow_drops_oldest(subject):
+    statistics = SendQueueStatistics()
+    client = QueuedLogClient(max_queue_size=2, statistics=statistics)
+    subject.subscribe(client)
+    for event in messages("a", "b", "c", "d"):
+        subject.publish(event)
+    gevent.sleep(0.01)
+
+    assert [item.event.message for item in client.events] == ["c", "d"]
+    assert statistics.dropped_events == 2
+    assert statistics.max_queue_depth == 2
+
+
+def test_queue_overflow_coalesces_balance_events(subject):
+    statistics = SendQueueStatistics()
+    client = QueuedLogClient(
+        max_queue_size=2,
+        overflow_policy=OverflowPolicy.COALESCE,
+        statistics=statistics,
+    )
+    subject.subscribe(client)
+    subject.publish(balance_event(1))
+    subject.publish(MessageEvent("message", timestamp=0))
+    subject.publish(balance_event(2))
+    subject.publish(balance_event(3, user="0x2"))
+    gevent.sleep(0.01)
+
+    # the balance event of 0x2 can not be coalesced, the oldest event is dropped
+    assert [
+        getattr(item.event, "message", None) or item.event.balance
+        for item in client.events
+    ] == ["message", 3]
+    assert statistics.coalesced_events == 1
+    assert statistics.dropped_events == 1
+
+
+def test_queue_overflow_disconnects(subject):
+    statistics = SendQueueStatistics()
+    client = QueuedLogClient(
+        max_queue_size=1,
+        blocked=True,
+        overflow_policy=OverflowPolicy.DISCONNECT,
+        statistics=statistics,
+    )
+    subscription = subject.subscribe(client)
+    assert subject.publish(MessageEvent("a", timestamp=0)) == 1
+    gevent.sleep(0.01)
+    assert subject.publish(MessageEvent("b", timestamp=0)) == 1
+    assert subject.publish(MessageEvent("c", timestamp=0)) == 0
+
+    assert client.closed
+    assert subscription.closed
+    assert len(subject.subscriptions) == 0
+    assert statistics.disconnected_clients == 1
+    assert statistics.number_of_clients == 0
+    assert statistics.queued_events == 0
+
+
+def test_queued_client_closes_on_disconnect(subject):
+    client = QueuedLogClient(max_queue_size=10)
+    subscription = subject.subscribe(client)
+    subject.publish(MessageEvent("disconnect", timestamp=0))
+    gevent.sleep(0.01)
+
+    assert client.closed
+    assert subscription.closed
+
+
+def test_queue_overflow_keeps_messages(subject):
+    client = QueuedLogClient(max_queue_size=2)
+    subject.subscribe(client)
+    subject.publish(MessageEvent("message", timestamp=0))
+    subject.publish(balance_event(1))
+    subject.publish(balance_event(2))
+    gevent.sleep(0.01)
+
+    assert [
+        getattr(item.event, "message", None) or item.event.balance
+        for item in client.events
+    ] == ["message", 2]
+    assert client.statistics.dropped_events == 1
+
+
+def test_dropped_message_is_stored_as_missed(messaging_subject):
+    client = QueuedLogClient(max_queue_size=1, blocked=True)
+    messaging_subject.subscribe(client)
+    # the first message is taken by the blocked send loop
+    assert messaging_subject.publish(MessageEvent("a", timestamp=0)) == 1
+    gevent.sleep(0.01)
+    assert messaging_subject.publish(MessageEvent("b", timestamp=0)) == 1
+    assert messaging_subject.publish(MessageEvent("c", timestamp=0)) == 1
+
+    assert [message.message for message in messaging_subject.get_missed_messages()] == [
+        "b"
+    ]
+
+
+def test_unsent_messages_are_stored_as_missed_on_disconnect(messaging_subject):
+    client = QueuedLogClient(max_queue_size=10, blocked=True)
+    messaging_subject.subscribe(client)
+    for text in ["disconnect", "a", "b"]:
+        assert messaging_subject.publish(MessageEvent(text, timestamp=0)) == 1
+    client.may_send.set()
+    gevent.sleep(0.01)
+
+    assert client.closed
+    assert [message.message for message in messaging_subject.get_missed_messages()] == [
+        "disconnect",
+        "a",
+        "b",
+    ]
+
+
+def test_unsent_message_is_stored_once(messaging_subject):
+    clients = [QueuedLogClient(max_queue_size=10, blocked=True) for _ in range(2)]
+    for client in clients:
+        messaging_subject.subscribe(client)
+    assert messaging_subject.publish(MessageEvent("a", timestamp=0)) == 2
+    for client in clients:
+        client.close()
+
+    assert len(messaging_subject.get_missed_messages()) == 1
+
+
+def test_subscription_set_keeps_order():
+    subject = Subject()
+    subscriptions = [subject.subscribe(SafeLogClient()) for _ in range(5)]
+    subscriptions[2].unsubscribe()
+
+    assert list(subject.subscriptions) == subscriptions[:2] + subscriptions[3:]
+    assert subscriptions[2] not in subject.subscriptions
+
+
+def test_subscribe_while_publishing(subject):
+    class SubscribingClient(SafeLogClient):
+        def _execute_send(self, subscription, event):
+            super()._execute_send(subscription, event)
+            subject.subscribe(SafeLogClient())
+
+    subject.subscribe(SubscribingClient())
+
+    # the new subscription is only notified about later events
+    assert subject.publish(MessageEvent("test1", timestamp=0)) == 1
+    assert len(subject.subscriptions) == 2
+    assert subject.publish(MessageEvent("test2", timestamp=0)) == 2
+    assert len(subject.subscriptions) == 3
+
+
+def test_unsubscribe_other_subscription_while_publishing(subject):
+    subscriptions = []
+
+    class UnsubscribingClient(SafeLogClient):
+        def _execute_send(self, subscription, event):
+            super()._execute_send(subscription, event)
+            subscriptions[1].unsubscribe()
+
+    subscriptions.append(subject.subscribe(UnsubscribingClient()))
+    other_client = SafeLogClient()
+    subscriptions.append(subject.subscribe(other_client))
+
+    assert subject.publish(MessageEvent("test", timestamp=0)) == 1
+    assert other_client.events == []
+    assert list(subject.subscriptions) == subscriptions[:1]
+
+
+def test_unsubscribe_resubscribe_unsubscribe_while_publishing(subject):
+    subscriptions = []
+
+    class UnsubscribingClient(SafeLogClient):
+        def _execute_send(self, subscription, event):
+            super()._execute_send(subscription, event)
+            subscriptions_set = subject.subscriptions
+            subscriptions_set.remove(subscriptions[1])
+            subscriptions_set.add(subscriptions[1])
+            subscriptions_set.remove(subscriptions[1])
+
+    subscriptions.append(subject.subscribe(UnsubscribingClient()))
+    subscriptions.append(subject.subscribe(SafeLogClient()))
+
+    assert subject.publish(MessageEvent("test", timestamp=0)) == 1
+    assert subscriptions[1] not in subject.subscriptions
+    assert list(subject.subscriptions) == subscriptions[:1]
+
+
+def test_get_missed_messages_with_limit(messaging_subject):
+    for event in messages("a", "b", "c"):
+        messaging_subject.publish(event)
+
+    assert [event.message for event in messaging_subject.get_missed_messages(2)] == [
+        "a",
+        "b",
+    ]
+    assert [event.message for event in messaging_subject.get_missed_messages(2)] == [
+        "c"
+    ]
+
+
+def test_batched_subscription_sends_events_together(subject):
+    client = BatchLogClient(max_queue_size=10, batch_window=0.01)
+    client.enable_batching(subject.subscribe(client))
+    for event in messages("a", "b", "c"):
+        subject.publish(event)
+    gevent.sleep(0.005)
+    subject.publish(MessageEvent("d", timestamp=0))
+    gevent.sleep(0.02)
+
+    assert client.batches == [["a", "b", "c", "d"]]
+    assert client.events == []
+    assert client.statistics.queued_events == 0
+
+
+def test_unbatched_subscription_of_batching_client(subject):
+    client = BatchLogClient(max_queue_size=10, batch_window=0.01)
+    other_subject = Subject()
+    client.enable_batching(subject.subscribe(client))
+    other_subject.subscribe(client)
+    subject.publish(MessageEvent("batched", timestamp=0))
+    other_subject.publish(MessageEvent("single", timestamp=0))
+    gevent.sleep(0.02)
+
+    assert client.batches == [["batched"]]
+    assert [item.event.message for item in client.events] == ["single"]
+
+
+def test_unsubscribe_batched_subscription(subject):
+    client = BatchLogClient(max_queue_size=10)
+    subscription = subject.subscribe(client)
+    client.enable_batching(subscription)
+    subscription.unsubscribe()
+
+    assert len(client._batched_subscriptions) == 0
+
+
+@pytest.mark.parametrize(
+    "subscription_filter, matches",
+    [
+        (SubscriptionFilter(), True),
+        (SubscriptionFilter(network_addresses=["0xnetwork"]), True),
+        (SubscriptionFilter(network_addresses=["0xother"]), False),
+        (SubscriptionFilter(event_types=["NetworkBalance", "Transfer"]), True),
+        (SubscriptionFilter(event_types=["Transfer"]), False),
+        (SubscriptionFilter(contract_types=["CurrencyNetwork"]), True),
+        (SubscriptionFilter(contract_types=["Token"]), False),
+        (
+            SubscriptionFilter(
+                network_addresses=["0xnetwork"], event_types=["Transfer"]
+            ),
+            False,
+        ),
+    ],
+)
+def test_subscription_filter_matches(subscription_filter, matches):
+    assert subscription_filter.matches(balance_event(1)) == matches
+
+
+def test_subscription_filter_without_network_address():
+    subscription_filter = SubscriptionFilter(network_addresses=["0xnetwork"])
+    assert not subscription_filter.matches(MessageEvent("test", timestamp=0))
+
+
+def test_filtered_subscription_is_not_notified(subject):
+    filtered_client = LogClient()
+    client = LogClient()
+    subject.subscribe(
+        filtered_client,
+        subscription_filter=SubscriptionFilter(network_addresses=["0xother"]),
+    )
+    subject.subscribe(client)
+
+    assert subject.publish(balance_event(1)) == 1
+    assert filtered_client.events == []
+    assert len(client.events) == 1
+
+
+def test_filtered_messaging_subscription(messaging_subject):
+    client = LogClient()
+    messaging_subject.subscribe(
+        client, subscription_filter=SubscriptionFilter(event_types=["PaymentRequest"])
+    )
+    messaging_subject.publish(
+        MessageEvent("request", type="PaymentRequest", timestamp=0)
+    )
+    messaging_subject.publish(MessageEvent("other", type="Other", timestamp=0))
+
+    assert [item.event.message for item in client.events] == ["request"]
+    assert [message.message for message in messaging_subject.get_missed_messages()] == [
+        "other"
+    ]
+
+
+class PositionedEvent(Event):
+    type = "Transfer"
+
+    def __init__(self, blocknumber, transaction_index, log_index):
+        super().__init__(timestamp=0)
+        self.blocknumber = blocknumber
+        self.transaction_index = transaction_index
+        self.log_index = log_index
+
+
+def positions(client):
+    return [event_cursor(item.event) for item in client.events]
+
+
+def test_event_cursor():
+    assert event_cursor(PositionedEvent(1, 2, 3)) == (1, 2, 3)
+    assert event_cursor(MessageEvent("test", timestamp=0)) is None
+
+
+def test_resume_replays_then_sends_held_events(subject, client):
+    subscription = subject.subscribe(client)
+    subscription.hold()
+    subject.publish(PositionedEvent(5, 0, 1))
+    subject.publish(balance_event(1))
+    subject.publish(PositionedEvent(6, 0, 0))
+    assert client.events == []
+
+    subscription.resume(
+        [PositionedEvent(4, 1, 0), PositionedEvent(5, 0, 0), PositionedEvent(5, 0, 1)],
+        cursor=(4, 0, 0),
+    )
+
+    # (5, 0, 1) was replayed and arrived live, it is only sent once
+    assert positions(client) == [(4, 1, 0), (5, 0, 0), (5, 0, 1), None, (6, 0, 0)]
+
+
+def test_resume_skips_replayed_events_before_cursor(subject, client):
+    subscription = subject.subscribe(client)
+    subscription.hold()
+    subscription.resume([PositionedEvent(4, 0, 0), PositionedEvent(4, 0, 1)], (4, 0, 0))
+
+    assert positions(client) == [(4, 0, 1)]
+
+
+def test_resume_applies_filter(subject, client):
+    subscription = subject.subscribe(
+        client, subscription_filter=SubscriptionFilter(event_types=["Other"])
+    )
+    subscription.hold()
+    subscription.resume([PositionedEvent(4, 0, 1)], (4, 0, 0))
+
+    assert client.events == []
+
+
+@pytest.mark.parametrize(
+    "overflow_policy", [OverflowPolicy.DROP_OLDEST, OverflowPolicy.DISCONNECT]
+)
+def test_resume_does_not_apply_overflow_policy(subject, overflow_policy):
+    client = QueuedLogClient(max_queue_size=10, overflow_policy=overflow_policy)
+    subscription = subject.subscribe(client)
+    subscription.hold()
+    subject.publish(PositionedEvent(100, 0, 0))
+    subject.publish(PositionedEvent(101, 0, 0))
+
+    subscription.resume([PositionedEvent(i, 0, 0) for i in range(1, 11)], (0, 0, 0))
+    gevent.sleep(0.01)
+
+    assert [position[0] for position in positions(client)] == list(range(1, 11)) + [
+        100,
+        101,
+    ]
+    assert client.statistics.dropped_events == 0
+    assert not client.closed
+
+
+def test_events_are_sent_after_resume(subject, client):
+    subscription = subject.subscribe(client)
+    subscription.hold()
+    subscription.resume([], (4, 0, 0))
+    subject.publish(PositionedEvent(3, 0, 0))
+
+    assert positions(client) == [(3, 0, 0)]
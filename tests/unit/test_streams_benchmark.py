@@ -0,0 +1,121 @@
+import time
+
+import gevent
+import pytest
+from geventwebsocket.websocket import WebSocket
+from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
+
+from relay.api.streams.compression import DeflateWebSocket
+from relay.api.streams.transport import RPCWebSocketClient
+from relay.events import BalanceEvent, MessageEvent
+from relay.network_graph.graph import AggregatedAccountSummary
+from relay.streams import Client, Event, Subject, Subscription
+
+NUMBER_OF_SUBSCRIBERS = 10_000
+
+
+class CountingClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.number_of_events = 0
+
+    def _execute_send(self, subscription: Subscription, event: Event) -> None:
+        self.number_of_events += 1
+
+
+@pytest.mark.benchmark
+def test_subscribe_publish_unsubscribe_many_subscribers():
+    subject = Subject()
+    clients = [CountingClient() for _ in range(NUMBER_OF_SUBSCRIBERS)]
+
+    start = time.perf_counter()
+    subscriptions = [subject.subscribe(client) for client in clients]
+    subscribe_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(10):
+        assert subject.publish(MessageEvent("test", timestamp=i)) == len(clients)
+    publish_duration = time.perf_counter() - start
+
+    # unsubscribe in the order of subscription, worst case for lists
+    start = time.perf_counter()
+    for subscription in subscriptions:
+        subscription.unsubscribe()
+    unsubscribe_duration = time.perf_counter() - start
+
+    assert len(subject.subscriptions) == 0
+    assert all(client.number_of_events == 10 for client in clients)
+    print(
+        f"{NUMBER_OF_SUBSCRIBERS} subscribers: subscribe {subscribe_duration:.3f}s, "
+        f"10 publishes {publish_duration:.3f}s, unsubscribe {unsubscribe_duration:.3f}s"
+    )
+
+
+class WireCountingStream:
+    def __init__(self):
+        self.number_of_bytes = 0
+        self.number_of_frames = 0
+
+    def read(self, size):
+        return b""
+
+    def write(self, data):
+        self.number_of_bytes += len(data)
+        self.number_of_frames += 1
+
+
+def balance_events(number_of_events):
+    return [
+        BalanceEvent(
+            "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b",
+            "0xF2E246BB76DF876Cef8b38ae84130F4F55De395b",
+            f"0x{i:040x}",
+            AggregatedAccountSummary(
+                balance=-i, creditline_given=100, creditline_received=20
+            ),
+            1000,
+        )
+        for i in range(number_of_events)
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "batch, compress", [(False, False), (True, False), (False, True), (True, True)]
+)
+def test_websocket_bytes_and_cpu_per_event(batch, compress):
+    number_of_events = 1000
+    stream = WireCountingStream()
+    if compress:
+        websocket = DeflateWebSocket({}, stream, None, window_bits=15)
+    else:
+        websocket = WebSocket({}, stream, None)
+    client = RPCWebSocketClient(
+        websocket,
+        JSONRPCProtocol(),
+        max_queue_size=number_of_events,
+        batch_window=0.005,
+    )
+    subject = Subject()
+    subscription = subject.subscribe(client)
+    if batch:
+        client.enable_batching(subscription)
+    events = balance_events(number_of_events)
+
+    start = time.process_time()
+    # a hub transfer produces a burst of events for the same user
+    for i in range(0, number_of_events, 50):
+        for event in events[i : i + 50]:
+            subject.publish(event)
+        gevent.sleep(client.batch_window * 2)
+    cpu_time = time.process_time() - start
+
+    assert stream.number_of_frames == (
+        number_of_events // 50 if batch else number_of_events
+    )
+
+    print(
+        f"batch={batch} compress={compress}: {stream.number_of_frames} frames, "
+        f"{stream.number_of_bytes / number_of_events:.1f} bytes per event, "
+        f"{cpu_time / number_of_events * 1e6:.1f}us cpu per event"
+    )